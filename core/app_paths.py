@@ -0,0 +1,12 @@
+import os
+from pathlib import Path
+
+def get_cache_dir(*parts) -> str:
+    """
+    مجلد التخزين المؤقت الدائم للتطبيق (لا يُحذف مع مجلد temp بعد كل مهمة).
+    يمكن تغييره عبر متغير البيئة DUBBER_CACHE_DIR.
+    """
+    base = os.environ.get("DUBBER_CACHE_DIR") or os.path.join(Path.home(), ".cache", "video_dubber")
+    path = os.path.join(base, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -0,0 +1,129 @@
+"""
+حلقة أحداث asyncio دائمة في خيط خلفي تملك كل عمليات الشبكة غير المتزامنة
+(اتصالات edge-tts وطلبات الترجمة HTTP). خط المعالجة يرسل إليها coroutines
+ويحصل على futures، وجلسة HTTP واحدة (واتصالاتها المفتوحة) تُعاد عبر المقاطع والمهام
+بدل إنشاء حلقة جديدة وجلسة جديدة في كل استدعاء asyncio.run.
+"""
+
+import asyncio
+import atexit
+import threading
+from .metrics import current_job_id, job_scope
+from .cancellation import bind_future, check_cancelled
+from .tracing import current_trace, trace_scope
+
+# حد الاتصالات المتزامنة لجلسة HTTP المشتركة (لكل المضيفين / لكل مضيف)
+HTTP_CONNECTION_LIMIT = 32
+HTTP_CONNECTIONS_PER_HOST = 8
+
+class AsyncService:
+    """حلقة أحداث في خيط daemon مع جلسة aiohttp مشتركة تُنشأ عند أول طلب."""
+
+    def __init__(self, name: str = "dubber-async"):
+        self.name = name
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._lock = threading.Lock()
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        """تشغيل الخيط والحلقة إذا لم يكونا يعملان (آمن للاستدعاء المتكرر)."""
+        with self._lock:
+            if self._loop is not None and self._thread.is_alive():
+                return self._loop
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            self._thread = threading.Thread(target=run, name=self.name, daemon=True)
+            self._thread.start()
+            ready.wait()
+            self._loop = loop
+            return loop
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self.start()
+
+    def in_loop_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro):
+        """
+        جدولة coroutine على الحلقة وإرجاع concurrent.futures.Future.
+        معرّف المهمة الحالي (للمقاييس) وتتبعها الزمني ينتقلان مع الـ coroutine لأن خيط الحلقة لا يرث السياق،
+        وإلغاء المهمة الحالية يلغي الـ coroutine فورًا (مع طلبات HTTP وعمليات TTS الجارية داخله).
+        """
+        return bind_future(asyncio.run_coroutine_threadsafe(
+            self._scoped(current_job_id(), current_trace(), coro), self.loop))
+
+    @staticmethod
+    async def _scoped(job_id, trace, coro):
+        if job_id is None and trace is None:
+            return await coro
+        with job_scope(job_id), trace_scope(trace):
+            return await coro
+
+    def run(self, coro, timeout: float = None):
+        """تنفيذ coroutine على الحلقة وانتظار نتيجتها من خيط آخر."""
+        if self.in_loop_thread():
+            coro.close()
+            raise RuntimeError("لا يمكن انتظار نتيجة متزامنة من داخل خيط حلقة الأحداث")
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            # الـ coroutine الملغى بسبب إلغاء المهمة يظهر كإيقاف لا كخطأ
+            check_cancelled()
+            raise
+
+    async def http_session(self):
+        """جلسة aiohttp المشتركة (تُستدعى من داخل الحلقة فقط)."""
+        if self._session is None or self._session.closed:
+            # aiohttp يُستورد هنا لا في أعلى الملف: استيراده وحده يبطئ بدء الواجهة بشكل ملحوظ
+            import aiohttp
+            connector = aiohttp.TCPConnector(limit=HTTP_CONNECTION_LIMIT, limit_per_host=HTTP_CONNECTIONS_PER_HOST)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def _close_session(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def stop(self, timeout: float = 5.0):
+        """إغلاق الجلسة المشتركة وإيقاف الحلقة والخيط."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None or not thread.is_alive():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._close_session(), loop).result(timeout)
+        except Exception as e:
+            print(f"⚠️ تعذر إغلاق جلسة HTTP: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        if not thread.is_alive():
+            loop.close()
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_async_service() -> AsyncService:
+    """الخدمة المشتركة للتطبيق (تبدأ عند أول استخدام وتتوقف عند الخروج)."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = AsyncService()
+            atexit.register(_service.stop)
+        return _service
+
+def run_async(coro, timeout: float = None):
+    """اختصار: تنفيذ coroutine على الحلقة المشتركة وانتظار النتيجة."""
+    return get_async_service().run(coro, timeout)
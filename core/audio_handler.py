@@ -4,9 +4,11 @@ import tempfile
 import time
 from pathlib import Path
 from .ffmpeg_checker import ensure_ffmpeg_available
+from .cancellation import run_process
 
-# الحصول على مسار ffmpeg ديناميكيًا
-FFMPEG_PATH = ensure_ffmpeg_available() or "ffmpeg"
+def _ffmpeg_path() -> str:
+    """مسار ffmpeg عند أول استخدام (وليس عند الاستيراد، حتى لا يتأخر فتح الواجهة)."""
+    return ensure_ffmpeg_available() or "ffmpeg"
 
 def ensure_directories():
     """التأكد من وجود المجلدات المطلوبة."""
@@ -54,8 +56,8 @@ def extract_audio(video_path: str, output_audio_path: str = "temp/audio.wav") ->
         video_path_abs = os.path.abspath(video_path)
         output_audio_path_abs = os.path.abspath(output_audio_path)
         
-        result = subprocess.run([
-            FFMPEG_PATH, "-y",
+        result = run_process([
+            _ffmpeg_path(), "-y",
             "-i", video_path_abs,
             "-vn",  # لا فيديو
             "-acodec", "pcm_s16le",  # ترميز صوتي متوافق
@@ -118,8 +120,8 @@ def merge_audio_with_video(
         new_audio_abs = os.path.abspath(new_audio)
         output_path_abs = os.path.abspath(output_path)
         
-        result = subprocess.run([
-            FFMPEG_PATH, "-y",
+        result = run_process([
+            _ffmpeg_path(), "-y",
             "-i", original_video_abs,
             "-i", new_audio_abs,
             "-c:v", "copy",
@@ -0,0 +1,111 @@
+"""
+قراءة مدة المقاطع الصوتية من بياناتها في الذاكرة دون تشغيل ffprobe:
+تُعد إطارات MP3 من ترويساتها (كل إطار Layer III يحمل عددًا ثابتًا من العينات)،
+وتُقرأ ترويسة RIFF لملفات WAV (مخرجات محركات TTS المحلية).
+"""
+
+import struct
+
+# معدلات البت (kbps) لـ Layer III
+_BITRATES_V1_L3 = [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 0]
+_BITRATES_V2_L3 = [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160, 0]
+# معدلات العينات حسب الإصدار: 3 = MPEG-1، 2 = MPEG-2، 0 = MPEG-2.5
+_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+def _skip_id3(data: bytes) -> int:
+    """تجاوز وسم ID3v2 في بداية الملف إن وُجد."""
+    if len(data) >= 10 and data[:3] == b"ID3":
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        footer = 10 if data[5] & 0x10 else 0
+        return 10 + size + footer
+    return 0
+
+def mp3_frame_info(data: bytes):
+    """
+    عدّ إطارات MP3 (Layer III) في البيانات.
+    يعيد (عدد العينات، معدل العينات، عدد الإطارات). إطار Xing/Info لا يُحتسب.
+    """
+    i = _skip_id3(data)
+    end = len(data) - 4
+    samples = frames = 0
+    sample_rate = 0
+    while i <= end:
+        b1 = data[i + 1]
+        if data[i] != 0xFF or (b1 & 0xE0) != 0xE0:
+            i += 1
+            continue
+        version = (b1 >> 3) & 3
+        layer = (b1 >> 1) & 3
+        b2 = data[i + 2]
+        bitrate_index = b2 >> 4
+        rate_index = (b2 >> 2) & 3
+        if version == 1 or layer != 1 or rate_index == 3 or bitrate_index in (0, 15):
+            # ليست ترويسة Layer III صالحة: إعادة المزامنة
+            i += 1
+            continue
+        rate = _SAMPLE_RATES[version][rate_index]
+        padding = (b2 >> 1) & 1
+        if version == 3:
+            length = 144000 * _BITRATES_V1_L3[bitrate_index] // rate + padding
+            frame_samples = 1152
+        else:
+            length = 72000 * _BITRATES_V2_L3[bitrate_index] // rate + padding
+            frame_samples = 576
+        if frames == 0 and (b"Xing" in data[i + 4:i + 40] or b"Info" in data[i + 4:i + 40]):
+            i += length
+            continue
+        sample_rate = rate
+        samples += frame_samples
+        frames += 1
+        i += length
+    return samples, sample_rate, frames
+
+def mp3_duration(data: bytes) -> float:
+    """مدة بيانات MP3 بالثواني (0 إذا لم يُعثر على إطارات)."""
+    samples, sample_rate, _ = mp3_frame_info(data)
+    return samples / sample_rate if sample_rate else 0.0
+
+def wav_info(data: bytes):
+    """
+    قراءة ترويسة WAV (PCM).
+    يعيد قاموسًا {"sample_rate", "channels", "bits", "offset", "size"} أو None إذا لم تكن البيانات WAV.
+    """
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return None
+    info = {}
+    i = 12
+    while i + 8 <= len(data):
+        chunk_id = data[i:i + 4]
+        size = struct.unpack_from("<I", data, i + 4)[0]
+        if chunk_id == b"fmt ":
+            _, channels, rate, _, _, bits = struct.unpack_from("<HHIIHH", data, i + 8)
+            info.update(sample_rate=rate, channels=channels, bits=bits)
+        elif chunk_id == b"data":
+            # بعض المحركات تكتب حجمًا غير صحيح (0 أو 0xFFFFFFFF) عند الكتابة إلى stdout
+            available = len(data) - (i + 8)
+            info.update(offset=i + 8, size=size if 0 < size <= available else available)
+            break
+        i += 8 + size + (size & 1)
+    return info if "sample_rate" in info and "offset" in info else None
+
+def wav_duration(data: bytes) -> float:
+    info = wav_info(data)
+    if not info or not info["sample_rate"]:
+        return 0.0
+    frame_bytes = info["channels"] * info["bits"] // 8
+    return info["size"] / frame_bytes / info["sample_rate"] if frame_bytes else 0.0
+
+def audio_format(data: bytes) -> str:
+    """صيغة المقطع من بياناته: "wav" أو "mp3"."""
+    return "wav" if data[:4] == b"RIFF" else "mp3"
+
+def audio_duration(data: bytes) -> float:
+    """مدة مقطع MP3 أو WAV بالثواني."""
+    return wav_duration(data) if audio_format(data) == "wav" else mp3_duration(data)
+
+def boundaries_duration(boundaries) -> float:
+    """نهاية آخر كلمة/جملة من أحداث الحدود (بديل تقريبي عند تعذر قراءة الإطارات)."""
+    if not boundaries:
+        return 0.0
+    last = boundaries[-1]
+    return last["offset"] + last["duration"]
@@ -0,0 +1,225 @@
+"""
+تشغيل الدبلجة دفعةً واحدة دون واجهة رسومية (لخوادم المعالجة):
+
+    python -m core.batch videos/ --languages ar,fr
+    python -m core.batch "videos/*.mp4" --languages ar --network-workers 8
+    python -m core.batch jobs.jsonl
+    python -m core.batch resume temp/jobs/video_1a2b3c4d5e
+
+المدخلات: مجلد أو نمط glob أو ملف فيديو أو ملف قائمة (manifest):
+  .json (قائمة) أو .jsonl (سطر لكل فيديو) بعناصر مثل {"video": ..., "languages": [...], "voice": ...}
+  أو .txt (مسار فيديو في كل سطر).
+حالة كل مهمة تُكتب على stdout كسطور JSON (رسائل التقدم الأخرى تذهب إلى stderr).
+الفيديو المكرر في المدخلات يُستخدم أول ظهور له فقط.
+كل فيديو يبدأ فقط إذا اتسع تقدير ذاكرته (نموذج Whisper ومدة الفيديو) في --memory-budget، وإلا ينتظر.
+مجلد عمل كل فيديو يبقى مع نقطة حفظه إذا فشلت مهامه؛ resume (أو إعادة تشغيل نفس الأمر) يكمل من
+أول مرحلة لم تكتمل أو تغيرت مدخلاتها.
+رمز الخروج: 0 إذا نجحت كل المهام، 1 إذا فشلت أو أوقفت أي مهمة، 2 لخطأ في المدخلات.
+"""
+
+import argparse
+import concurrent.futures
+import contextlib
+import glob
+import json
+import os
+import sys
+import threading
+import time
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".wmv", ".flv", ".webm")
+MANIFEST_EXTENSIONS = (".json", ".jsonl", ".txt")
+
+def _split_languages(value):
+    if isinstance(value, str):
+        value = value.split(",")
+    return [code.strip() for code in value or [] if code.strip()]
+
+def _read_manifest(path: str):
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, "r", encoding="utf-8-sig") as f:
+        if path.endswith(".json"):
+            entries = json.load(f)
+        elif path.endswith(".jsonl"):
+            entries = [json.loads(line) for line in f if line.strip()]
+        else:
+            entries = [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+    for entry in entries:
+        entry = {"video": entry} if isinstance(entry, str) else dict(entry)
+        # المسارات النسبية في القائمة تُحسب من مجلد ملف القائمة
+        for key in ("video", "transcript"):
+            if entry.get(key) and not os.path.isabs(entry[key]):
+                entry[key] = os.path.join(base, entry[key])
+        yield entry
+
+def collect_inputs(inputs):
+    """تحويل المدخلات (مجلدات، أنماط، ملفات، قوائم) إلى قائمة عناصر {"video", ...} دون تكرار."""
+    entries, seen = [], set()
+    for item in inputs:
+        if os.path.isdir(item):
+            found = [{"video": os.path.join(item, name)} for name in sorted(os.listdir(item))
+                     if name.lower().endswith(VIDEO_EXTENSIONS)]
+        elif os.path.isfile(item) and item.lower().endswith(MANIFEST_EXTENSIONS):
+            found = list(_read_manifest(item))
+        elif os.path.isfile(item):
+            found = [{"video": item}]
+        else:
+            found = [{"video": path} for path in sorted(glob.glob(item, recursive=True))
+                     if path.lower().endswith(VIDEO_EXTENSIONS)]
+        for entry in found:
+            key = os.path.abspath(entry["video"])
+            if key not in seen:
+                seen.add(key)
+                entries.append(entry)
+    return entries
+
+def build_jobs(entries, args):
+    """مجموعة مهام لكل فيديو (مهمة لكل لغة مستهدفة) تُنفَّذ معًا في رسم مراحل واحد."""
+    from .pipeline import make_jobs
+    groups = []
+    for entry in entries:
+        languages = _split_languages(entry.get("languages") or entry.get("language") or args.languages)
+        groups.append(make_jobs(
+            entry["video"], languages, use_sidecar=not args.no_sidecar,
+            output_dir=entry.get("output_dir") or args.output_dir,
+            source_language=entry.get("source_language") or args.source_language,
+            voice_name=entry.get("voice") or args.voice,
+            whisper_model=entry.get("whisper_model") or args.whisper_model,
+            transcript_path=entry.get("transcript"),
+            check_alignment=not args.no_alignment_check,
+            tts_backend=entry.get("tts_backend") or args.tts_backend,
+            stream_segments=entry.get("overlap", args.overlap),
+        ))
+    return [group for group in groups if group]
+
+class StatusWriter:
+    """كتابة أحداث المهام كسطور JSON (آمنة من عدة خيوط) إلى stdout وملف اختياري."""
+
+    def __init__(self, stream, path: str = None):
+        self.stream = stream
+        self.file = open(path, "a", encoding="utf-8") if path else None
+        self._lock = threading.Lock()
+
+    def __call__(self, event: dict):
+        line = json.dumps(dict(event, time=round(time.time(), 3)), ensure_ascii=False)
+        with self._lock:
+            for target in (self.stream, self.file):
+                if target:
+                    target.write(line + "\n")
+                    target.flush()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+def _add_run_options(parser):
+    parser.add_argument("--stt-workers", type=int, default=None, help="عدد عمليات Whisper المتزامنة (الافتراضي 1)")
+    parser.add_argument("--network-workers", type=int, default=None, help="مهام الترجمة/TTS المتزامنة (الافتراضي 4)")
+    parser.add_argument("--io-workers", type=int, default=None, help="عمليات ffmpeg المتزامنة للاستخراج/الدمج (الافتراضي 2)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="أقصى عدد فيديوهات نشطة معًا (الافتراضي: مجموع الحدود)")
+    parser.add_argument("--work-dir", default=None, help="مجلد عمل الفيديوهات ونقاط حفظها (الافتراضي temp/jobs)")
+    parser.add_argument("--keep-temp", action="store_true", help="عدم حذف مجلد العمل حتى بعد نجاح المهام")
+    parser.add_argument("--status-file", default=None, help="نسخة من سطور الحالة JSON في ملف")
+    parser.add_argument("--memory-budget", type=float, default=None,
+                        help="ميزانية ذاكرة المهام المتزامنة بالميغابايت (0 = دون حد؛ الافتراضي 75%% من ذاكرة الجهاز)")
+    parser.add_argument("--trace-dir", default=None,
+                        help="كتابة تتبع زمني بصيغة Chrome Trace لكل فيديو وملف batch-*.json يجمعها (ui.perfetto.dev)")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m core.batch", description="دبلجة مجموعة فيديوهات دون واجهة رسومية")
+    parser.add_argument("inputs", nargs="+", help="مجلد أو نمط glob أو ملف فيديو أو قائمة (.json/.jsonl/.txt)")
+    parser.add_argument("-l", "--languages", default="ar", help="اللغات المستهدفة مفصولة بفواصل (الافتراضي: ar)")
+    parser.add_argument("-o", "--output-dir", default="output", help="مجلد الفيديوهات الناتجة")
+    parser.add_argument("--source-language", default=None, help="لغة الفيديوهات الأصلية (وإلا يكتشفها Whisper)")
+    parser.add_argument("--voice", default=None, help="اسم الصوت (وإلا الصوت الافتراضي للغة)")
+    parser.add_argument("--whisper-model", default="medium")
+    parser.add_argument("--tts-backend", default=None, help="محرك توليد الصوت (edge-tts / espeak-ng)")
+    _add_run_options(parser)
+    parser.add_argument("--no-sidecar", action="store_true", help="تجاهل ملفات الترجمة المجاورة (video.srt)")
+    parser.add_argument("--no-alignment-check", action="store_true", help="عدم فحص توقيت النص الجاهز مع الصوت")
+    parser.add_argument("--overlap", action="store_true",
+                        help="ترجمة وتوليد صوت مقاطع Whisper أثناء استمرار التحويل (بدل انتظار النص كاملًا)")
+    return parser.parse_args(argv)
+
+def parse_resume_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m core.batch resume",
+                                     description="استئناف مهام متوقفة أو فاشلة من نقاط حفظها")
+    parser.add_argument("refs", nargs="+", metavar="job", help="مجلد المهمة، أو اسمه داخل --work-dir، أو مسار الفيديو")
+    _add_run_options(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else list(argv)
+    resume = bool(argv) and argv[0] == "resume"
+    args = parse_resume_args(argv[1:]) if resume else parse_args(argv)
+    status = StatusWriter(sys.stdout, args.status_file)
+    # رسائل print من وحدات المعالجة (ومنها ما يُطبع عند استيرادها، لذلك الاستيراد هنا)
+    # تذهب إلى stderr حتى يبقى stdout سطور JSON فقط
+    with contextlib.redirect_stdout(sys.stderr):
+        from .pipeline import StageLimiter, run_jobs, resume_jobs
+        from .cancellation import CancelToken
+        from .tracing import write_chrome_trace
+        from .memory import MemoryAdmission, get_memory_admission
+        try:
+            if resume:
+                groups, roots = [], []
+                for ref in args.refs:
+                    group, root = resume_jobs(ref, args.work_dir)
+                    groups.append(group)
+                    roots.append(root)
+            else:
+                groups = build_jobs(collect_inputs(args.inputs), args)
+                roots = [args.work_dir] * len(groups)
+        except (OSError, ValueError, TypeError) as e:
+            status({"event": "error", "error": str(e)})
+            return 2
+        jobs = [job for group in groups for job in group]
+        if not jobs:
+            status({"event": "error", "error": "لم يتم العثور على فيديوهات في المدخلات"})
+            return 2
+
+        limits = {"cpu": args.stt_workers, "network": args.network_workers, "io": args.io_workers}
+        limiter = StageLimiter({name: n for name, n in limits.items() if n})
+        workers = args.jobs or sum(limiter.limits.values())
+        # الفيديو الذي لا يتسع تقدير ذاكرته في الميزانية ينتظر انتهاء غيره بدل أن يستنفد ذاكرة الجهاز
+        if args.memory_budget is None:
+            admission = get_memory_admission()
+        else:
+            admission = MemoryAdmission(int(args.memory_budget * 1024 * 1024) if args.memory_budget > 0 else None)
+        if args.work_dir:
+            os.makedirs(args.work_dir, exist_ok=True)
+        # رمز إلغاء مشترك: Ctrl+C يقطع طلبات الشبكة ويقتل ffmpeg/Whisper في كل المهام الجارية فورًا
+        stop = CancelToken()
+        status({"event": "batch_started", "jobs": len(jobs), "workers": workers, "limits": limiter.limits,
+                "memory_budget": admission.budget})
+        started = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dub-job") as pool:
+            futures = [
+                pool.submit(run_jobs, group, limiter, status, stop, root, args.keep_temp, args.trace_dir, admission)
+                for group, root in zip(groups, roots)
+            ]
+            try:
+                concurrent.futures.wait(futures)
+            except KeyboardInterrupt:
+                # إيقاف المهام الجارية فورًا وإلغاء ما لم يبدأ
+                stop.cancel()
+                for future in futures:
+                    future.cancel()
+
+        counts = {}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        finished = {"event": "batch_finished", "seconds": round(time.perf_counter() - started, 3), "statuses": counts}
+        traces = list({id(group[0].trace): group[0].trace for group in groups if group[0].trace}.values())
+        if args.trace_dir and traces:
+            # كل فيديوهات الدفعة في ملف واحد (عملية لكل فيديو) على نفس الخط الزمني
+            name = time.strftime("batch-%Y%m%d-%H%M%S.json")
+            finished["trace"] = write_chrome_trace(os.path.join(args.trace_dir, name), traces)
+        status(finished)
+        status.close()
+    if stop.cancelled:
+        return 130
+    return 0 if counts.get("done", 0) == len(jobs) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
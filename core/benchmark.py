@@ -0,0 +1,385 @@
+"""
+قياس أداء خط الدبلجة من البداية إلى النهاية على فيديوهات اصطناعية ودون شبكة:
+
+    python -m core.benchmark --durations 30,120 --resolutions 640x360,1920x1080 --densities 0.3,0.8
+    python -m core.benchmark --save-baseline        # حفظ النتائج كخط أساس (benchmarks/baseline.json)
+    python -m core.benchmark                        # المقارنة مع خط الأساس المحفوظ
+
+لكل سيناريو (مدة × دقة × كثافة كلام) يُولَّد فيديو بـ ffmpeg lavfi (testsrc2) مع مسار صوتي من مقاطع كلام
+موزعة حسب الكثافة: مقاطع من --samples (wav/mp3 مع نصها في ملف .txt بنفس الاسم)، أو جمل إنجليزية يولدها
+espeak-ng مرة واحدة وتُحفظ في مجلد العمل. ثم يعمل خط الدبلجة كاملًا (Whisper حقيقي، أو النص الفعلي كنص
+مجاور مع --sidecar) مع خادم OpenRouter محلي (core.openrouter_stub) ومحرك TTS بديل (core.tts_stub)
+بزمن استجابة ونسبة أخطاء قابلة للضبط.
+
+لكل سيناريو يُقاس: معامل الزمن الحقيقي (RTF = زمن المرحلة / مدة الفيديو) لكل مرحلة، وذروة RSS للعملية
+وعملياتها الفرعية (Whisper وffmpeg)، والزمن الكلي. النتائج تُقارن مع خط الأساس: أي زمن أو ذاكرة زادت بأكثر
+من --tolerance تُعد تراجعًا.
+رمز الخروج: 0 دون تراجع، 1 إذا تراجع مقياس أو فشلت مهمة، 2 لخطأ في الإعداد (ffmpeg أو مقاطع الكلام).
+"""
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import time
+import wave
+import numpy as np
+
+BENCH_SAMPLE_RATE = 16000
+DEFAULT_BENCH_DIR = os.path.join("temp", "bench")
+DEFAULT_BASELINE = os.path.join("benchmarks", "baseline.json")
+# الزيادة النسبية المسموحة قبل اعتبار المقياس تراجعًا
+REGRESSION_TOLERANCE = 0.15
+# فروق أصغر من هذه لا تُعد تراجعًا مهما كانت نسبتها (ضجيج القياس في المراحل القصيرة)
+MIN_REGRESSION_SECONDS = 0.1
+MIN_REGRESSION_BYTES = 32 * 1024 * 1024
+SAMPLE_EXTENSIONS = (".wav", ".mp3")
+# الجمل المولَّدة بـ espeak-ng عند عدم تحديد --samples
+SAMPLE_SENTENCES = [
+    "Welcome back to the channel, today we are looking at something new.",
+    "The first thing you need is a clean and well lit workspace.",
+    "Make sure every part is ready before you start the assembly.",
+    "This step usually takes about ten minutes, so be patient.",
+    "If something goes wrong, simply go back and check the connections.",
+    "Now let us compare the results with what we expected.",
+    "As you can see, the difference is quite small but noticeable.",
+    "Thank you for watching, and see you in the next video.",
+]
+# إعدادات تُحفظ مع النتائج: اختلافها عن خط الأساس يجعل المقارنة غير عادلة
+_CONFIG_KEYS = ("languages", "whisper_model", "tts_backend", "overlap", "sidecar", "translation_latency",
+                "translation_jitter", "translation_error_rate", "tts_latency", "tts_jitter", "tts_error_rate")
+
+def _ffmpeg() -> str:
+    from .ffmpeg_checker import ensure_ffmpeg_available
+    path = ensure_ffmpeg_available()
+    if not path:
+        raise RuntimeError("ffmpeg غير متاح (مطلوب لتوليد الفيديوهات الاصطناعية)")
+    return path
+
+def _espeak_samples(directory: str):
+    """توليد SAMPLE_SENTENCES بـ espeak-ng مرة واحدة (تُعاد من القرص في المرات التالية)."""
+    from .async_service import run_async
+    from .tts_backends import EspeakBackend
+    os.makedirs(directory, exist_ok=True)
+    backend = EspeakBackend()
+    paths = []
+    for i, sentence in enumerate(SAMPLE_SENTENCES):
+        path = os.path.join(directory, f"sample_{i:02d}.wav")
+        if not os.path.exists(path):
+            try:
+                audio, _ = run_async(backend.synthesize(sentence, "en"))
+            except Exception as e:
+                raise RuntimeError(f"تعذر توليد مقاطع الكلام بـ espeak-ng ({e})؛ حدد مجلد مقاطع بـ --samples")
+            with open(path, "wb") as f:
+                f.write(audio)
+            with open(os.path.splitext(path)[0] + ".txt", "w", encoding="utf-8") as f:
+                f.write(sentence)
+        paths.append(path)
+    return paths
+
+def load_speech_samples(directory: str = None, work_dir: str = DEFAULT_BENCH_DIR):
+    """
+    مقاطع الكلام [(pcm float32 بمعدل BENCH_SAMPLE_RATE، النص)]: ملفات wav/mp3 في directory
+    (النص من ملف .txt بنفس الاسم إن وُجد)، وإلا جمل SAMPLE_SENTENCES المولَّدة بـ espeak-ng.
+    """
+    from .timeline import decode_clips
+    if directory:
+        paths = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                       if name.lower().endswith(SAMPLE_EXTENSIONS))
+        if not paths:
+            raise RuntimeError(f"لا توجد مقاطع كلام ({', '.join(SAMPLE_EXTENSIONS)}) في {directory}")
+    else:
+        paths = _espeak_samples(os.path.join(work_dir, "samples"))
+    clips, texts = [], []
+    for path in paths:
+        with open(path, "rb") as f:
+            clips.append(f.read())
+        text_path = os.path.splitext(path)[0] + ".txt"
+        if os.path.exists(text_path):
+            with open(text_path, "r", encoding="utf-8-sig") as f:
+                texts.append(f.read().strip())
+        else:
+            texts.append("")
+    return [(pcm, text) for pcm, text in zip(decode_clips(clips, BENCH_SAMPLE_RATE), texts) if len(pcm)]
+
+def build_speech_track(samples, seconds: float, density: float, seed: int = 0):
+    """
+    مسار صوتي طوله seconds: مقاطع كلام عشوائية متتالية تفصلها فترات صمت بحيث تكون نسبة الكلام ≈ density.
+    يعيد (pcm، المقاطع المنطوقة [{"start", "end", "text"}]).
+    """
+    rng = random.Random(seed)
+    track = np.zeros(int(seconds * BENCH_SAMPLE_RATE), dtype=np.float32)
+    segments = []
+    density = min(max(density, 0.0), 1.0)
+    if density == 0 or not samples:
+        return track, segments
+    position = int(0.5 * BENCH_SAMPLE_RATE)
+    while True:
+        pcm, text = rng.choice(samples)
+        if position + len(pcm) > len(track):
+            break
+        track[position:position + len(pcm)] = pcm
+        segments.append({"start": round(position / BENCH_SAMPLE_RATE, 3),
+                         "end": round((position + len(pcm)) / BENCH_SAMPLE_RATE, 3), "text": text})
+        # الصمت يتناسب مع طول المقطع حتى تبقى الكثافة ثابتة، مع تذبذب وحد أدنى يفصل جمل Whisper
+        gap = len(pcm) * (1 - density) / density * rng.uniform(0.7, 1.3)
+        position += len(pcm) + max(int(gap), int(0.15 * BENCH_SAMPLE_RATE))
+    return track, segments
+
+def make_synthetic_video(path: str, seconds: float, resolution: str = "1280x720", density: float = 0.6,
+                         samples=(), seed: int = 0, fps: int = 25):
+    """
+    فيديو اصطناعي: صورة testsrc2 من ffmpeg lavfi بالدقة المطلوبة ومسار كلام من build_speech_track.
+    النص الفعلي يُكتب بجانبه (path.json بصيغة Whisper) فيصلح نصًا مجاورًا. يعيد المقاطع المنطوقة.
+    """
+    from .cancellation import run_process
+    track, segments = build_speech_track(samples, seconds, density, seed)
+    base = os.path.splitext(path)[0]
+    wav_path = base + ".speech.wav"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with wave.open(wav_path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(BENCH_SAMPLE_RATE)
+        wav.writeframes((np.clip(track, -1.0, 1.0) * 32767).astype("<i2").tobytes())
+    try:
+        run_process([
+            _ffmpeg(), "-v", "error", "-y",
+            "-f", "lavfi", "-i", f"testsrc2=size={resolution}:rate={fps}:duration={seconds}",
+            "-i", wav_path, "-map", "0:v", "-map", "1:a",
+            "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p",
+            "-c:a", "aac", "-b:a", "96k", "-shortest", path
+        ], capture_output=True, check=True)
+    finally:
+        os.remove(wav_path)
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump({"language": "en", "segments": segments}, f, ensure_ascii=False, indent=1)
+    return segments
+
+def scenario_name(seconds: float, resolution: str, density: float) -> str:
+    return f"{seconds:g}s-{resolution}-d{density:g}"
+
+def _scenario_stats(jobs, wall: float, peak_rss, fallback_duration: float) -> dict:
+    duration = jobs[0].duration or fallback_duration
+    stages = {}
+    for job in jobs:
+        for kind, seconds in job.timings.items():
+            # مراحل اللغات تعمل بالتوازي: زمن المرحلة هو أبطأ لغة
+            if kind != "total":
+                stages[kind] = max(stages.get(kind, 0.0), seconds)
+    return {
+        "duration": round(duration, 3), "wall": round(wall, 3), "rtf": round(wall / duration, 4),
+        "stages": {kind: {"seconds": round(seconds, 3), "rtf": round(seconds / duration, 4)}
+                   for kind, seconds in stages.items()},
+        "peak_rss": peak_rss,
+        # تقدير تحكم القبول (core.memory) لمقارنته بالذروة الفعلية
+        "estimated_memory": jobs[0].memory.get("estimate"),
+        "statuses": [job.status for job in jobs],
+        "errors": [job.error for job in jobs if job.error],
+    }
+
+def _median_run(runs: list) -> dict:
+    """تجميع التكرارات: الوسيط للأزمنة والأقصى للذاكرة."""
+    if len(runs) == 1:
+        return runs[0]
+    result = dict(runs[0])
+    result["wall"] = round(statistics.median(run["wall"] for run in runs), 3)
+    result["rtf"] = round(result["wall"] / result["duration"], 4)
+    result["stages"] = {}
+    for kind in {kind for run in runs for kind in run["stages"]}:
+        seconds = statistics.median(run["stages"][kind]["seconds"] for run in runs if kind in run["stages"])
+        result["stages"][kind] = {"seconds": round(seconds, 3), "rtf": round(seconds / result["duration"], 4)}
+    peaks = [run["peak_rss"] for run in runs if run["peak_rss"] is not None]
+    result["peak_rss"] = max(peaks) if peaks else None
+    result["statuses"] = [status for run in runs for status in run["statuses"]]
+    result["errors"] = [error for run in runs for error in run["errors"]]
+    return result
+
+def run_scenario(video_path: str, seconds: float, args, limiter, work_dir: str) -> dict:
+    """تشغيل خط الدبلجة على فيديو السيناريو args.repeat مرة بذاكرة مؤقتة باردة في كل مرة."""
+    from .pipeline import make_jobs, run_jobs
+    from .translator import clear_translation_cache
+    from .tts_cache import get_tts_cache
+    from .memory import get_memory_monitor
+    runs = []
+    for _ in range(args.repeat):
+        clear_translation_cache()
+        get_tts_cache().clear()
+        jobs_root = os.path.join(work_dir, "jobs")
+        # دون نقاط حفظ من تشغيل سابق حتى تُقاس كل المراحل
+        shutil.rmtree(jobs_root, ignore_errors=True)
+        jobs = make_jobs(video_path, args.languages, use_sidecar=args.sidecar,
+                         output_dir=os.path.join(work_dir, "output"), source_language=args.source_language,
+                         whisper_model=args.whisper_model, tts_backend=args.tts_backend,
+                         stream_segments=args.overlap)
+        with get_memory_monitor().watch() as memory:
+            started = time.perf_counter()
+            run_jobs(jobs, limiter, work_root=jobs_root, trace_dir=args.trace_dir)
+            wall = time.perf_counter() - started
+        runs.append(_scenario_stats(jobs, wall, memory.peak, seconds))
+    return _median_run(runs)
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float = REGRESSION_TOLERANCE) -> list:
+    """
+    إضافة قيم خط الأساس إلى كل سيناريو مطابق (حقل "baseline") وإرجاع قائمة التراجعات
+    [(السيناريو، المقياس، القيمة القديمة، الجديدة)].
+    """
+    previous = {scenario["name"]: scenario for scenario in baseline.get("scenarios", [])}
+    regressions = []
+    for scenario in results["scenarios"]:
+        old = previous.get(scenario["name"])
+        if not old:
+            continue
+        pairs = [("wall", old["wall"], scenario["wall"], MIN_REGRESSION_SECONDS)]
+        pairs += [(f"stage.{kind}", old["stages"][kind]["seconds"], stage["seconds"], MIN_REGRESSION_SECONDS)
+                  for kind, stage in scenario["stages"].items() if kind in old["stages"]]
+        if old.get("peak_rss") and scenario.get("peak_rss"):
+            pairs.append(("peak_rss", old["peak_rss"], scenario["peak_rss"], MIN_REGRESSION_BYTES))
+        scenario["baseline"] = {metric: before for metric, before, _, _ in pairs}
+        for metric, before, after, floor in pairs:
+            if after > before * (1 + tolerance) and after - before > floor:
+                regressions.append((scenario["name"], metric, before, after))
+    return regressions
+
+def _delta(before, after) -> str:
+    if before is None:
+        return ""
+    change = (after - before) / before * 100 if before else 0.0
+    return f"  (خط الأساس {before:g}، {change:+.1f}%)"
+
+def print_report(results: dict, out=sys.stdout):
+    from .memory import format_bytes
+    for scenario in results["scenarios"]:
+        baseline = scenario.get("baseline", {})
+        failed = [status for status in scenario["statuses"] if status != "done"]
+        print(f"📊 {scenario['name']} ({scenario['duration']:g}s): الزمن الكلي {scenario['wall']:.2f}s "
+              f"(RTF {scenario['rtf']:.3f}){_delta(baseline.get('wall'), scenario['wall'])}", file=out)
+        for kind, stage in sorted(scenario["stages"].items(), key=lambda item: -item[1]["seconds"]):
+            print(f"   {kind:<14}{stage['seconds']:>9.2f}s  RTF {stage['rtf']:.3f}"
+                  f"{_delta(baseline.get('stage.' + kind), stage['seconds'])}", file=out)
+        peak = scenario["peak_rss"]
+        old_peak = baseline.get("peak_rss")
+        print(f"   ذروة الذاكرة: {format_bytes(peak)} (التقدير {format_bytes(scenario.get('estimated_memory'))})"
+              + (f"  (خط الأساس {format_bytes(old_peak)}، {(peak - old_peak) / old_peak * 100:+.1f}%)"
+                 if old_peak and peak else ""), file=out)
+        if failed:
+            print(f"   ❌ مهام غير مكتملة: {len(failed)} — {'; '.join(scenario['errors'][:3])}", file=out)
+    injected = results["injected_errors"]
+    print(f"💉 أخطاء مُحقنة: الترجمة {injected['translation']}، TTS {injected['tts']}", file=out)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m core.benchmark",
+                                     description="قياس أداء خط الدبلجة على فيديوهات اصطناعية دون شبكة")
+    parser.add_argument("--durations", default="30", help="مدد الفيديوهات بالثواني مفصولة بفواصل (الافتراضي 30)")
+    parser.add_argument("--resolutions", default="1280x720", help="دقات الفيديو مفصولة بفواصل (الافتراضي 1280x720)")
+    parser.add_argument("--densities", default="0.6", help="نسبة الكلام من المدة (0-1) مفصولة بفواصل (الافتراضي 0.6)")
+    parser.add_argument("--samples", default=None, help="مجلد مقاطع كلام wav/mp3 (وإلا تُولَّد بـ espeak-ng)")
+    parser.add_argument("-l", "--languages", default="ar", help="اللغات المستهدفة مفصولة بفواصل (الافتراضي: ar)")
+    parser.add_argument("--source-language", default=None, help="لغة المقاطع (وإلا يكتشفها Whisper)")
+    parser.add_argument("--whisper-model", default="medium")
+    parser.add_argument("--sidecar", action="store_true", help="استخدام النص الفعلي كنص مجاور بدل Whisper")
+    parser.add_argument("--overlap", action="store_true", help="تشغيل الترجمة وTTS أثناء التحويل (كما في core.batch)")
+    parser.add_argument("--tts-backend", default="stub", help="محرك TTS (الافتراضي stub البديل، أو espeak-ng)")
+    parser.add_argument("--translation-latency", type=float, default=0.3, help="زمن استجابة خادم الترجمة البديل بالثواني")
+    parser.add_argument("--translation-jitter", type=float, default=0.1)
+    parser.add_argument("--translation-error-rate", type=float, default=0.0, help="نسبة طلبات الترجمة الفاشلة (0-1)")
+    parser.add_argument("--tts-latency", type=float, default=0.2, help="زمن استجابة محرك TTS البديل بالثواني")
+    parser.add_argument("--tts-jitter", type=float, default=0.1)
+    parser.add_argument("--tts-error-rate", type=float, default=0.0, help="نسبة مقاطع TTS الفاشلة (0-1)")
+    parser.add_argument("--repeat", type=int, default=1, help="عدد مرات تشغيل كل سيناريو (يُؤخذ الوسيط)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", default=DEFAULT_BENCH_DIR, help="مجلد الفيديوهات الاصطناعية والعمل")
+    parser.add_argument("--trace-dir", default=None, help="كتابة تتبع زمني Chrome Trace لكل تشغيل")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="ملف خط الأساس للمقارنة")
+    parser.add_argument("--save-baseline", action="store_true", help="حفظ النتائج كخط أساس جديد")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE,
+                        help="الزيادة النسبية المسموحة قبل اعتبارها تراجعًا (الافتراضي 0.15)")
+    parser.add_argument("-o", "--output", default=None, help="كتابة النتائج JSON في ملف")
+    args = parser.parse_args(argv)
+    args.languages = [code.strip() for code in args.languages.split(",") if code.strip()]
+    args.durations = [float(value) for value in args.durations.split(",")]
+    args.resolutions = [value.strip() for value in args.resolutions.split(",")]
+    args.densities = [float(value) for value in args.densities.split(",")]
+    return args
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    work_dir = os.path.abspath(args.work_dir)
+    # ذاكرة مؤقتة معزولة (مقاطع TTS وفهرس الأصوات وسرعات الكلام) حتى لا تؤثر على التطبيق ولا العكس
+    os.environ["DUBBER_CACHE_DIR"] = os.path.join(work_dir, "cache")
+    # رسائل وحدات المعالجة إلى stderr حتى يبقى التقرير وحده على stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        from .openrouter_stub import start_stub_server
+        from .translator import TranslationProvider, set_translation_providers
+        from .tts_stub import STUB_BACKEND_NAME, register_stub_backend
+        from .pipeline import StageLimiter
+        try:
+            samples = load_speech_samples(args.samples, work_dir)
+            videos = []
+            for i, (seconds, resolution, density) in enumerate(
+                    itertools.product(args.durations, args.resolutions, args.densities)):
+                name = scenario_name(seconds, resolution, density)
+                path = os.path.join(work_dir, "videos", f"{name}-s{args.seed}.mp4")
+                if not (os.path.exists(path) and os.path.exists(os.path.splitext(path)[0] + ".json")):
+                    print(f"🎬 توليد الفيديو الاصطناعي {name}...")
+                    make_synthetic_video(path, seconds, resolution, density, samples, args.seed + i)
+                videos.append((name, path, seconds, resolution, density))
+        except (OSError, RuntimeError) as e:
+            print(f"❌ {e}", file=sys.stderr)
+            return 2
+
+        server, url = start_stub_server(latency=args.translation_latency, jitter=args.translation_jitter,
+                                        error_rate=args.translation_error_rate)
+        # مزودان على نفس الخادم كما في الإعداد الافتراضي: الخطأ المُحقن يُعاد على المزود الاحتياطي
+        set_translation_providers([TranslationProvider("bench-primary", url, "stub"),
+                                   TranslationProvider("bench-backup", url, "stub")])
+        tts_stub = None
+        if args.tts_backend == STUB_BACKEND_NAME:
+            tts_stub = register_stub_backend(args.tts_latency, args.tts_jitter, args.tts_error_rate, args.seed)
+
+        limiter = StageLimiter()
+        scenarios = []
+        try:
+            for name, path, seconds, resolution, density in videos:
+                print(f"⏱️ تشغيل السيناريو {name}...")
+                stats = run_scenario(path, seconds, args, limiter, work_dir)
+                scenarios.append(dict(stats, name=name, resolution=resolution, density=density))
+        finally:
+            server.shutdown()
+
+    results = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "environment": {"platform": platform.platform(), "python": platform.python_version(),
+                        "cpus": os.cpu_count()},
+        "config": {key: getattr(args, key) for key in _CONFIG_KEYS},
+        "injected_errors": {"translation": server.stub_stats["errors"], "tts": tts_stub.errors if tts_stub else 0},
+        "scenarios": scenarios,
+    }
+    regressions = []
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        changed = [key for key in _CONFIG_KEYS if baseline.get("config", {}).get(key) != results["config"][key]]
+        if changed:
+            print(f"⚠️ إعدادات خط الأساس مختلفة ({', '.join(changed)})؛ المقارنة تقريبية")
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+    print_report(results)
+
+    for path in filter(None, [args.output, args.baseline if args.save_baseline else None]):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"💾 تم حفظ النتائج في {path}")
+    for name, metric, before, after in regressions:
+        print(f"🔴 تراجع في {name}: {metric} من {before:g} إلى {after:g}")
+    failed = any(status != "done" for scenario in scenarios for status in scenario["statuses"])
+    return 1 if regressions or failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+إلغاء تعاوني لمهام الدبلجة: رمز إلغاء (CancelToken) واحد لكل تشغيل ينتقل إلى كل المراحل عبر متغير سياق
+(مثل معرّف المهمة في core.metrics). عند الإلغاء تُستدعى فورًا الدوال المسجلة عليه: إلغاء coroutines الشبكة
+وTTS على الحلقة المشتركة (فتُقطع طلبات HTTP الجارية)، وقتل عمليات ffmpeg وWhisper الفرعية،
+بدل انتظار نقطة الفحص التالية أو انتهاء المهلة.
+"""
+
+import contextlib
+import contextvars
+import os
+import subprocess
+import threading
+from .tracing import span
+
+# كل كم ثانية يُفحص should_stop العادي (غير CancelToken) لتحويله إلى إلغاء فوري
+STOP_POLL_SECONDS = 0.2
+
+_current_token = contextvars.ContextVar("cancel_token", default=None)
+
+class Cancelled(BaseException):
+    """
+    أُلغيت المهمة. يرث BaseException (مثل asyncio.CancelledError) حتى لا تبتلعه معالجات
+    except Exception التي تحوّل الأخطاء إلى قيم فشل (مثل merge_audio_with_video)، فيصل إلى محرك المراحل.
+    """
+
+class CancelToken:
+    """رمز إلغاء: يُستدعى كـ should_stop، وcancel() تشغّل الدوال المسجلة مرة واحدة."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = {}
+        self._next_key = 0
+
+    def __call__(self) -> bool:
+        return self._event.is_set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """انتظار الإلغاء حتى timeout ثانية (True إذا أُلغي)."""
+        return self._event.wait(timeout)
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks.values())
+            self._callbacks.clear()
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"⚠️ خطأ أثناء الإلغاء: {e}")
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise Cancelled()
+
+    def register(self, callback):
+        """تسجيل دالة تُستدعى عند الإلغاء (فورًا إذا كان قد أُلغي). يعيد مفتاحًا لـ unregister."""
+        with self._lock:
+            if not self._event.is_set():
+                self._next_key += 1
+                self._callbacks[self._next_key] = callback
+                return self._next_key
+        callback()
+        return None
+
+    def unregister(self, key):
+        with self._lock:
+            self._callbacks.pop(key, None)
+
+def current_token():
+    """رمز الإلغاء للتشغيل الحالي (أو None خارج المهام)."""
+    return _current_token.get()
+
+@contextlib.contextmanager
+def cancel_scope(token: CancelToken):
+    """ربط رمز الإلغاء بالسياق الحالي؛ خيوط المراحل تنسخ السياق فترثه."""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+@contextlib.contextmanager
+def on_cancel(callback):
+    """استدعاء callback عند إلغاء المهمة الحالية أثناء الكتلة (لا شيء خارج المهام)."""
+    token = current_token()
+    key = token.register(callback) if token else None
+    try:
+        yield
+    finally:
+        if key is not None:
+            token.unregister(key)
+
+def check_cancelled():
+    """رفع Cancelled إذا أُلغيت المهمة الحالية."""
+    token = current_token()
+    if token:
+        token.raise_if_cancelled()
+
+def bind_future(future):
+    """إلغاء future (مثل coroutine على الحلقة المشتركة) عند إلغاء المهمة الحالية."""
+    token = current_token()
+    if token is None:
+        return future
+    key = token.register(future.cancel)
+    if key is not None:
+        future.add_done_callback(lambda _: token.unregister(key))
+    return future
+
+@contextlib.contextmanager
+def token_for(should_stop):
+    """
+    CancelToken يقابل should_stop: يُعاد كما هو إذا كان رمزًا، وإلا يُراقَب بخيط (كل STOP_POLL_SECONDS)
+    طوال الكتلة حتى تصل طلبات الإيقاف من الأعلام العادية (مثل threading.Event.is_set) إلى الإلغاء الفوري.
+    """
+    if isinstance(should_stop, CancelToken):
+        yield should_stop
+        return
+    token = CancelToken()
+    if should_stop is None:
+        yield token
+        return
+    finished = threading.Event()
+
+    def watch():
+        while not finished.wait(STOP_POLL_SECONDS):
+            if should_stop():
+                token.cancel()
+                return
+
+    watcher = threading.Thread(target=watch, name="stop-watch", daemon=True)
+    watcher.start()
+    try:
+        yield token
+    finally:
+        finished.set()
+        watcher.join()
+
+def run_process(args, input=None, timeout: float = None, check: bool = False, capture_output: bool = False, **kwargs):
+    """
+    بديل subprocess.run تُقتل عمليته فور إلغاء المهمة الحالية (ثم يُرفع Cancelled).
+    خارج المهام يساوي subprocess.run تمامًا. كل عملية تُسجَّل كـ span في التتبع الزمني (core.tracing).
+    """
+    with span(os.path.basename(str(args[0])), "subprocess", argv=[str(a) for a in args[1:]]):
+        return _run_process(args, input, timeout, check, capture_output, **kwargs)
+
+def _run_process(args, input, timeout, check, capture_output, **kwargs):
+    token = current_token()
+    if token is None:
+        return subprocess.run(args, input=input, timeout=timeout, check=check, capture_output=capture_output, **kwargs)
+    token.raise_if_cancelled()
+    if input is not None:
+        kwargs["stdin"] = subprocess.PIPE
+    if capture_output:
+        kwargs["stdout"] = kwargs["stderr"] = subprocess.PIPE
+    with subprocess.Popen(args, **kwargs) as proc:
+        with on_cancel(proc.kill):
+            try:
+                stdout, stderr = proc.communicate(input, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.communicate()
+                raise
+    token.raise_if_cancelled()
+    if check and proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, args, stdout, stderr)
+    return subprocess.CompletedProcess(args, proc.returncode, stdout, stderr)
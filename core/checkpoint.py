@@ -0,0 +1,103 @@
+"""
+نقاط حفظ مهام الدبلجة: كل مهمة تعمل في مجلد ثابت (حسب الفيديو) فيه manifest.json يسجل لكل مرحلة
+حالتها وبصمة مدخلاتها ومخرجاتها ومسارات ملفاتها. عند إعادة تشغيل نفس الفيديو (أو resume) تُستعاد
+مخرجات المراحل التي لم تتغير مدخلاتها ولم تُحذف ملفاتها، وتُعاد فقط المرحلة التي فشلت وما بعدها.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+MANIFEST_NAME = "manifest.json"
+# يُرفع عند تغيير صيغة مخرجات المراحل حتى لا تُستعاد نقاط حفظ قديمة غير متوافقة
+CHECKPOINT_VERSION = 2
+
+def job_key(video_path: str) -> str:
+    """اسم مجلد المهمة: اسم الفيديو مع بصمة مساره الكامل (حتى لا يتصادم فيديوهان بنفس الاسم)."""
+    base = os.path.splitext(os.path.basename(video_path))[0]
+    digest = hashlib.sha1(os.path.abspath(video_path).encode("utf-8")).hexdigest()[:10]
+    return f"{base}_{digest}"
+
+def _file_stamp(path: str):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def _describe(value):
+    """تمثيل قابل للبصمة: الملفات الموجودة تُمثَّل بمسارها وحجمها ووقت تعديلها لا بمحتواها."""
+    if isinstance(value, str) and os.path.isfile(value):
+        return {"file": os.path.abspath(value), "stamp": _file_stamp(value)}
+    return value
+
+def fingerprint(stage, inputs: dict) -> str:
+    data = {
+        "stage": stage.name,
+        "params": stage.params,
+        "inputs": {name: _describe(value) for name, value in sorted(inputs.items())},
+    }
+    return hashlib.sha256(json.dumps(data, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+class Checkpoint:
+    """manifest.json لمجلد مهمة واحد (يُستخدم كـ checkpoint في StageGraph.run)."""
+
+    def __init__(self, work_dir: str, jobs: list = None):
+        self.work_dir = work_dir
+        self.path = os.path.join(work_dir, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        self.manifest = self.read(work_dir) or {}
+        if self.manifest.get("version") != CHECKPOINT_VERSION:
+            self.manifest = {"version": CHECKPOINT_VERSION, "created": round(time.time(), 3), "stages": {}}
+        if jobs is not None:
+            # إعدادات المهام تُحفظ ليتمكن resume من إعادة بنائها
+            self.manifest["jobs"] = jobs
+
+    @staticmethod
+    def read(work_dir: str):
+        try:
+            with open(os.path.join(work_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @property
+    def stages(self) -> dict:
+        return self.manifest["stages"]
+
+    def load(self, stage, inputs: dict):
+        """مخرجات المرحلة المحفوظة إذا تطابقت بصمة مدخلاتها وما زالت ملفاتها كما كانت، وإلا None."""
+        entry = self.stages.get(stage.name)
+        if not entry or entry.get("status") != "done" or entry.get("fingerprint") != fingerprint(stage, inputs):
+            return None
+        for path, stamp in entry.get("files", {}).items():
+            if not os.path.isfile(path) or _file_stamp(path) != stamp:
+                return None
+        return entry["outputs"]
+
+    def save(self, stage, inputs: dict, outputs: dict, seconds: float):
+        """حفظ مخرجات مرحلة ناجحة؛ المخرجات غير القابلة للتمثيل في JSON ترفع TypeError بدل تحويلها إلى نصوص."""
+        try:
+            json.dumps(outputs, ensure_ascii=False)
+        except (TypeError, ValueError) as e:
+            raise TypeError(f"مخرجات المرحلة {stage.name} لا يمكن حفظها في نقطة الحفظ: {e}") from e
+        files = {value: _file_stamp(value) for value in outputs.values()
+                 if isinstance(value, str) and os.path.isfile(value)}
+        self._update(stage.name, {
+            "status": "done", "fingerprint": fingerprint(stage, inputs),
+            "outputs": outputs, "files": files, "seconds": round(seconds, 3),
+        })
+
+    def mark(self, stage, status: str, error=None):
+        entry = dict(self.stages.get(stage.name, {}), status=status)
+        entry["error"] = f"{type(error).__name__}: {error}" if error is not None else None
+        self._update(stage.name, entry)
+
+    def _update(self, name: str, entry: dict):
+        with self._lock:
+            self.stages[name] = dict(entry, updated=round(time.time(), 3))
+            self.manifest["updated"] = round(time.time(), 3)
+            # كتابة ذرية: ملف مؤقت ثم استبدال، حتى لا يبقى manifest ناقصًا عند انهيار العملية
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.path)
@@ -2,11 +2,15 @@ import subprocess
 import os
 import sys
 import platform
-import requests
+import threading
 import zipfile
 import shutil
 from pathlib import Path
 
+# مسار ffmpeg بعد أول فحص ناجح (الفحص يشغّل ffmpeg مرتين وقد يحمّله، فلا يُعاد لكل استدعاء)
+_ffmpeg_path = None
+_ffmpeg_lock = threading.Lock()
+
 def check_ffmpeg_installed():
     """التحقق من وجود ffmpeg في النظام."""
     try:
@@ -43,6 +47,8 @@ def download_and_extract_ffmpeg():
             return True
             
         print("❌ ffmpeg غير موجود، جاري التحميل...")
+        # requests يُستورد هنا فقط حتى لا يبطئ بدء التطبيق
+        import requests
         
         # إنشاء مجلد ffmpeg في مجلد التطبيق
         app_dir = Path(__file__).parent.parent
@@ -124,7 +130,17 @@ def get_ffmpeg_path():
     return r"C:\ffmpeg-master-latest-win64-gpl-shared\bin\ffmpeg.exe"
 
 def ensure_ffmpeg_available():
-    """التأكد من توفر ffmpeg وتثبيته إذا لزم الأمر."""
+    """
+    التأكد من توفر ffmpeg وتثبيته إذا لزم الأمر.
+    أول نتيجة ناجحة تُحفظ لبقية الجلسة، والاستدعاءات المتزامنة (مثل التهيئة في الخلفية) تنتظر نفس الفحص.
+    """
+    global _ffmpeg_path
+    with _ffmpeg_lock:
+        if _ffmpeg_path is None:
+            _ffmpeg_path = _check_ffmpeg()
+        return _ffmpeg_path
+
+def _check_ffmpeg():
     print("🔧 فحص وتثبيت ffmpeg...")
     
     ffmpeg_path = get_ffmpeg_path()
@@ -0,0 +1,270 @@
+"""
+ذاكرة مهام الدبلجة: RSS الحالي للعملية وكل عملياتها الفرعية (Whisper وffmpeg تعمل في عمليات منفصلة
+وهي غالبًا الأكبر)، وعينات دورية في خيط خلفي لذروة كل مرحلة ومهمة، وتحكم قبول يبدأ المهام فقط إذا اتسع
+تقدير ذاكرتها (من نموذج Whisper ومدة الفيديو) في ميزانية الجهاز، فتنتظر المهام الأخرى بدل أن تُنهي
+العملية كلها بنفاد الذاكرة.
+على Linux يُقرأ /proc مباشرة، وعلى الأنظمة الأخرى يُستخدم psutil إن كان مثبتًا (وإلا تُعاد None).
+"""
+
+import collections
+import contextlib
+import os
+import threading
+import time
+from .cancellation import on_cancel, check_cancelled
+
+# الفاصل بين عينات RSS بالثواني
+RSS_SAMPLE_SECONDS = 0.1
+# نسبة ذاكرة الجهاز المتاحة للمهام إذا لم تُحدد ميزانية
+DEFAULT_BUDGET_FRACTION = 0.75
+# ذروة عملية Whisper (CLI على المعالج بأوزان fp32 مع torch) لكل نموذج، بالميغابايت
+WHISPER_MODEL_MEMORY_MB = {"tiny": 500, "base": 600, "small": 1200, "medium": 3300, "large": 6300, "turbo": 3400}
+# ذاكرة ثابتة لكل مهمة (مخازن الترجمة وTTS وffmpeg) بالميغابايت
+JOB_BASE_MEMORY_MB = 200
+# Whisper يحمّل الموجة كاملة (float32 بمعدل 16kHz) بعد قراءتها من ffmpeg (int16)
+STT_BYTES_PER_SECOND = 16000 * (4 + 2)
+# الخط الزمني لكل لغة: مخزن float32 بمعدل 24kHz والمقاطع المفكوكة قبل وضعها
+TIMELINE_BYTES_PER_SECOND = 24000 * 4 * 2
+# المدة المفترضة للتقدير إذا تعذرت قراءة مدة الفيديو
+ESTIMATE_FALLBACK_SECONDS = 1800
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_HAS_PROC = os.path.isdir("/proc/self")
+
+def _proc_rss(pid) -> int:
+    with open(f"/proc/{pid}/statm", "r") as f:
+        return int(f.read().split()[1]) * _PAGE_SIZE
+
+def _proc_children(pid: int):
+    """كل العمليات المنحدرة من pid (من حقل ppid في /proc/*/stat)."""
+    parents = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat", "r") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # اسم العملية بين قوسين قد يحتوي مسافات: الحقول بعد آخر ")"
+        parents.setdefault(int(stat[stat.rfind(")") + 2:].split()[1]), []).append(int(name))
+    found, stack = [], [pid]
+    while stack:
+        for child in parents.get(stack.pop(), []):
+            found.append(child)
+            stack.append(child)
+    return found
+
+def process_rss(include_children: bool = True):
+    """RSS الحالي بالبايت لهذه العملية (ومع عملياتها الفرعية)، أو None إذا تعذر القياس."""
+    if _HAS_PROC:
+        total = _proc_rss("self")
+        if include_children:
+            for pid in _proc_children(os.getpid()):
+                try:
+                    total += _proc_rss(pid)
+                except OSError:
+                    # انتهت العملية بين القراءتين
+                    pass
+        return total
+    try:
+        import psutil
+    except ImportError:
+        return None
+    process = psutil.Process()
+    total = process.memory_info().rss
+    if include_children:
+        for child in process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+    return total
+
+def total_memory():
+    """الذاكرة الفعلية الكلية للجهاز بالبايت (أو None)."""
+    if _HAS_PROC:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) * 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.virtual_memory().total
+
+class MemoryWatch:
+    """ذروة RSS أثناء كتلة واحدة (مرحلة أو مهمة) وزيادتها عن قيمة البداية، بالبايت (None إذا تعذر القياس)."""
+
+    def __init__(self, start):
+        self.start = start
+        self.peak = start
+
+    def update(self, rss):
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    @property
+    def delta(self):
+        if self.peak is None or self.start is None:
+            return None
+        return self.peak - self.start
+
+    def to_dict(self) -> dict:
+        return {"peak": self.peak, "delta": self.delta}
+
+class MemoryMonitor:
+    """
+    خيط واحد يأخذ عينات RSS (العملية وعملياتها الفرعية) كل interval ثانية ما دامت هناك كتل مراقَبة،
+    وكل كتلة تحتفظ بذروتها. العينة تشمل كل ما يعمل في العملية، فذروة مرحلة تعمل مع مهام أخرى
+    تتضمن ذاكرتها أيضًا (delta أقرب لما أضافته المرحلة نفسها):
+
+        with get_memory_monitor().watch() as usage:
+            ...
+        print(usage.peak, usage.delta)
+    """
+
+    def __init__(self, interval: float = RSS_SAMPLE_SECONDS):
+        self.interval = interval
+        self._watches = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @contextlib.contextmanager
+    def watch(self):
+        usage = MemoryWatch(process_rss())
+        with self._lock:
+            self._watches.add(usage)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="memory-monitor", daemon=True)
+                self._thread.start()
+        try:
+            yield usage
+        finally:
+            with self._lock:
+                self._watches.discard(usage)
+            usage.update(process_rss())
+
+    def _run(self):
+        while True:
+            rss = process_rss()
+            with self._lock:
+                if not self._watches:
+                    # لا كتل مراقَبة: ينتهي الخيط ويبدأ غيره عند أول watch
+                    self._thread = None
+                    return
+                for usage in self._watches:
+                    usage.update(rss)
+            time.sleep(self.interval)
+
+_monitor = MemoryMonitor()
+
+def get_memory_monitor() -> MemoryMonitor:
+    return _monitor
+
+def _model_memory(model: str) -> int:
+    name = model.split(".")[0]
+    if name.startswith("large"):
+        name = "large"
+    return WHISPER_MODEL_MEMORY_MB.get(name, WHISPER_MODEL_MEMORY_MB["medium"]) * 1024 * 1024
+
+def estimate_job_memory(whisper_model: str = None, duration: float = None, languages: int = 1) -> int:
+    """
+    تقدير ذروة ذاكرة تشغيل فيديو بالبايت: نموذج Whisper (None إذا كان النص جاهزًا) وموجته الصوتية،
+    ومخزن الخط الزمني لكل لغة، فوق ذاكرة ثابتة للمهمة. المدة المجهولة تُعد ESTIMATE_FALLBACK_SECONDS.
+    """
+    seconds = duration or ESTIMATE_FALLBACK_SECONDS
+    total = JOB_BASE_MEMORY_MB * 1024 * 1024 + seconds * TIMELINE_BYTES_PER_SECOND * max(languages, 1)
+    if whisper_model:
+        total += _model_memory(whisper_model) + seconds * STT_BYTES_PER_SECOND
+    return int(total)
+
+class MemoryAdmission:
+    """
+    قبول المهام حسب ميزانية ذاكرة (بالبايت، None = دون حد): المهمة تحجز تقديرها قبل أن تبدأ، وإذا لم يتسع له
+    الباقي من الميزانية تنتظر في طابور (بالترتيب، حتى لا تنتظر المهام الكبيرة إلى الأبد) حتى تنتهي مهام أخرى.
+    المهمة التي تتجاوز الميزانية وحدها تُقبل عندما لا تعمل أي مهمة أخرى.
+    """
+
+    def __init__(self, budget: int = None):
+        self.budget = budget
+        self.reserved = 0
+        self.running = 0
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+
+    def _fits(self, ticket, amount: int) -> bool:
+        if self._queue[0] is not ticket:
+            return False
+        return self.budget is None or self.running == 0 or self.reserved + amount <= self.budget
+
+    def _wake(self):
+        with self._condition:
+            self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def admit(self, amount: int, on_wait=None):
+        """
+        حجز amount بايت طوال الكتلة؛ القيمة المرجعة زمن الانتظار بالثواني.
+        on_wait(reserved, budget) يُستدعى مرة واحدة إذا اضطرت المهمة للانتظار.
+        إلغاء المهمة الحالية أثناء الانتظار يرفع Cancelled فورًا (core.cancellation).
+        """
+        ticket = object()
+        queued = time.perf_counter()
+        with on_cancel(self._wake), self._condition:
+            self._queue.append(ticket)
+            try:
+                notified = False
+                while not self._fits(ticket, amount):
+                    check_cancelled()
+                    if not notified and on_wait:
+                        on_wait(self.reserved, self.budget)
+                        notified = True
+                    self._condition.wait()
+                check_cancelled()
+            except BaseException:
+                self._queue.remove(ticket)
+                self._condition.notify_all()
+                raise
+            self._queue.popleft()
+            self.reserved += amount
+            self.running += 1
+            # المهمة التالية في الطابور قد تتسع أيضًا
+            self._condition.notify_all()
+        try:
+            yield time.perf_counter() - queued
+        finally:
+            with self._condition:
+                self.reserved -= amount
+                self.running -= 1
+                self._condition.notify_all()
+
+def default_memory_budget():
+    """ميزانية الذاكرة: DUBBER_MEMORY_BUDGET_MB (0 = دون حد)، وإلا DEFAULT_BUDGET_FRACTION من ذاكرة الجهاز."""
+    raw = os.environ.get("DUBBER_MEMORY_BUDGET_MB")
+    if raw:
+        try:
+            megabytes = float(raw)
+        except ValueError:
+            print(f"⚠️ قيمة DUBBER_MEMORY_BUDGET_MB غير صالحة: {raw}")
+        else:
+            return int(megabytes * 1024 * 1024) if megabytes > 0 else None
+    total = total_memory()
+    return int(total * DEFAULT_BUDGET_FRACTION) if total else None
+
+_admission = None
+_admission_lock = threading.Lock()
+
+def get_memory_admission() -> MemoryAdmission:
+    """تحكم القبول المشترك لكل المهام في العملية (الواجهة وقائمة الانتظار معًا)."""
+    global _admission
+    with _admission_lock:
+        if _admission is None:
+            _admission = MemoryAdmission(default_memory_budget())
+        return _admission
+
+def format_bytes(value) -> str:
+    if value is None:
+        return "غير متاح"
+    return f"{value / (1024 * 1024):.0f} MB"
@@ -0,0 +1,164 @@
+"""
+سجل مقاييس داخلي (in-process) لمراحل خط الدبلجة.
+كل طلب شبكي يُسجَّل كسجل منظم مرتبط بالمهمة الحالية، مع عدادات وإحصائيات إجمالية،
+ويمكن تلخيص كل مهمة على حدة لمعرفة هل البطء من المزود أم من تحديد المعدل أم من التقسيم.
+"""
+
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current_job = ContextVar("dubber_job_id", default=None)
+
+def current_job_id():
+    """معرّف المهمة الحالية في هذا الخيط/السياق (أو None)."""
+    return _current_job.get()
+
+@contextmanager
+def job_scope(job_id: str):
+    """ربط كل المقاييس المسجلة داخل هذا السياق بالمهمة job_id."""
+    token = _current_job.set(job_id)
+    try:
+        yield job_id
+    finally:
+        _current_job.reset(token)
+
+def _percentile(values, p: float):
+    if not values:
+        return None
+    values = sorted(values)
+    rank = max(int(round(p / 100.0 * len(values))) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+class MetricsRegistry:
+    """عدادات وسلاسل قيم وسجلات طلبات لكل مهمة، آمنة للاستخدام من عدة خيوط."""
+
+    def __init__(self, max_samples: int = 10000, max_jobs: int = 200):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._samples = defaultdict(lambda: deque(maxlen=max_samples))
+        self._jobs = {}
+        self._max_jobs = max_jobs
+
+    def inc(self, name: str, value: float = 1, job_id: str = None):
+        """زيادة عداد عام، ومع عداد المهمة إذا كانت معروفة."""
+        job_id = job_id or current_job_id()
+        with self._lock:
+            self._counters[name] += value
+            if job_id:
+                self._job(job_id)["counters"][name] += value
+
+    def observe(self, name: str, value: float):
+        """إضافة قيمة إلى سلسلة (مثل زمن الاستجابة) لحساب النسب المئوية."""
+        with self._lock:
+            self._samples[name].append(value)
+
+    def record_request(self, stage: str, job_id: str = None, **fields):
+        """
+        تسجيل طلب شبكي واحد. الحقول المعتادة: provider, latency, queue_wait,
+        prompt_tokens, completion_tokens, cost, ok, cache_hit, error.
+        """
+        job_id = job_id or current_job_id()
+        record = {"stage": stage, "time": time.time(), **fields}
+        with self._lock:
+            if fields.get("cache_hit"):
+                self._counters[f"{stage}.cache_hits"] += 1
+            else:
+                self._counters[f"{stage}.requests"] += 1
+            if not fields.get("ok", True):
+                self._counters[f"{stage}.failures"] += 1
+            for key in ("latency", "queue_wait"):
+                if fields.get(key) is not None:
+                    self._samples[f"{stage}.{key}"].append(fields[key])
+            for key in ("prompt_tokens", "completion_tokens", "cost"):
+                if fields.get(key):
+                    self._counters[f"{stage}.{key}"] += fields[key]
+            if job_id:
+                self._job(job_id)["requests"].append(record)
+
+    def _job(self, job_id: str) -> dict:
+        job = self._jobs.get(job_id)
+        if job is None:
+            # الاحتفاظ بآخر المهام فقط لتجنب نمو الذاكرة في الجلسات الطويلة
+            if len(self._jobs) >= self._max_jobs:
+                self._jobs.pop(next(iter(self._jobs)))
+            job = self._jobs[job_id] = {"counters": defaultdict(float), "requests": [], "started": time.time()}
+        return job
+
+    def job_summary(self, job_id: str, stage: str = None) -> dict:
+        """ملخص المهمة: عدد الطلبات والإخفاقات والإعادات والتوكنات والتكلفة وأزمنة الانتظار والاستجابة."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return {}
+            requests = [r for r in job["requests"] if stage is None or r["stage"] == stage]
+            counters = dict(job["counters"])
+        network = [r for r in requests if not r.get("cache_hit")]
+        latencies = [r["latency"] for r in network if r.get("latency") is not None]
+        waits = [r["queue_wait"] for r in network if r.get("queue_wait") is not None]
+        by_provider = defaultdict(int)
+        for r in network:
+            by_provider[r.get("provider", "?")] += 1
+        return {
+            "job_id": job_id,
+            "requests": len(network),
+            "failures": sum(1 for r in network if not r.get("ok", True)),
+            "cache_hits": sum(1 for r in requests if r.get("cache_hit")),
+            "prompt_tokens": sum(r.get("prompt_tokens") or 0 for r in network),
+            "completion_tokens": sum(r.get("completion_tokens") or 0 for r in network),
+            "cost": sum(r.get("cost") or 0 for r in network),
+            "latency_total": sum(latencies),
+            "latency_p50": _percentile(latencies, 50),
+            "latency_p95": _percentile(latencies, 95),
+            "latency_max": max(latencies) if latencies else None,
+            "queue_wait_total": sum(waits),
+            "queue_wait_max": max(waits) if waits else None,
+            "by_provider": dict(by_provider),
+            "counters": counters,
+        }
+
+    def snapshot(self) -> dict:
+        """لقطة لجميع العدادات والنسب المئوية للسلاسل."""
+        with self._lock:
+            counters = dict(self._counters)
+            samples = {name: list(values) for name, values in self._samples.items()}
+        return {
+            "counters": counters,
+            "series": {
+                name: {"count": len(v), "p50": _percentile(v, 50), "p95": _percentile(v, 95), "max": max(v) if v else None}
+                for name, v in samples.items()
+            },
+        }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._samples.clear()
+            self._jobs.clear()
+
+def format_job_summary(summary: dict) -> str:
+    """نص مختصر لملخص المهمة لكتابته في السجل."""
+    if not summary:
+        return "لا توجد مقاييس لهذه المهمة"
+
+    def fmt(value):
+        return f"{value:.2f}s" if value is not None else "-"
+
+    counters = summary.get("counters", {})
+    return (
+        f"طلبات: {summary['requests']} | إخفاقات: {summary['failures']} | "
+        f"إعادات: {int(counters.get('translation.retries', 0))} | تحوط: {int(counters.get('translation.hedges', 0))} | "
+        f"ذاكرة مؤقتة: {summary['cache_hits']} | "
+        f"توكنات: {summary['prompt_tokens']}+{summary['completion_tokens']} | تكلفة: ${summary['cost']:.4f} | "
+        f"زمن الاستجابة p50/p95/max: {fmt(summary['latency_p50'])}/{fmt(summary['latency_p95'])}/{fmt(summary['latency_max'])} | "
+        f"انتظار الطابور: {fmt(summary['queue_wait_total'])} (أقصى {fmt(summary['queue_wait_max'])}) | "
+        f"المزودون: {summary['by_provider']}"
+    )
+
+# السجل المشترك للتطبيق
+registry = MetricsRegistry()
+
+def get_registry() -> MetricsRegistry:
+    return registry
@@ -0,0 +1,126 @@
+"""
+خادم HTTP محلي بديل لواجهة OpenRouter chat-completions للاختبار بدون شبكة.
+يعيد نص رسالة المستخدم كما هو (أو مع بادئة) بعد زمن استجابة قابل للضبط،
+ويمكنه إرجاع خطأ HTTP لنسبة من الطلبات (error_rate) لاختبار التحوط وإعادة المحاولة.
+
+مثال للتشغيل:
+    python -m core.openrouter_stub --port 8765 --latency 0.5
+ثم:
+    DUBBER_TRANSLATION_PROVIDERS='[{"name": "local", "url": "http://127.0.0.1:8765/api/v1/chat/completions", "model": "stub"}]'
+"""
+
+import re
+import json
+import random
+import threading
+import time
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        # إسكات سجل الطلبات الافتراضي
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        config = self.server.stub_config
+
+        delay = config["latency"] + random.uniform(0, config["jitter"])
+        if delay > 0:
+            time.sleep(delay)
+        fail = random.random() < config["error_rate"]
+        with self.server.stub_lock:
+            self.server.stub_stats["requests"] += 1
+            self.server.stub_stats["errors"] += fail
+        if fail:
+            data = json.dumps({"error": {"code": config["error_status"], "message": "injected error"}}).encode("utf-8")
+            self.send_response(config["error_status"])
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        user_text = ""
+        for message in payload.get("messages", []):
+            if message.get("role") == "user":
+                user_text = message.get("content", "")
+        # إزالة علامات ميزانية الطول «[≤N]» كما يفعل المترجم الحقيقي
+        content = config["prefix"] + re.sub(r"\[≤\d+\]\s*", "", user_text)
+
+        if payload.get("stream"):
+            self._send_stream(content, payload.get("model", "stub"))
+            return
+
+        body = {
+            "id": "stub-completion",
+            "model": payload.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": sum(len(m.get("content", "").split()) for m in payload.get("messages", [])),
+                "completion_tokens": len(content.split()),
+            },
+        }
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, content: str, model: str):
+        """إرسال الرد كأحداث SSE كلمة بكلمة كما تفعل OpenRouter عند stream=true."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(b": OPENROUTER PROCESSING\n\n")
+        for token in re.findall(r"\S+\s*", content):
+            event = {"id": "stub-completion", "model": model,
+                     "choices": [{"index": 0, "delta": {"content": token}}]}
+            self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if self.server.stub_config["token_delay"] > 0:
+                time.sleep(self.server.stub_config["token_delay"])
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+def start_stub_server(port: int = 0, latency: float = 0.0, jitter: float = 0.0, prefix: str = "", token_delay: float = 0.0,
+                      error_rate: float = 0.0, error_status: int = 500):
+    """
+    تشغيل الخادم البديل في خيط خلفي.
+    يعيد (server, url) حيث url هو عنوان chat/completions الجاهز للاستخدام كمزود.
+    عدد الطلبات والأخطاء المُحقنة في server.stub_stats.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), _StubHandler)
+    server.daemon_threads = True
+    server.stub_config = {"latency": latency, "jitter": jitter, "prefix": prefix, "token_delay": token_delay,
+                          "error_rate": error_rate, "error_status": error_status}
+    server.stub_stats = {"requests": 0, "errors": 0}
+    server.stub_lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, name="openrouter-stub", daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/api/v1/chat/completions"
+    return server, url
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="خادم OpenRouter محلي بديل للاختبار")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="زمن الاستجابة الثابت بالثواني")
+    parser.add_argument("--jitter", type=float, default=0.0, help="تذبذب عشوائي إضافي بالثواني")
+    parser.add_argument("--prefix", default="", help="بادئة تضاف إلى النص المعاد")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="التأخير بين كلمات الرد المتدفق بالثواني")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="نسبة الطلبات التي تُرجع خطأ (0-1)")
+    parser.add_argument("--error-status", type=int, default=500, help="رمز HTTP للأخطاء المُحقنة")
+    args = parser.parse_args()
+    server, url = start_stub_server(args.port, args.latency, args.jitter, args.prefix, args.token_delay,
+                                    args.error_rate, args.error_status)
+    print(f"✅ الخادم البديل يعمل على: {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,675 @@
+"""
+خط الدبلجة دون واجهة رسومية، مبني كرسم مراحل (core.stage_graph):
+
+    probe ─────────────────────────────┐
+    extract → stt (أو transcript) ─→ translate@لغة → tts@لغة → extend@لغة → mux@لغة
+
+    وضع التداخل (stream_segments): stt ⇢ dub_stream@لغة → extend@لغة → mux@لغة
+    مقاطع Whisper تتدفق عبر مخزن محدود (core.segment_stream) إلى ترجمة وتوليد صوت كل لغة أثناء
+    استمرار التحويل، فلا ينتظر إلا تجميع الخط الزمني والدمج اكتمال كل المقاطع.
+
+قياس المدة واستخراج الصوت يعملان معًا، ونص الفيديو يُحسب مرة واحدة ثم تتفرع منه مراحل كل لغة
+مستهدفة وتعمل فروع اللغات بالتوازي. كل مرحلة تحجز مكانًا من حد التوازي لنوع مواردها
+(CPU / شبكة / قرص) المشترك بين كل المهام في العملية.
+
+كل فيديو يعمل في مجلد ثابت (work_root/اسم_بصمة) مع نقاط حفظ (core.checkpoint): إذا فشلت مهمة
+يبقى المجلد، وإعادة تشغيلها تستعيد المراحل المكتملة وتعيد فقط ما فشل وما بعده.
+"""
+
+import contextlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from .audio_handler import extract_audio, merge_audio_with_video
+from .metrics import registry as metrics_registry, job_scope
+from .async_service import run_async, get_async_service
+from .tts_backends import get_tts_backend
+from .transcript_io import load_transcript, check_alignment, shift_segments, find_sidecar_transcript
+from .translator import translate_segments, translate_text_general, translate_text_stream
+from .text_to_speech import (generate_audio_for_language, generate_audio_from_sentences, generate_timed_audio,
+                             synthesize_segments, with_slots, finish_timed_audio, extend_video_duration,
+                             get_ffprobe_path, get_voice_for_language)
+from .speech_rate import record_observation
+from .stage_graph import StageGraph, StageLimiter as _BaseLimiter
+from .checkpoint import Checkpoint, job_key
+from .segment_stream import SegmentStream, parse_whisper_line
+from .cancellation import Cancelled, token_for, cancel_scope, on_cancel, run_process
+from .tracing import Trace, trace_scope, span, record, write_chrome_trace
+from .memory import get_memory_monitor, get_memory_admission, estimate_job_memory, format_bytes
+
+# نوع الموارد الذي تستهلكه كل مرحلة (يحدد أي حد توازي ينطبق عليها)
+STAGE_RESOURCES = {
+    "probe": "io",
+    "extract": "io",
+    "stt": "cpu",
+    "transcript": "io",
+    "translate": "network",
+    "tts": "network",
+    "translate_tts": "network",
+    # ينتظر مقاطع Whisper معظم وقته، فيحجز مكان "network" لكل دفعة يترجمها فقط (add_stream_branch)؛
+    # حجزه طوال المرحلة يمنع الفروع الزائدة عن الحد من القراءة فيتوقف Whisper عند امتلاء المخزن
+    "dub_stream": None,
+    "extend": "io",
+    "mux": "io",
+}
+# حدود التوازي الافتراضية: Whisper يستهلك كل الأنوية، والشبكة تحتمل عدة مهام معًا
+DEFAULT_STAGE_LIMITS = {"cpu": 1, "network": 4, "io": 2}
+
+# أسماء اللغات في اسم الفيديو الناتج (مثل video_Arabic.mp4)
+LANGUAGE_NAMES = {
+    "ar": "Arabic", "en": "English", "fr": "French", "es": "Spanish", "de": "German", "it": "Italian",
+    "pt": "Portuguese", "ru": "Russian", "zh": "Chinese", "ja": "Japanese", "ko": "Korean", "hi": "Hindi",
+    "tr": "Turkish", "nl": "Dutch", "pl": "Polish", "sv": "Swedish", "da": "Danish", "no": "Norwegian",
+    "fi": "Finnish", "he": "Hebrew", "fa": "Persian", "ur": "Urdu", "bn": "Bengali", "th": "Thai",
+    "vi": "Vietnamese", "id": "Indonesian", "ms": "Malay",
+}
+
+# رموز اللغات من أسمائها كما يعلنها Whisper ("Detected language: English")
+LANGUAGE_CODES = {name.lower(): code for code, name in LANGUAGE_NAMES.items()}
+
+# وضع التداخل: عدد المقاطع في كل طلب ترجمة، وأقصى انتظار لإكمال دفعة ناقصة (ثوانٍ)،
+# وعدد دفعات TTS الجارية قبل أن تنتظر الترجمة (ومعها Whisper عبر المخزن المحدود)
+STREAM_BATCH_SEGMENTS = 8
+STREAM_BATCH_WAIT = 2.0
+STREAM_TTS_IN_FLIGHT = 2
+
+_OPTIONAL_FLOAT = (float, int, type(None))
+# مجلد مهام الفيديو (ونقاط حفظها) عندما لا يُحدد غيره
+DEFAULT_WORK_ROOT = os.path.join("temp", "jobs")
+
+class JobStopped(Cancelled):
+    """أُوقفت المهمة بطلب من المستخدم."""
+
+class StageLimiter(_BaseLimiter):
+    """حدود التوازي لخط الدبلجة (القيم الناقصة من DEFAULT_STAGE_LIMITS)."""
+
+    def __init__(self, limits: dict = None):
+        super().__init__(dict(DEFAULT_STAGE_LIMITS, **(limits or {})))
+
+    @contextlib.contextmanager
+    def slot(self, resource: str, should_stop=None):
+        """حجز مكان (انظر StageLimiter.slot) مع تسجيل الانتظار في الطابور في التتبع الزمني."""
+        queued = time.perf_counter()
+        with super().slot(resource, should_stop) as waited:
+            record(f"wait {resource}", "queue", queued, queued + waited, resource=resource)
+            yield waited
+
+class DubbingJob:
+    """مهمة دبلجة واحدة (فيديو واحد إلى لغة واحدة) مع حالتها وأزمنة مراحلها."""
+
+    def __init__(self, video_path: str, target_language: str = "ar", output_dir: str = "output",
+                 source_language: str = None, voice_name: str = None, whisper_model: str = "medium",
+                 transcript_path: str = None, check_alignment: bool = True, tts_backend: str = None,
+                 stream_translation: bool = False, stream_segments: bool = False, job_id: str = None):
+        self.video_path = video_path
+        self.target_language = target_language
+        self.output_dir = output_dir
+        self.source_language = source_language
+        self.voice_name = voice_name
+        self.whisper_model = whisper_model
+        self.transcript_path = transcript_path
+        self.check_alignment = check_alignment
+        self.tts_backend = get_tts_backend(tts_backend).name
+        # تمرير الجمل المترجمة إلى توليد الصوت فور وصولها (مرحلة واحدة للترجمة والصوت)
+        self.stream_translation = stream_translation
+        # ترجمة وتوليد صوت مقاطع Whisper أثناء استمرار التحويل (انظر core.segment_stream)
+        self.stream_segments = stream_segments
+        base = os.path.splitext(os.path.basename(video_path))[0]
+        self.job_id = job_id or f"{base}_{target_language}_{int(time.time())}"
+        self.work_dir = None
+        # التتبع الزمني للتشغيل (مشترك بين لغات نفس الفيديو) ومسار ملفه إن كُتب
+        self.trace = None
+        self.trace_path = None
+        self.status = "pending"
+        self.stage = None
+        self.error = None
+        self.output_path = None
+        self.duration = None
+        self.timings = {}
+        # الذاكرة بالبايت: التقدير قبل البدء وذروة التشغيل وذروة وزيادة كل مرحلة (core.memory)
+        self.memory = {}
+        # نتائج وسيطة تقرؤها الواجهة عند أحداث المراحل
+        self.transcript = ""
+        self.detected_language = None
+        self.translation = ""
+        self.audio_duration = None
+
+    @property
+    def final_path(self) -> str:
+        base, ext = os.path.splitext(os.path.basename(self.video_path))
+        name = LANGUAGE_NAMES.get(self.target_language, self.target_language)
+        return os.path.join(self.output_dir, f"{base}_{name}{ext}")
+
+    def config(self) -> dict:
+        """إعدادات المهمة (وسائط المُنشئ) كما تُحفظ في manifest نقطة الحفظ (بمسارات مطلقة)."""
+        return {
+            "video_path": os.path.abspath(self.video_path), "target_language": self.target_language,
+            "output_dir": os.path.abspath(self.output_dir),
+            "source_language": self.source_language, "voice_name": self.voice_name,
+            "whisper_model": self.whisper_model,
+            "transcript_path": os.path.abspath(self.transcript_path) if self.transcript_path else None,
+            "check_alignment": self.check_alignment, "tts_backend": self.tts_backend,
+            "stream_translation": self.stream_translation, "stream_segments": self.stream_segments,
+            "job_id": self.job_id,
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "job": self.job_id, "video": self.video_path, "language": self.target_language,
+            "status": self.status, "stage": self.stage, "error": self.error,
+            "output": self.output_path, "duration": self.duration, "timings": self.timings,
+            "memory": self.memory, "work_dir": self.work_dir, "trace": self.trace_path,
+        }
+
+def probe_duration(video_path: str):
+    """مدة الفيديو بالثواني عبر ffprobe (أو None)."""
+    result = run_process([
+        get_ffprobe_path(), "-v", "error", "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1", video_path
+    ], capture_output=True, text=True)
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        return None
+
+def run_whisper(audio_path: str, model: str, output_dir: str, should_stop=None, on_tick=None, poll: float = 1.0,
+                on_line=None) -> dict:
+    """
+    تشغيل Whisper في عملية منفصلة (يمكن إيقافها) وقراءة نتيجته JSON. on_tick(elapsed) يُستدعى كل poll ثانية.
+    on_line(line): يُستدعى لكل سطر يطبعه Whisper فور طباعته (مقاطع "[start --> end] text" ولغة المصدر).
+    """
+    # دون تخزين مؤقت لمخرجات العملية حتى تصل المقاطع سطرًا بسطر
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    proc = subprocess.Popen([
+        sys.executable, "-m", "whisper", os.path.abspath(audio_path),
+        "--model", model, "--output_format", "json", "--output_dir", output_dir, "--verbose", "True"
+    ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding="utf-8", errors="replace", env=env)
+
+    def read_stdout():
+        # القراءة المستمرة تمنع أيضًا امتلاء أنبوب stdout وتوقف Whisper في الفيديوهات الطويلة
+        for line in proc.stdout:
+            if on_line:
+                on_line(line)
+
+    reader = threading.Thread(target=read_stdout, name="whisper-stdout", daemon=True)
+    reader.start()
+    started = time.time()
+    try:
+        # الإلغاء يقتل Whisper فورًا بدل انتظار الفحص التالي
+        with on_cancel(proc.kill), span("whisper", "subprocess", model=model):
+            while proc.poll() is None:
+                if should_stop and should_stop():
+                    raise JobStopped()
+                if on_tick:
+                    on_tick(time.time() - started)
+                try:
+                    proc.wait(timeout=poll)
+                except subprocess.TimeoutExpired:
+                    pass
+        if should_stop and should_stop():
+            raise JobStopped()
+        reader.join()
+        stderr = proc.stderr.read()
+        if proc.returncode != 0:
+            raise RuntimeError(f"فشل Whisper (رمز الخطأ {proc.returncode}): {stderr.strip()[-500:]}")
+    finally:
+        if proc.poll() is None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+    json_path = os.path.join(output_dir, os.path.splitext(os.path.basename(audio_path))[0] + ".json")
+    with open(json_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _timed_segments(transcript: dict):
+    return [
+        {"start": seg["start"], "end": seg["end"], "text": seg["text"].strip()}
+        for seg in transcript.get("segments", [])
+    ]
+
+def _scoped(job_id: str, func, name: str = None, on_memory=None):
+    """
+    تنفيذ المرحلة ضمن نطاق مقاييس المهمة (طلبات الترجمة وTTS تُنسب إليها) وكـ span في التتبع الزمني.
+    on_memory({"peak", "delta"}) يُستدعى بعد المرحلة بذروة RSS أثناءها وزيادتها عن بدايتها.
+    """
+    def run(**kwargs):
+        with job_scope(job_id), span(name or func.__name__, "stage", job=job_id) as args:
+            usage = None
+            try:
+                with get_memory_monitor().watch() as usage:
+                    return func(**kwargs)
+            finally:
+                if usage is not None:
+                    args["rss_peak_mb"] = round(usage.peak / 2 ** 20) if usage.peak else None
+                    if on_memory:
+                        on_memory(usage.to_dict())
+    return run
+
+def build_graph(jobs, emit=None, should_stop=None, limiter: StageLimiter = None, probe=None) -> StageGraph:
+    """
+    رسم المراحل لفيديو واحد: المراحل المشتركة (المدة، الصوت، النص) ثم فرع لكل مهمة (لغة مستهدفة).
+    كل المهام يجب أن تكون لنفس الفيديو وبنفس إعدادات النص (Whisper أو النص الجاهز).
+    limiter: حدود التوازي التي يحجز منها فرع التداخل (dub_stream) مكانًا لكل دفعة يترجمها.
+    probe(video_path): دالة مرحلة المدة (الافتراضي probe_duration)؛ run_jobs يمرر المدة التي قاسها للتقدير.
+    """
+    emit = emit or (lambda event: None)
+    first = jobs[0]
+    shared = {"jobs": [job.job_id for job in jobs]}
+    graph = StageGraph()
+
+    def add(name, func, inputs, outputs, job=None, on_done=None, on_abort=None):
+        # إعدادات المهمة التي تغيّر مخرجات المرحلة تدخل في بصمة نقطة الحفظ
+        params = _stage_params(job) if job else {"source_language": first.source_language,
+                                                 "check_alignment": first.check_alignment}
+        stage_name = f"{name}@{job.target_language}" if job else name
+
+        def on_memory(usage):
+            for owner in [job] if job else jobs:
+                owner.memory.setdefault("stages", {})[name] = usage
+
+        graph.add(name, _scoped(job.job_id if job else first.job_id, func, stage_name, on_memory), inputs, outputs,
+                  resource=STAGE_RESOURCES[name], branch=job.target_language if job else None,
+                  labels={"job": job.job_id} if job else shared, params=params, on_done=on_done, on_abort=on_abort)
+
+    # نتائج المراحل تُنسخ إلى المهام عند انتهائها أو استعادتها من نقطة الحفظ
+    def set_duration(outputs):
+        for job in jobs:
+            job.duration = outputs["duration"]
+
+    def publish(outputs):
+        transcript = outputs["transcript"]
+        for job in jobs:
+            job.transcript = transcript.get("text", "").strip()
+            job.detected_language = job.source_language or transcript.get("language") or "unknown"
+
+    add("probe", probe or probe_duration, {"video_path": str}, {"duration": _OPTIONAL_FLOAT}, on_done=set_duration)
+    if first.transcript_path:
+        def transcript(video_path, transcript_path):
+            result = load_transcript(transcript_path)
+            if not result["segments"]:
+                raise ValueError(f"ملف النص لا يحتوي مقاطع موقوتة: {transcript_path}")
+            if first.check_alignment:
+                report = check_alignment(result["segments"], video_path)
+                if report and report["apply"]:
+                    print(f"⚠️ توقيت النص منزاح عن الصوت: تطبيق إزاحة {report['offset']:+.2f}s")
+                    result["segments"] = shift_segments(result["segments"], report["offset"])
+            return result
+
+        add("transcript", transcript, {"video_path": str, "transcript_path": str}, {"transcript": dict},
+            on_done=publish)
+    else:
+        # مخزن المقاطع المشترك بين Whisper وفروع اللغات في وضع التداخل
+        streaming = [job.target_language for job in jobs if job.stream_segments]
+        stream = SegmentStream(streaming) if streaming else None
+
+        def extract(video_path, work_dir):
+            wav_path = os.path.join(work_dir, "audio.wav")
+            if not extract_audio(video_path, wav_path):
+                raise RuntimeError("فشل في استخراج الصوت من الفيديو")
+            return wav_path
+
+        def on_line(line):
+            parsed = parse_whisper_line(line)
+            if parsed and parsed[0] == "language":
+                stream.set_language(parsed[1])
+            elif parsed and parsed[1]["text"]:
+                stream.put(parsed[1], should_stop=should_stop)
+
+        def stt(wav_path, work_dir, whisper_model):
+            tick = lambda elapsed: emit({"event": "stage_progress", "stage": "stt", **shared, "elapsed": round(elapsed, 1)})
+            try:
+                result = run_whisper(wav_path, whisper_model, work_dir, should_stop, tick, on_line=on_line if stream else None)
+            except BaseException as e:
+                if stream:
+                    stream.close(e)
+                raise
+            if stream:
+                stream.close()
+            return result
+
+        def transcribed(outputs):
+            publish(outputs)
+            if stream and not stream.closed:
+                # النص مستعاد من نقطة الحفظ: تمرير كل مقاطعه إلى الفروع التي لم تكتمل
+                stream.set_language(outputs["transcript"].get("language"))
+                for seg in _timed_segments(outputs["transcript"]):
+                    if seg["text"]:
+                        stream.put(seg, block=False)
+                stream.close()
+
+        add("extract", extract, {"video_path": str, "work_dir": str}, {"wav_path": str})
+        add("stt", stt, {"wav_path": str, "work_dir": str, "whisper_model": str}, {"transcript": dict},
+            on_done=transcribed)
+
+    for job in jobs:
+        if job.stream_segments and not first.transcript_path:
+            add_stream_branch(add, job, stream, should_stop, limiter)
+        else:
+            add_language_branch(add, job, should_stop)
+    return graph
+
+def _stage_params(job) -> dict:
+    return {
+        "source_language": job.source_language, "voice_name": job.voice_name, "whisper_model": job.whisper_model,
+        "tts_backend": job.tts_backend, "output_path": os.path.abspath(job.final_path),
+    }
+
+def _job_voice(job) -> str:
+    """الصوت الفعلي للمهمة بعد اختيار الصوت الافتراضي للغة (مفتاح سرعة النطق المتعلَّمة في core.speech_rate)."""
+    return get_tts_backend(job.tts_backend).resolve_voice(job.voice_name or get_voice_for_language(job.target_language),
+                                                          job.target_language)
+
+def add_language_branch(add, job, should_stop=None):
+    """مراحل لغة مستهدفة واحدة: الترجمة ← توليد الصوت ← تمديد الفيديو إن لزم ← الدمج (add_output_stages)."""
+
+    def audio_path_for(work_dir):
+        return os.path.join(work_dir, f"audio_{job.target_language}.mp3")
+
+    def stopped():
+        if should_stop and should_stop():
+            raise JobStopped()
+
+    def translate(transcript):
+        segments = _timed_segments(transcript)
+        if segments:
+            translations = translate_segments(segments, job.detected_language, job.target_language, voice=_job_voice(job))
+            translation = " ".join(t for t in translations if t)
+            timed = [
+                {"start": seg["start"], "end": seg["end"], "text": text or ""}
+                for seg, text in zip(segments, translations)
+            ]
+        else:
+            translation = translate_text_general(transcript.get("text", "").strip(), job.detected_language,
+                                                 job.target_language)
+            timed = []
+        return {"translation": translation, "timed_segments": timed}
+
+    def tts(translation, timed_segments, duration, work_dir):
+        audio_path = audio_path_for(work_dir)
+        if timed_segments:
+            # صوت لكل مقطع يوضع عند توقيته الأصلي على الخط الزمني (يحدّث جدول سرعة النطق بنفسه)
+            coro = generate_timed_audio(timed_segments, job.target_language, audio_path, target_duration=duration,
+                                        voice_name=job.voice_name, backend=job.tts_backend)
+        else:
+            coro = generate_audio_for_language(translation, job.target_language, audio_path, target_duration=duration,
+                                               voice_name=job.voice_name, backend=job.tts_backend)
+        success, audio_duration = run_async(coro)
+        if not success:
+            raise RuntimeError("فشل في توليد الصوت")
+        if audio_duration and not timed_segments:
+            # تحديث جدول سرعة النطق من الصوت الفعلي لتحسين ميزانيات المهام القادمة
+            record_observation(job.target_language, _job_voice(job), translation, audio_duration)
+        return {"audio_path": audio_path, "audio_duration": audio_duration}
+
+    def translate_tts(transcript, duration, work_dir):
+        # ترجمة متدفقة: توليد صوت الجملة الأولى يبدأ بينما تستمر الترجمة
+        audio_path = audio_path_for(work_dir)
+        sentences_done = []
+
+        def sentences():
+            for sentence in translate_text_stream(transcript.get("text", "").strip(), job.detected_language,
+                                                  job.target_language):
+                if should_stop and should_stop():
+                    return
+                sentences_done.append(sentence)
+                yield sentence
+
+        success, audio_duration = run_async(generate_audio_from_sentences(
+            sentences(), job.target_language, audio_path, target_duration=duration,
+            voice_name=job.voice_name, backend=job.tts_backend,
+        ))
+        stopped()
+        if not success:
+            raise RuntimeError("فشل في الترجمة المتدفقة أو توليد الصوت")
+        return {"translation": " ".join(sentences_done), "audio_path": audio_path, "audio_duration": audio_duration}
+
+    def set_translation(outputs):
+        job.translation = outputs["translation"]
+
+    def set_audio(outputs):
+        job.audio_duration = outputs["audio_duration"]
+
+    def set_translation_audio(outputs):
+        set_translation(outputs)
+        set_audio(outputs)
+
+    audio_outputs = {"audio_path": str, "audio_duration": _OPTIONAL_FLOAT}
+    if job.stream_translation:
+        add("translate_tts", translate_tts, {"transcript": dict, "duration": _OPTIONAL_FLOAT, "work_dir": str},
+            dict(audio_outputs, translation=str), job, on_done=set_translation_audio)
+    else:
+        add("translate", translate, {"transcript": dict}, {"translation": str, "timed_segments": list}, job,
+            on_done=set_translation)
+        add("tts", tts, {"translation": str, "timed_segments": list, "duration": _OPTIONAL_FLOAT, "work_dir": str},
+            audio_outputs, job, on_done=set_audio)
+    add_output_stages(add, job)
+
+def add_stream_branch(add, job, stream: SegmentStream, should_stop=None, limiter: StageLimiter = None):
+    """
+    فرع لغة في وضع التداخل: مرحلة واحدة تقرأ مقاطع Whisper دفعات من المخزن أثناء التحويل،
+    تترجم كل دفعة ثم ترسل توليد صوتها إلى حلقة الأحداث وتنتقل إلى الدفعة التالية،
+    ثم تجمع الخط الزمني بعد آخر مقطع. بعدها التمديد والدمج كالفرع العادي.
+    """
+    consumer = job.target_language
+
+    def stopped():
+        if should_stop and should_stop():
+            raise JobStopped()
+
+    def dub_stream(wav_path, duration, work_dir):
+        service = get_async_service()
+        tts_backend = get_tts_backend(job.tts_backend)
+        voice = _job_voice(job)
+        try:
+            announced = stream.wait_language(should_stop=should_stop)
+            source = job.source_language or LANGUAGE_CODES.get((announced or "").lower(), announced) or "auto"
+            timed, synthesis, held = [], [], None
+
+            def synthesize(batch, next_start):
+                # كل دفعة تُرسل إلى حلقة الأحداث؛ إذا تراكمت دفعات كثيرة تنتظر الترجمة أقدمها
+                while sum(1 for future in synthesis if not future.done()) >= STREAM_TTS_IN_FLIGHT:
+                    with span("wait tts", "queue"):
+                        next(future for future in synthesis if not future.done()).result()
+                synthesis.append(service.submit(synthesize_segments(
+                    with_slots(batch, duration, next_start), job.target_language,
+                    voice_name=voice, backend=tts_backend)))
+
+            for batch in stream.batches(consumer, STREAM_BATCH_SEGMENTS, STREAM_BATCH_WAIT, should_stop):
+                with limiter.slot("network", should_stop) if limiter else contextlib.nullcontext():
+                    translations = translate_segments(batch, source, job.target_language, voice=voice)
+                translated = [dict(seg, text=text or "") for seg, text in zip(batch, translations)]
+                # مدة آخر مقطع في الدفعة تمتد حتى بداية الدفعة التالية، لذلك تُرسل الدفعة بعد وصول التالية
+                if held:
+                    synthesize(held, translated[0]["start"])
+                held = translated
+                timed.extend(translated)
+            stopped()
+            if not timed:
+                raise RuntimeError("لم يصل أي مقطع من تحويل الصوت إلى نص")
+            synthesize(held, None)
+            results = [result for future in synthesis for result in future.result()]
+        finally:
+            stream.unsubscribe(consumer)
+        failed = [i + 1 for i, result in enumerate(results) if not result["ok"]]
+        if failed:
+            raise RuntimeError(f"فشل توليد المقاطع: {failed}")
+        audio_path = os.path.join(work_dir, f"audio_{job.target_language}.mp3")
+        audio_duration = finish_timed_audio(results, job.target_language, voice, audio_path, duration)
+        return {"translation": " ".join(seg["text"] for seg in timed if seg["text"]), "timed_segments": timed,
+                "audio_path": audio_path, "audio_duration": audio_duration}
+
+    def set_results(outputs):
+        # إذا كانت النتيجة مستعادة من نقطة الحفظ فلا يجب أن ينتظر Whisper هذا الفرع
+        stream.unsubscribe(consumer)
+        job.translation = outputs["translation"]
+        job.audio_duration = outputs["audio_duration"]
+
+    add("dub_stream", dub_stream, {"wav_path": str, "duration": _OPTIONAL_FLOAT, "work_dir": str},
+        {"translation": str, "timed_segments": list, "audio_path": str, "audio_duration": _OPTIONAL_FLOAT},
+        job, on_done=set_results, on_abort=lambda status: stream.unsubscribe(consumer))
+    add_output_stages(add, job)
+
+def add_output_stages(add, job):
+    """آخر مرحلتين في فرع اللغة: تمديد الفيديو إذا كان الصوت أطول منه، ثم دمج الصوت مع الفيديو."""
+
+    def extend(video_path, duration, audio_duration, work_dir):
+        if not (audio_duration and duration and audio_duration > duration):
+            return video_path
+        extended = os.path.join(work_dir, f"extended_{job.target_language}_{os.path.basename(video_path)}")
+        if not extend_video_duration(video_path, audio_duration, extended):
+            raise RuntimeError("فشل في تمديد مدة الفيديو")
+        return extended
+
+    def mux(mux_video, audio_path):
+        if not merge_audio_with_video(mux_video, audio_path, job.final_path):
+            raise RuntimeError("فشل في دمج الصوت مع الفيديو")
+        return job.final_path
+
+    def set_output(outputs):
+        job.output_path = outputs["output_path"]
+
+    add("extend", extend, {"video_path": str, "duration": _OPTIONAL_FLOAT, "audio_duration": _OPTIONAL_FLOAT,
+                           "work_dir": str}, {"mux_video": str}, job)
+    add("mux", mux, {"mux_video": str, "audio_path": str}, {"output_path": str}, job, on_done=set_output)
+
+def run_jobs(jobs, limiter: StageLimiter = None, on_event=None, should_stop=None,
+             work_root: str = None, keep_temp: bool = False, trace_dir: str = None, admission=None):
+    """
+    تنفيذ مهام فيديو واحد (لغة لكل مهمة) في رسم مراحل واحد: النص يُحسب مرة واحدة لكل اللغات.
+    on_event(dict) يُستدعى عند بداية ونهاية كل مرحلة ومهمة (قد يُستدعى من عدة خيوط).
+    مجلد العمل work_root/<مفتاح الفيديو> يبقى مع نقطة حفظه إذا لم تنجح كل المهام (أو مع keep_temp)،
+    ويُحذف بعد النجاح.
+    should_stop: CancelToken (إلغاء فوري) أو أي دالة تعيد True عند طلب الإيقاف (تُراقَب كل بضع أجزاء من الثانية).
+    التتبع الزمني للتشغيل في job.trace (core.tracing)، ويُكتب في trace_dir/<مفتاح الفيديو>.json إذا حُدد.
+    قبل البدء يُحجز تقدير ذاكرة التشغيل من admission (الافتراضي تحكم القبول المشترك في core.memory)، وإذا
+    لم يتسع في الميزانية ينتظر (مع حدث job_waiting) حتى تنتهي مهام أخرى. الذروة الفعلية في job.memory.
+    لا يرفع استثناءات: نتيجة كل مهمة في job.status ("done" / "failed" / "stopped") وjob.error.
+    """
+    jobs = list(jobs)
+    limiter = limiter or StageLimiter()
+    emit = on_event or (lambda event: None)
+    by_id = {job.job_id: job for job in jobs}
+    started = time.perf_counter()
+
+    def on_stage_event(event):
+        for job_id in [event["job"]] if "job" in event else event.get("jobs", []):
+            if event["event"] == "stage_started":
+                by_id[job_id].stage = event["stage"]
+        if event["event"] == "stage_finished" and not event.get("cached"):
+            metrics_registry.observe(f"stage.{event['stage']}.seconds", event["seconds"])
+        emit(event)
+
+    for job in jobs:
+        job.status = "running"
+        emit({"event": "job_started", "job": job.job_id, "video": job.video_path, "language": job.target_language})
+
+    first = jobs[0]
+    # مسار مطلق ثابت حتى تتطابق بصمات المراحل عند الاستئناف من مكان آخر
+    work_dir = os.path.abspath(os.path.join(work_root or DEFAULT_WORK_ROOT, job_key(first.video_path)))
+    os.makedirs(work_dir, exist_ok=True)
+    trace = Trace(os.path.basename(work_dir))
+    for job in jobs:
+        job.work_dir, job.trace = work_dir, trace
+    initial = {"video_path": first.video_path, "work_dir": work_dir, "whisper_model": first.whisper_model}
+    if first.transcript_path:
+        initial["transcript_path"] = first.transcript_path
+    # رمز إلغاء واحد لكل المراحل: الإيقاف يقطع طلبات الشبكة ويقتل ffmpeg/Whisper فورًا (core.cancellation)
+    with token_for(should_stop) as token, cancel_scope(token), trace_scope(trace):
+        try:
+            if not os.path.exists(first.video_path):
+                raise FileNotFoundError(f"ملف الفيديو غير موجود: {first.video_path}")
+            # المدة تُقاس مرة واحدة: لتقدير الذاكرة قبل البدء، ثم تصبح مخرج مرحلة probe دون تشغيل ffprobe ثانية
+            duration = probe_duration(first.video_path)
+            graph = build_graph(jobs, on_stage_event, token, limiter, probe=lambda video_path: duration)
+            checkpoint = Checkpoint(work_dir, [job.config() for job in jobs])
+            restored = [name for name, entry in checkpoint.stages.items() if entry.get("status") == "done"]
+            if restored:
+                print(f"♻️ نقطة حفظ موجودة في {work_dir}: {len(restored)} مرحلة مكتملة سابقًا")
+            # Whisper لا يعمل مع نص جاهز أو نص مستعاد من نقطة الحفظ
+            uses_whisper = not first.transcript_path and "stt" not in restored
+            estimate = estimate_job_memory(first.whisper_model if uses_whisper else None, duration, len(jobs))
+            for job in jobs:
+                job.memory["estimate"] = estimate
+
+            def on_wait(reserved, budget):
+                print(f"⏳ انتظار ذاكرة كافية: المهمة تحتاج ~{format_bytes(estimate)} والمحجوز "
+                      f"{format_bytes(reserved)} من {format_bytes(budget)}")
+                emit({"event": "job_waiting", "jobs": [job.job_id for job in jobs], "reason": "memory",
+                      "estimate": estimate, "reserved": reserved, "budget": budget})
+
+            with (admission or get_memory_admission()).admit(estimate, on_wait) as waited:
+                record("wait memory", "queue", time.perf_counter() - waited, estimate_mb=round(estimate / 2 ** 20))
+                with get_memory_monitor().watch() as usage, \
+                        span("run", "job", video=first.video_path, languages=[job.target_language for job in jobs]):
+                    result = graph.run(initial, limiter, on_stage_event, token, stopped_errors=(Cancelled,),
+                                       checkpoint=checkpoint)
+            for job in jobs:
+                job.memory["peak"] = usage.peak
+            for job in jobs:
+                # حالة المهمة من المراحل المشتركة ومراحل فرعها فقط
+                stages = [s for s in graph.stages if s.branch in (None, job.target_language)]
+                statuses = [result.status.get(s.name) for s in stages]
+                failed = [s for s in stages if result.status.get(s.name) == "failed"]
+                if failed:
+                    job.status = "failed"
+                    job.stage = failed[0].kind
+                    job.error = f"{type(result.errors[failed[0].name]).__name__}: {result.errors[failed[0].name]}"
+                elif "stopped" in statuses:
+                    job.status = "stopped"
+                else:
+                    job.status = "done" if all(status == "done" for status in statuses) else "failed"
+                job.timings.update({s.kind: result.timings[s.name] for s in stages if s.name in result.timings})
+        except Cancelled:
+            # أُوقفت قبل أن تبدأ (أثناء انتظار الذاكرة)
+            for job in jobs:
+                job.status = "stopped"
+        except Exception as e:
+            for job in jobs:
+                job.status, job.error = "failed", f"{type(e).__name__}: {e}"
+        finally:
+            if all(job.status == "done" for job in jobs) and not keep_temp:
+                shutil.rmtree(work_dir, ignore_errors=True)
+            elif not keep_temp:
+                print(f"💾 تم الاحتفاظ بنقطة الحفظ لاستئناف المهمة: python -m core.batch resume {work_dir}")
+            if trace_dir:
+                trace_path = write_chrome_trace(os.path.join(trace_dir, f"{trace.name}.json"), [trace])
+                for job in jobs:
+                    job.trace_path = trace_path
+            total = round(time.perf_counter() - started, 3)
+            for job in jobs:
+                job.timings["total"] = total
+                emit(dict(event="job_finished", **job.to_dict()))
+    return jobs
+
+def run_job(job: DubbingJob, limiter: StageLimiter = None, on_event=None, should_stop=None,
+            work_root: str = None, keep_temp: bool = False, trace_dir: str = None, admission=None) -> DubbingJob:
+    """تنفيذ مهمة دبلجة واحدة (انظر run_jobs)."""
+    return run_jobs([job], limiter, on_event, should_stop, work_root, keep_temp, trace_dir, admission)[0]
+
+def resume_jobs(job_ref: str, work_root: str = None):
+    """
+    إعادة بناء مهام فيديو من manifest نقطة حفظه لاستئنافها بـ run_jobs.
+    job_ref: مجلد المهمة، أو اسمه داخل work_root، أو مسار الفيديو الأصلي.
+    يعيد (المهام، work_root الذي يجب تمريره إلى run_jobs ليعمل في نفس المجلد).
+    """
+    root = work_root or DEFAULT_WORK_ROOT
+    candidates = [job_ref, os.path.join(root, job_ref)]
+    if os.path.isfile(job_ref):
+        candidates.append(os.path.join(root, job_key(job_ref)))
+    for work_dir in candidates:
+        manifest = Checkpoint.read(work_dir)
+        if manifest and manifest.get("jobs"):
+            return [DubbingJob(**config) for config in manifest["jobs"]], os.path.dirname(os.path.abspath(work_dir))
+    raise FileNotFoundError(f"لا توجد نقطة حفظ للمهمة: {job_ref}")
+
+def make_jobs(video_path: str, target_languages, use_sidecar: bool = True, **options):
+    """مهمة لكل لغة مستهدفة للفيديو، مع استخدام ملف الترجمة المجاور تلقائيًا إن وُجد."""
+    if use_sidecar and not options.get("transcript_path"):
+        options["transcript_path"] = find_sidecar_transcript(video_path)
+    return [DubbingJob(video_path, language, **options) for language in dict.fromkeys(target_languages)]
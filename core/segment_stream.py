@@ -0,0 +1,159 @@
+"""
+تدفق المقاطع بين مراحل الدبلجة: Whisper يكتب كل مقطع فور تحويله إلى نص، وفروع اللغات المستهدفة
+تقرأ المقاطع دفعات لترجمتها وتوليد صوتها بينما يستمر التحويل.
+
+SegmentStream مخزن بث محدود (bounded broadcast): لكل مستهلك موضع قراءة خاص، والمنتج ينتظر إذا
+تأخر أبطأ مستهلك بأكثر من maxsize مقطع (backpressure)، والمقاطع التي قرأها الجميع تُحذف من الذاكرة.
+"""
+
+import re
+import threading
+import time
+from .tracing import record
+
+# سطر مقطع في مخرجات Whisper (--verbose True): [00:01.000 --> 00:04.500] النص
+_WHISPER_SEGMENT = re.compile(r"^\[((?:\d+:)?\d+:\d+\.\d+)\s+-->\s+((?:\d+:)?\d+:\d+\.\d+)\]\s*(.*)$")
+_WHISPER_LANGUAGE = re.compile(r"^Detected language:\s*(.+?)\s*$")
+
+STREAM_MAXSIZE = 64
+# كل كم ثانية يُفحص طلب الإيقاف أثناء انتظار المقاطع
+STOP_POLL_SECONDS = 0.5
+
+def _seconds(timestamp: str) -> float:
+    seconds = 0.0
+    for part in timestamp.split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+def parse_whisper_line(line: str):
+    """("segment", {"start", "end", "text"}) أو ("language", الاسم) أو None لأي سطر آخر."""
+    line = line.strip()
+    match = _WHISPER_SEGMENT.match(line)
+    if match:
+        return "segment", {"start": _seconds(match.group(1)), "end": _seconds(match.group(2)),
+                           "text": match.group(3).strip()}
+    match = _WHISPER_LANGUAGE.match(line)
+    if match:
+        return "language", match.group(1)
+    return None
+
+class StreamClosed(Exception):
+    """أُغلق التدفق بخطأ من المنتج (فشل Whisper أو إيقاف المهمة)."""
+
+class SegmentStream:
+    """مخزن مقاطع محدود يُبث إلى عدة مستهلكين معروفين مسبقًا (مثل فروع اللغات)."""
+
+    def __init__(self, consumers, maxsize: int = STREAM_MAXSIZE):
+        self.maxsize = max(int(maxsize), 1)
+        self.language = None
+        self._items = []
+        self._offset = 0  # رقم أول مقطع ما زال في الذاكرة
+        self._cursors = {name: 0 for name in consumers}
+        self._closed = False
+        self._error = None
+        self._condition = threading.Condition()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def _lag(self) -> int:
+        end = self._offset + len(self._items)
+        return max((end - cursor for cursor in self._cursors.values()), default=0)
+
+    def _trim(self):
+        low = min(self._cursors.values(), default=self._offset + len(self._items))
+        if low > self._offset:
+            del self._items[:low - self._offset]
+            self._offset = low
+
+    def put(self, segment: dict, block: bool = True, should_stop=None):
+        """
+        إضافة مقطع؛ ينتظر ما دام أبطأ مستهلك متأخرًا بـ maxsize مقطع (إلا إذا block=False).
+        should_stop: يُفحص أثناء الانتظار؛ عند الإيقاف يُهمل المقطع بدل انتظار مستهلكين لن يقرؤوا.
+        """
+        with self._condition:
+            if block and not self._closed and self._lag() >= self.maxsize:
+                queued = time.perf_counter()
+                while not self._closed and self._lag() >= self.maxsize:
+                    if should_stop and should_stop():
+                        break
+                    self._condition.wait(STOP_POLL_SECONDS if should_stop else None)
+                record("backpressure", "queue", queued)
+            if self._closed or (should_stop and should_stop()):
+                return
+            self._items.append(segment)
+            self._condition.notify_all()
+
+    def set_language(self, language: str):
+        with self._condition:
+            self.language = language
+            self._condition.notify_all()
+
+    def close(self, error: Exception = None):
+        """نهاية التدفق (error: سبب الإغلاق إذا فشل المنتج). الإغلاق المتكرر لا يغيّر شيئًا."""
+        with self._condition:
+            if not self._closed:
+                self._closed, self._error = True, error
+            self._condition.notify_all()
+
+    def unsubscribe(self, consumer: str):
+        """مستهلك لن يقرأ بعد الآن (انتهى أو فشل أو استُعيدت نتيجته) فلا ينتظره المنتج."""
+        with self._condition:
+            self._cursors.pop(consumer, None)
+            self._trim()
+            self._condition.notify_all()
+
+    def batches(self, consumer: str, size: int, max_wait: float = None, should_stop=None):
+        """
+        قراءة المقاطع دفعات حتى size مقطع. مع max_wait تُسلَّم الدفعة الناقصة إذا لم تكتمل
+        خلال max_wait ثانية، حتى لا تنتظر الترجمة امتلاء الدفعة أثناء مقاطع Whisper البطيئة.
+        should_stop: يُفحص أثناء الانتظار؛ عند الإيقاف تنتهي القراءة دون بقية المقاطع.
+        """
+        while True:
+            with self._condition:
+                deadline = time.monotonic() + max_wait if max_wait else None
+                queued = time.perf_counter()
+                waited = False
+                while True:
+                    if should_stop and should_stop():
+                        return
+                    available = self._offset + len(self._items) - self._cursors[consumer]
+                    if available >= size or self._closed:
+                        break
+                    remaining = deadline - time.monotonic() if deadline else None
+                    if available and remaining is not None and remaining <= 0:
+                        break
+                    timeout = remaining if available else None
+                    if should_stop:
+                        timeout = min(timeout, STOP_POLL_SECONDS) if timeout is not None else STOP_POLL_SECONDS
+                    self._condition.wait(timeout)
+                    waited = True
+                if waited:
+                    record("wait segments", "queue", queued, consumer=consumer)
+                if self._error is not None:
+                    raise StreamClosed(str(self._error)) from self._error
+                start = self._cursors[consumer] - self._offset
+                batch = self._items[start:start + size]
+                self._cursors[consumer] += len(batch)
+                self._trim()
+                self._condition.notify_all()
+            if not batch:
+                return
+            yield batch
+
+    def wait_language(self, timeout: float = None, should_stop=None):
+        """
+        لغة المصدر التي أعلنها Whisper، أو None إذا وصل أول مقطع أو انتهى التدفق دون إعلانها
+        (Whisper يعلن اللغة قبل أول مقطع، ولا يعلنها إذا حُددت له).
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._condition:
+            while not (self.language is not None or self._closed or self._offset + len(self._items) > 0):
+                if should_stop and should_stop():
+                    break
+                remaining = deadline - time.monotonic() if deadline is not None else STOP_POLL_SECONDS
+                if remaining <= 0:
+                    break
+                self._condition.wait(min(remaining, STOP_POLL_SECONDS))
+            return self.language
@@ -0,0 +1,99 @@
+"""
+جدول سرعة النطق (حرف/ثانية) لكل لغة ولكل صوت، يُتعلَّم من مخرجات توليد الصوت السابقة.
+يُستخدم لتقدير عدد الأحرف التي تتسع لها مدة كل مقطع قبل الترجمة.
+"""
+
+import json
+import math
+import os
+import threading
+import unicodedata
+from .app_paths import get_cache_dir
+
+# قيم افتراضية تقريبية لسرعة النطق عند rate=+0% (أحرف منطوقة في الثانية)
+DEFAULT_CHARS_PER_SECOND = {
+    "ar": 12.0, "en": 15.0, "fr": 14.5, "es": 14.5, "de": 14.0, "it": 14.5, "pt": 14.5,
+    "ru": 13.5, "zh": 5.0, "ja": 7.5, "ko": 7.0, "hi": 13.0, "tr": 13.5, "nl": 14.5,
+    "pl": 13.5, "sv": 14.0, "da": 14.0, "no": 14.0, "fi": 13.5, "he": 12.0, "fa": 12.0,
+    "ur": 12.0, "bn": 12.5, "th": 11.0, "vi": 12.5, "id": 14.5, "ms": 14.5,
+}
+FALLBACK_CHARS_PER_SECOND = 14.0
+
+# وزن القياس الجديد في المتوسط المتحرك الأسي
+LEARNING_RATE = 0.3
+# لا نتعلم من مقاطع قصيرة جدًا لأن فترات الصمت تشوه القياس
+MIN_OBSERVATION_SECONDS = 0.5
+# أقصى تسريع لقيمة rate في edge-tts عند ملاءمة المقطع لمدته (فوق ذلك يصبح الكلام غير مفهوم)
+MAX_RATE_PERCENT = 50
+
+_lock = threading.Lock()
+_table = None
+
+def _table_path() -> str:
+    return os.path.join(get_cache_dir(), "speech_rates.json")
+
+def _load():
+    global _table
+    if _table is None:
+        try:
+            with open(_table_path(), "r", encoding="utf-8") as f:
+                _table = json.load(f)
+        except (OSError, ValueError):
+            _table = {}
+    return _table
+
+def _save():
+    try:
+        tmp_path = _table_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(_table, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, _table_path())
+    except OSError as e:
+        print(f"⚠️ تعذر حفظ جدول سرعة النطق: {e}")
+
+def _key(language_code: str, voice: str = None) -> str:
+    return f"{language_code}|{voice or '*'}"
+
+def spoken_length(text: str) -> int:
+    """عدد الأحرف المنطوقة: يتجاهل علامات التشكيل والمسافات المتكررة."""
+    return sum(1 for ch in " ".join(text.split()) if not unicodedata.combining(ch))
+
+def get_chars_per_second(language_code: str, voice: str = None) -> float:
+    """سرعة النطق المتعلَّمة للصوت، ثم للغة، ثم القيمة الافتراضية."""
+    with _lock:
+        table = _load()
+        for key in (_key(language_code, voice), _key(language_code)):
+            entry = table.get(key)
+            if entry:
+                return entry["cps"]
+    return DEFAULT_CHARS_PER_SECOND.get(language_code, FALLBACK_CHARS_PER_SECOND)
+
+def record_observation(language_code: str, voice: str, text: str, seconds: float):
+    """تحديث الجدول من صوت مولَّد فعليًا (النص ومدته)."""
+    chars = spoken_length(text)
+    if not seconds or seconds < MIN_OBSERVATION_SECONDS or chars == 0:
+        return
+    observed = chars / seconds
+    with _lock:
+        table = _load()
+        for key in {_key(language_code, voice), _key(language_code)}:
+            entry = table.get(key)
+            if entry:
+                entry["cps"] = (1 - LEARNING_RATE) * entry["cps"] + LEARNING_RATE * observed
+                entry["samples"] += 1
+            else:
+                table[key] = {"cps": observed, "samples": 1}
+        _save()
+
+def rate_percent_for(text: str, seconds: float, language_code: str, voice: str = None,
+                     max_percent: int = MAX_RATE_PERCENT) -> int:
+    """نسبة التسريع (rate بالمئة) اللازمة لنطق النص خلال seconds ثانية، أو 0 إذا اتسعت المدة."""
+    if not seconds or seconds <= 0:
+        return 0
+    natural = spoken_length(text) / get_chars_per_second(language_code, voice)
+    percent = math.ceil((natural / seconds - 1) * 100)
+    return min(max(percent, 0), max_percent)
+
+def char_budget(duration: float, language_code: str, voice: str = None) -> int:
+    """أقصى عدد أحرف منطوقة يتسع لمدة المقطع (بالثواني)."""
+    return max(int(duration * get_chars_per_second(language_code, voice)), 4)
@@ -1,12 +1,18 @@
-import whisper
 import os
 from pathlib import Path
 
-def is_whisper_model_downloaded(model_name: str) -> bool:
+def _load_model(model_name: str):
+    # whisper (ومعه torch) يُستورد عند أول استخدام فقط لأن استيراده يستغرق عدة ثوانٍ
+    import whisper
+    return whisper.load_model(model_name)
+
+def whisper_model_path(model_name: str) -> str:
     # Whisper downloads models to ~/.cache/whisper or WHISPER_CACHE_DIR
     cache_dir = os.environ.get("WHISPER_CACHE_DIR") or os.path.join(Path.home(), ".cache", "whisper")
-    model_file = os.path.join(cache_dir, f"{model_name}.pt")
-    return os.path.exists(model_file)
+    return os.path.join(cache_dir, f"{model_name}.pt")
+
+def is_whisper_model_downloaded(model_name: str) -> bool:
+    return os.path.exists(whisper_model_path(model_name))
 
 def detect_language(audio_path: str, model_name: str = "medium") -> str:
     """اكتشاف لغة الفيديو تلقائيًا باستخدام Whisper."""
@@ -14,7 +20,7 @@ def detect_language(audio_path: str, model_name: str = "medium") -> str:
         raise FileNotFoundError(f"الملف الصوتي غير موجود: {audio_path}")
     
     print(f"🔍 اكتشاف لغة الفيديو: {audio_path}")
-    model = whisper.load_model(model_name)
+    model = _load_model(model_name)
     result = model.transcribe(audio_path, task="transcribe")
     
     # الحصول على اللغة المكتشفة
@@ -28,7 +34,7 @@ def transcribe_audio(audio_path: str, model_name: str = "medium", should_stop: b
     if not os.path.exists(audio_path):
         raise FileNotFoundError(f"الملف الصوتي غير موجود: {audio_path}")
     print(f"🧠 يتم الآن تحويل الصوت إلى نص من الملف: {audio_path} (model={model_name})")
-    model = whisper.load_model(model_name)
+    model = _load_model(model_name)
     result = model.transcribe(audio_path)
     return result.get("text", "")
 
@@ -38,7 +44,7 @@ def transcribe_with_language_detection(audio_path: str, model_name: str = "mediu
         raise FileNotFoundError(f"الملف الصوتي غير موجود: {audio_path}")
     
     print(f"🧠 تحويل الصوت إلى نص مع اكتشاف اللغة: {audio_path}")
-    model = whisper.load_model(model_name)
+    model = _load_model(model_name)
     result = model.transcribe(audio_path)
     
     text = result.get("text", "")
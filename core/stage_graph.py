@@ -0,0 +1,281 @@
+"""
+محرك صغير لتنفيذ خط المعالجة كرسم مراحل (stage graph): كل مرحلة تعلن مدخلاتها ومخرجاتها
+بأسمائها وأنواعها، وتبدأ بمجرد توفر مدخلاتها، فتعمل المراحل المستقلة معًا
+(مثل قياس مدة الفيديو واستخراج الصوت، أو فروع اللغات المستهدفة المختلفة).
+
+الفروع: مرحلة لها branch (مثل "ar") تكتب مخرجاتها باسم "الاسم@الفرع"، وعند قراءة المدخلات
+يُبحث أولًا عن نسخة الفرع ثم عن النسخة المشتركة، لذلك تُعرَّف مراحل كل لغة بنفس الأسماء.
+فشل مرحلة يوقف ما يعتمد عليها فقط؛ بقية الفروع تكمل.
+
+نقاط الحفظ (checkpoint): كائن اختياري يحفظ مخرجات كل مرحلة ناجحة مع بصمة مدخلاتها، فإذا
+أُعيد تشغيل الرسم بنفس المدخلات تُستعاد المخرجات دون تنفيذ المرحلة (انظر core.checkpoint).
+"""
+
+import concurrent.futures
+import contextlib
+import contextvars
+import threading
+import time
+
+# كل كم ثانية يُفحص طلب الإيقاف أثناء انتظار مكان في حد المورد
+SLOT_POLL_SECONDS = 0.2
+
+class StageError(Exception):
+    """خطأ في تعريف الرسم أو في مخرجات مرحلة (نوع أو اسم غير متوقع)."""
+
+class StageStopped(Exception):
+    """طُلب الإيقاف بينما كانت المرحلة تنتظر مكانًا في حد المورد (لم تبدأ)."""
+
+class StageLimiter:
+    """حدود التوازي لكل نوع موارد (مثل cpu / network / io)، مشتركة بين كل المهام في العملية."""
+
+    def __init__(self, limits: dict):
+        self.limits = {name: max(int(n), 1) for name, n in limits.items()}
+        self._semaphores = {name: threading.BoundedSemaphore(n) for name, n in self.limits.items()}
+
+    @contextlib.contextmanager
+    def slot(self, resource: str, should_stop=None):
+        """
+        حجز مكان من حد المورد؛ القيمة المرجعة هي زمن الانتظار في الطابور (بالثواني).
+        should_stop: يُفحص أثناء الانتظار، فالمرحلة الموقوفة لا تأخذ مكانًا تحرّر للمهام الأخرى (StageStopped).
+        """
+        semaphore = self._semaphores.get(resource)
+        queued = time.perf_counter()
+        if semaphore is not None:
+            while not semaphore.acquire(timeout=SLOT_POLL_SECONDS if should_stop else -1):
+                if should_stop():
+                    raise StageStopped(resource)
+        try:
+            yield time.perf_counter() - queued
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+
+def _key(name: str, branch: str = None) -> str:
+    return f"{name}@{branch}" if branch else name
+
+def _type_name(expected) -> str:
+    if isinstance(expected, tuple):
+        return " | ".join(t.__name__ for t in expected)
+    return expected.__name__
+
+class Stage:
+    """
+    مرحلة واحدة: func(**inputs) تعيد قاموس المخرجات (أو قيمة واحدة إذا كان لها مخرج واحد).
+    inputs / outputs: {الاسم: النوع} (النوع صنف أو tuple أصناف، وtype(None) يسمح بـ None).
+    labels: حقول إضافية تُضاف إلى أحداث المرحلة (مثل معرّف المهمة).
+    params: إعدادات تؤثر في المخرجات دون أن تكون مدخلات (تدخل في بصمة نقطة الحفظ).
+    on_done(outputs): يُستدعى بعد نجاح المرحلة أو استعادة مخرجاتها من نقطة الحفظ.
+    on_abort(status): يُستدعى إذا انتهت المرحلة دون نجاح ("failed" / "skipped" / "stopped")، بدأت أم لم تبدأ.
+    """
+
+    def __init__(self, name: str, func, inputs: dict = None, outputs: dict = None, resource: str = None,
+                 branch: str = None, labels: dict = None, params: dict = None, on_done=None, on_abort=None):
+        self.kind = name
+        self.branch = branch
+        self.name = _key(name, branch)
+        self.func = func
+        self.inputs = dict(inputs or {})
+        self.outputs = dict(outputs or {})
+        self.resource = resource
+        self.labels = dict(labels or {})
+        self.params = dict(params or {})
+        self.on_done = on_done
+        self.on_abort = on_abort
+
+    def output_keys(self):
+        return [_key(name, self.branch) for name in self.outputs]
+
+    def resolve(self, name: str, available) -> str:
+        """اسم المدخل في المخزن: نسخة الفرع إن وُجدت وإلا النسخة المشتركة."""
+        branch_key = _key(name, self.branch)
+        return branch_key if branch_key in available else name
+
+    def __repr__(self):
+        return f"Stage({self.name!r})"
+
+def _event(stage: "Stage", name: str, **fields) -> dict:
+    return {"event": name, "stage": stage.kind, "branch": stage.branch, **stage.labels, **fields}
+
+class GraphResult:
+    """نتيجة تنفيذ الرسم: المخرجات وحالة كل مرحلة وأخطاؤها وأزمنتها."""
+
+    def __init__(self):
+        self.artifacts = {}
+        self.status = {}
+        self.errors = {}
+        self.timings = {}
+
+    @property
+    def ok(self) -> bool:
+        return all(status == "done" for status in self.status.values())
+
+class StageGraph:
+    def __init__(self):
+        self.stages = []
+        self._producers = {}
+
+    def add(self, name: str, func, inputs: dict = None, outputs: dict = None, resource: str = None,
+            branch: str = None, labels: dict = None, params: dict = None, on_done=None, on_abort=None) -> Stage:
+        stage = Stage(name, func, inputs, outputs, resource, branch, labels, params, on_done, on_abort)
+        if any(s.name == stage.name for s in self.stages):
+            raise StageError(f"مرحلة مكررة: {stage.name}")
+        for key in stage.output_keys():
+            if key in self._producers:
+                raise StageError(f"المخرج {key} تنتجه مرحلتان: {self._producers[key].name} و{stage.name}")
+            self._producers[key] = stage
+        self.stages.append(stage)
+        return stage
+
+    def validate(self, initial):
+        """التأكد من أن كل مدخل متاح من القيم الأولية أو من مرحلة أخرى، ومن عدم وجود حلقات."""
+        available = set(initial)
+        remaining = list(self.stages)
+        while remaining:
+            progressed = False
+            for stage in list(remaining):
+                known = available | set(self._producers)
+                missing = [n for n in stage.inputs if stage.resolve(n, known) not in known]
+                if missing:
+                    raise StageError(f"مدخلات غير متاحة للمرحلة {stage.name}: {', '.join(missing)}")
+                if all(stage.resolve(n, available | set(self._producers)) in available for n in stage.inputs):
+                    available.update(stage.output_keys())
+                    remaining.remove(stage)
+                    progressed = True
+            if not progressed:
+                raise StageError(f"حلقة بين المراحل: {', '.join(s.name for s in remaining)}")
+
+    def _execute(self, stage: Stage, kwargs: dict, limiter, emit, should_stop=None):
+        with (limiter.slot(stage.resource, should_stop) if limiter else contextlib.nullcontext(0.0)) as waited:
+            emit(_event(stage, "stage_started", queue_wait=round(waited, 3)))
+            started = time.perf_counter()
+            result = stage.func(**kwargs)
+            elapsed = time.perf_counter() - started
+        return self._check_outputs(stage, result), elapsed
+
+    @staticmethod
+    def _check_outputs(stage: Stage, result) -> dict:
+        """قاموس مخرجات المرحلة بعد التأكد من أسمائها وأنواعها (للمخرجات الجديدة والمستعادة من نقطة الحفظ)."""
+        if len(stage.outputs) == 1 and not (isinstance(result, dict) and set(result) == set(stage.outputs)):
+            result = {next(iter(stage.outputs)): result}
+        result = result or {}
+        for name, expected in stage.outputs.items():
+            if name not in result:
+                raise StageError(f"المرحلة {stage.name} لم تُرجع المخرج {name}")
+            if not isinstance(result[name], expected):
+                raise StageError(f"المخرج {name} من {stage.name} نوعه {type(result[name]).__name__}، "
+                                 f"والمتوقع {_type_name(expected)}")
+        return result
+
+    def run(self, initial: dict, limiter: StageLimiter = None, on_event=None, should_stop=None,
+            stopped_errors=(), max_workers: int = None, checkpoint=None) -> GraphResult:
+        """
+        تنفيذ المراحل بالتوازي حسب توفر مدخلاتها.
+        stopped_errors: أنواع الاستثناءات التي تعني إيقافًا بطلب المستخدم (الحالة "stopped" لا "failed").
+        checkpoint: كائن فيه load(stage, inputs) -> المخرجات أو None، وsave(stage, inputs, outputs, seconds)،
+        وmark(stage, status, error=None) لتسجيل المراحل التي لم تنجح.
+        لا يرفع استثناءات المراحل: تظهر في result.status / result.errors.
+        """
+        self.validate(initial)
+        emit = on_event or (lambda event: None)
+        result = GraphResult()
+        artifacts = result.artifacts
+        artifacts.update(initial)
+        pending = list(self.stages)
+        running = {}
+
+        def finish(stage, outputs, elapsed, cached=False):
+            for name, value in outputs.items():
+                artifacts[_key(name, stage.branch)] = value
+            result.status[stage.name] = "done"
+            result.timings[stage.name] = round(elapsed, 3)
+            if stage.on_done:
+                stage.on_done(outputs)
+            emit(_event(stage, "stage_finished", seconds=round(elapsed, 3), cached=cached))
+
+        def settle(stage, status, error=None):
+            result.status[stage.name] = status
+            if error is not None:
+                result.errors[stage.name] = error
+            if checkpoint:
+                checkpoint.mark(stage, status, error)
+            if stage.on_abort:
+                stage.on_abort(status)
+
+        def blocked(stage):
+            for name in stage.inputs:
+                producer = self._producers.get(stage.resolve(name, artifacts.keys() | self._producers.keys()))
+                if producer is not None and result.status.get(producer.name) in ("failed", "skipped", "stopped"):
+                    return result.status[producer.name]
+            return None
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers or max(len(self.stages), 1),
+                                                   thread_name_prefix="stage") as pool:
+            while pending or running:
+                stop = bool(should_stop and should_stop())
+                restored = False
+                for stage in list(pending):
+                    reason = "stopped" if stop else blocked(stage)
+                    if reason:
+                        # ما يعتمد على مرحلة فاشلة يُتخطى، وما يعتمد على مرحلة موقوفة يُعتبر موقوفًا
+                        settle(stage, "stopped" if reason == "stopped" else "skipped")
+                        pending.remove(stage)
+                        emit(_event(stage, f"stage_{result.status[stage.name]}"))
+                        continue
+                    known = artifacts.keys() | self._producers.keys()
+                    keys = {name: stage.resolve(name, known) for name in stage.inputs}
+                    if all(key in artifacts for key in keys.values()):
+                        kwargs = {name: artifacts[key] for name, key in keys.items()}
+                        pending.remove(stage)
+                        cached = checkpoint.load(stage, kwargs) if checkpoint else None
+                        if cached is not None:
+                            try:
+                                cached = self._check_outputs(stage, cached)
+                            except StageError as e:
+                                # نقطة حفظ لا تطابق مخرجاتها المرحلة الحالية: تُعاد المرحلة بدل تمرير قيم خاطئة
+                                print(f"⚠️ مخرجات {stage.name} المحفوظة غير صالحة، ستُعاد المرحلة: {e}")
+                                cached = None
+                        if cached is not None:
+                            finish(stage, cached, 0.0, cached=True)
+                            restored = True
+                            continue
+                        # نسخ السياق حتى تصل متغيرات السياق (مثل معرّف المهمة للمقاييس) إلى خيط المرحلة
+                        context = contextvars.copy_context()
+                        future = pool.submit(context.run, self._execute, stage, kwargs, limiter, emit, should_stop)
+                        running[future] = (stage, kwargs)
+                        result.status[stage.name] = "running"
+                if restored and not running:
+                    # المراحل المستعادة من نقطة الحفظ قد تكون أتاحت مدخلات مراحل أخرى
+                    continue
+                if not running:
+                    if pending:
+                        raise StageError(f"مراحل لا يمكن تشغيلها: {', '.join(s.name for s in pending)}")
+                    break
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    stage, kwargs = running.pop(future)
+                    try:
+                        outputs, elapsed = future.result()
+                    except (StageStopped, *stopped_errors):
+                        settle(stage, "stopped")
+                        emit(_event(stage, "stage_stopped"))
+                        continue
+                    except Exception as e:
+                        if should_stop and should_stop():
+                            # خطأ ناتج عن قطع عمل المرحلة بعد طلب الإيقاف (مثل عملية فرعية مقتولة) ليس فشلًا
+                            settle(stage, "stopped")
+                            emit(_event(stage, "stage_stopped"))
+                            continue
+                        settle(stage, "failed", e)
+                        emit(_event(stage, "stage_failed", error=f"{type(e).__name__}: {e}"))
+                        continue
+                    if checkpoint:
+                        try:
+                            checkpoint.save(stage, kwargs, outputs, elapsed)
+                        except TypeError as e:
+                            # مخرجات لا تُستعاد كما هي عند الاستئناف: فشل صريح بدل حفظها كنصوص
+                            settle(stage, "failed", e)
+                            emit(_event(stage, "stage_failed", error=f"{type(e).__name__}: {e}"))
+                            continue
+                    finish(stage, outputs, elapsed)
+        return result
@@ -0,0 +1,111 @@
+"""
+محرك تطبيع النص متعدد اللغات المشترك بين الترجمة وتوليد الصوت.
+القواعد لكل لغة تُترجم مرة واحدة إلى جداول str.translate وتعابير منتظمة مُجمّعة مسبقًا،
+لذلك يكلف تطبيع كل مقطع تمريرة واحدة على النص.
+
+اختبار الأداء:
+    python -m core.text_normalizer
+"""
+
+import re
+
+# رموز غريبة تظهر بسبب مشاكل الترميز أو تنسيق Markdown ولا تُنطق
+# (علامتا الاستفهام والتعجب تبقيان لأنهما تؤثران على نغمة الصوت)
+_UNWANTED_SYMBOLS = "@#$%^&*+=|\\/<>`~"
+
+# محارف غير مرئية تُحذف لجميع اللغات (ZWNJ لا يُحذف لأنه مهم في الفارسية)
+_INVISIBLE = "\u200b\u2060\ufeff\u00ad"
+
+# قواعد خاصة بكل لغة: {محرف: بديل} حيث "" يعني الحذف
+_LANGUAGE_RULES = {
+    "ar": {"?": "؟", ",": "،", ";": "؛", "ـ": ""},
+    "fa": {"?": "؟", ",": "،", ";": "؛", "ـ": ""},
+    "ur": {"?": "؟", ",": "،", ";": "؛", "ـ": ""},
+}
+
+_SENTINEL = "\x00"
+# تكرار علامات الترقيم («!!!» أو «؟؟») يُختصر إلى علامة واحدة
+_REPEATED_PUNCT = re.compile(r"([!?؟.,،;؛])\1+")
+_REPEATED_PAIRS = tuple(p * 2 for p in "!?؟.,،;؛")
+
+_tables = {}
+
+def _build_table(language_code: str) -> list:
+    """
+    جدول translate كامل لمستوى BMP: كل محرف يُعيَّن إلى نفسه ما لم تغيّره قاعدة.
+    القائمة الكاملة أسرع من قاموس str.maketrans لأن المحارف غير الموجودة في
+    القاموس تُطلق LookupError داخليًا لكل محرف.
+    """
+    table = list(range(0x10000))
+    for symbol in _UNWANTED_SYMBOLS + _INVISIBLE:
+        table[ord(symbol)] = None
+    for symbol, replacement in _LANGUAGE_RULES.get(language_code, {}).items():
+        table[ord(symbol)] = replacement or None
+    return table
+
+def _get_table(language_code: str) -> list:
+    table = _tables.get(language_code)
+    if table is None:
+        table = _tables[language_code] = _build_table(language_code)
+    return table
+
+def _collapse_punctuation(text: str) -> str:
+    # لا نشغّل regex إلا عند وجود علامتين متتاليتين فعلًا (بحث نصي سريع في C)
+    for pair in _REPEATED_PAIRS:
+        if pair in text:
+            return _REPEATED_PUNCT.sub(r"\1", text)
+    return text
+
+def normalize_text(text: str, language_code: str) -> str:
+    """تطبيع مقطع واحد: حذف الرموز الغريبة، قواعد اللغة، وتوحيد المسافات."""
+    if not text:
+        return ""
+    # split/join يوحّد جميع أنواع المسافات (بما فيها NBSP) أسرع من regex
+    text = " ".join(text.translate(_get_table(language_code)).split())
+    return _collapse_punctuation(text)
+
+def normalize_batch(texts, language_code: str):
+    """
+    تطبيع عدة مقاطع دفعة واحدة: تُدمج بفاصل غير مرئي وتمر بتمريرة translate
+    وتوحيد مسافات واحدة فقط ثم تُقسَّم من جديد.
+    """
+    texts = list(texts)
+    if not texts:
+        return []
+    joined = _SENTINEL.join(t.replace(_SENTINEL, "") if _SENTINEL in t else t for t in texts)
+    joined = " ".join(joined.translate(_get_table(language_code)).split())
+    joined = joined.replace(" " + _SENTINEL, _SENTINEL).replace(_SENTINEL + " ", _SENTINEL)
+    return _collapse_punctuation(joined).split(_SENTINEL)
+
+def clean_arabic_text(text: str) -> str:
+    """تنظيف النص العربي (الاسم القديم، يُستورد من translator و text_to_speech للتوافق)."""
+    return normalize_text(text, "ar")
+
+def _legacy_clean_arabic_text(text: str) -> str:
+    """النسخة القديمة من clean_arabic_text، محفوظة للمقارنة في اختبار الأداء فقط."""
+    for symbol in ['!', '@', '#', '$', '%', '^', '&', '*', '+', '=', '|', '\\', '/', '<', '>', '?', '`', '~']:
+        text = text.replace(symbol, '')
+    return re.sub(r'\s+', ' ', text).strip()
+
+def run_benchmark(segments: int = 500, repeat: int = 20):
+    """مقارنة زمن التطبيع القديم والجديد على مقاطع عربية نموذجية."""
+    import timeit
+    sample = "مَرْحَبًا بِكَ فِي بَرْنَامَجِ الدَّبْلَجَةِ! هَلْ تَرَى *النَّتِيجَةَ*؟  نعم، @2024 #AI"
+    texts = [f"{sample} {i}" for i in range(segments)]
+
+    def measure(func):
+        # أفضل زمن من عدة جولات لتقليل أثر الضوضاء
+        return min(timeit.repeat(func, number=repeat, repeat=5)) / repeat
+
+    legacy = measure(lambda: [_legacy_clean_arabic_text(t) for t in texts])
+    single = measure(lambda: [normalize_text(t, "ar") for t in texts])
+    batch = measure(lambda: normalize_batch(texts, "ar"))
+
+    print(f"📊 تطبيع {segments} مقطع (أفضل متوسط من 5 جولات × {repeat} تكرار):")
+    print(f"   الطريقة القديمة (replace × 18 + regex): {legacy * 1000:.3f} ms")
+    print(f"   normalize_text لكل مقطع:               {single * 1000:.3f} ms ({legacy / single:.1f}x)")
+    print(f"   normalize_batch دفعة واحدة:            {batch * 1000:.3f} ms ({legacy / batch:.1f}x)")
+    return {"legacy": legacy, "single": single, "batch": batch}
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -1,10 +1,23 @@
 import asyncio
-from edge_tts import Communicate
+import math
 import os
 import re
+import time
 import tempfile
+import subprocess
+from functools import lru_cache
 from pathlib import Path
 from .ffmpeg_checker import ensure_ffmpeg_available
+from .cancellation import run_process
+from .tracing import span, record
+from .metrics import registry as metrics
+from .tts_cache import get_tts_cache
+from .tts_backends import TTSBackend, get_tts_backend, parse_percent
+from .voice_catalog import get_voice_catalog
+from .audio_info import audio_duration, audio_format, boundaries_duration
+from .timeline import assemble_timeline
+from .speech_rate import record_observation, rate_percent_for, MAX_RATE_PERCENT
+from .text_normalizer import normalize_text
 
 def ensure_directories():
     """التأكد من وجود المجلدات المطلوبة."""
@@ -23,107 +36,390 @@ def ensure_directories():
         except Exception as e:
             print(f"❌ خطأ في إنشاء مجلد {dir_path}: {e}")
 
-def clean_arabic_text(text: str) -> str:
-    """تنظيف النص العربي من الرموز الغريبة."""
-    # إزالة الرموز الغريبة
-    unwanted_symbols = ['!', '@', '#', '$', '%', '^', '&', '*', '+', '=', '|', '\\', '/', '<', '>', '?', '`', '~']
-    
-    for symbol in unwanted_symbols:
-        text = text.replace(symbol, '')
-    
-    # إزالة المسافات المتعددة
-    text = re.sub(r'\s+', ' ', text)
-    
-    # تنظيف النص
-    text = text.strip()
-    
-    return text
-
-def get_voices_for_language(language_code: str):
+def get_voices_for_language(language_code: str, backend: str = None):
     """
     إرجاع قائمة الأصوات المتاحة للغة معينة مع النوع (ذكر/أنثى) واسم الصوت.
-    كل عنصر: { 'name': ..., 'gender': ..., 'display': ... }
-    """
-    voices = {
-        "ar": [
-            {"name": "ar-SA-HamedNeural", "gender": "ذكر", "display": "حامد (ذكر سعودي)"},
-            {"name": "ar-SA-ZariyahNeural", "gender": "أنثى", "display": "زارية (أنثى سعودية)"}
-        ],
-        "en": [
-            {"name": "en-US-JennyNeural", "gender": "أنثى", "display": "Jenny (أنثى أمريكية)"},
-            {"name": "en-US-GuyNeural", "gender": "ذكر", "display": "Guy (ذكر أمريكي)"}
-        ],
-        "fr": [
-            {"name": "fr-FR-DeniseNeural", "gender": "أنثى", "display": "Denise (أنثى فرنسية)"},
-            {"name": "fr-FR-HenriNeural", "gender": "ذكر", "display": "Henri (ذكر فرنسي)"}
-        ],
-        "es": [
-            {"name": "es-ES-ElviraNeural", "gender": "أنثى", "display": "Elvira (أنثى إسبانية)"},
-            {"name": "es-ES-AlvaroNeural", "gender": "ذكر", "display": "Alvaro (ذكر إسباني)"}
-        ],
-        "de": [
-            {"name": "de-DE-KatjaNeural", "gender": "أنثى", "display": "Katja (أنثى ألمانية)"},
-            {"name": "de-DE-ConradNeural", "gender": "ذكر", "display": "Conrad (ذكر ألماني)"}
-        ],
-        # ... أضف المزيد من اللغات والأصوات حسب الحاجة ...
-    }
-    # fallback: return at least one default if not found
-    return voices.get(language_code, voices.get("en", []))
-
-def get_voice_for_language(language_code: str, gender: str = None) -> str:
+    كل عنصر: { 'name': ..., 'gender': ..., 'display': ..., 'locale': ... }
+    القائمة من فهرس الأصوات المحفوظ (voice_catalog) ولا تتطلب اتصالًا بالشبكة.
+    """
+    return get_voice_catalog(backend).voices_for(language_code)
+
+def get_voice_for_language(language_code: str, gender: str = None, backend: str = None) -> str:
     """
     الحصول على صوت مناسب للغة المحددة، مع خيار تحديد النوع (ذكر/أنثى).
     """
-    voices = get_voices_for_language(language_code)
-    if gender:
-        for v in voices:
-            if v["gender"] == gender:
-                return v["name"]
-    # fallback: first voice
-    return voices[0]["name"] if voices else "en-US-JennyNeural"
+    catalog = get_voice_catalog(backend)
+    voices = (gender and catalog.voices_for(language_code, gender)) or catalog.voices_for(language_code)
+    if voices:
+        return voices[0]["name"]
+    print(f"⚠️ لا يوجد صوت للغة {language_code} في فهرس الأصوات، سيُستخدم الصوت الإنجليزي الافتراضي")
+    return "en-US-JennyNeural"
 
-async def generate_audio_for_language(text: str, language_code: str, output_path: str = None, target_duration: float = None, voice_name: str = None):
+async def generate_audio_for_language(text: str, language_code: str, output_path: str = None, target_duration: float = None,
+                                      voice_name: str = None, backend: str = None):
     """
-    توليد صوت لأي لغة من النص المترجم، مع إمكانية تحديد اسم الصوت.
+    توليد صوت لأي لغة من النص المترجم، مع إمكانية تحديد اسم الصوت ومحرك TTS.
     """
     ensure_directories()
     try:
         if output_path is None:
             output_path = f"temp/audio_{language_code}.mp3"
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        # الحصول على الصوت المناسب
-        if voice_name is None:
-            voice = get_voice_for_language(language_code)
+        # الحصول على المحرك والصوت المناسب
+        tts = get_tts_backend(backend)
+        voice = tts.resolve_voice(voice_name or get_voice_for_language(language_code), language_code)
+        print(f"🎤 استخدام الصوت: {voice} للغة {language_code} ({tts.name})")
+        text = normalize_text(text, language_code)
+        # تقسيم النص الطويل إلى أجزاء تُولَّد بالتوازي بدل تدفق شبكي واحد هش
+        parts = [{"text": part} for part in split_for_synthesis(text)]
+        results = await synthesize_segments(parts, language_code, voice_name=voice, backend=tts)
+        failed = [r["index"] + 1 for r in results if not r["ok"]]
+        if failed:
+            raise Exception(f"فشل توليد الأجزاء: {failed}")
+        duration = await _write_sequential([r["audio"] for r in results], output_path)
+        print(f"✅ تم حفظ الصوت في: {output_path} ({len(results)} جزء)")
+        return True, _report_audio_duration(duration, target_duration)
+    except Exception as e:
+        print(f"❌ خطأ أثناء توليد الصوت: {e}")
+        return False, None
+
+@lru_cache(maxsize=1)
+def get_ffprobe_path() -> str:
+    """مسار ffprobe المجاور لمسار ffmpeg المحدد (يُحسب مرة واحدة)."""
+    ffmpeg_path = ensure_ffmpeg_available() or "ffmpeg"
+    if ffmpeg_path.endswith("ffmpeg.exe"):
+        return ffmpeg_path[:-len("ffmpeg.exe")] + "ffprobe.exe"
+    if ffmpeg_path.endswith("ffmpeg"):
+        return ffmpeg_path[:-len("ffmpeg")] + "ffprobe"
+    return "ffprobe"
+
+def probe_audio_duration(path: str) -> float:
+    """قراءة مدة ملف صوتي بالثواني عبر ffprobe (للملفات غير MP3 فقط؛ مقاطع TTS تُقاس في الذاكرة)."""
+    result = subprocess.run([
+        get_ffprobe_path(), "-v", "error", "-show_entries",
+        "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", path
+    ], capture_output=True, text=True)
+    return float(result.stdout.strip())
+
+def clip_duration(audio: bytes, boundaries=None) -> float:
+    """مدة مقطع (MP3 من إطاراته أو WAV من ترويسته)، أو من أحداث الحدود إذا تعذرت قراءتها."""
+    return audio_duration(audio) or boundaries_duration(boundaries)
+
+async def _write_sequential(clips, output_path: str) -> float:
+    """
+    كتابة المقاطع متتالية في ملف واحد وإرجاع المدة الكلية.
+    مقاطع MP3 تُلصق كما هي (لا فك ولا إعادة ترميز)، وغيرها يمر بالخط الزمني.
+    """
+    clips = [clip for clip in clips if clip]
+    if all(audio_format(clip) == "mp3" for clip in clips):
+        with open(output_path, "wb") as out:
+            for clip in clips:
+                out.write(clip)
+        return sum(clip_duration(clip) for clip in clips)
+    stats = await asyncio.to_thread(assemble_timeline, [{"audio": clip, "start": None} for clip in clips], output_path)
+    return stats["duration"]
+
+def _report_audio_duration(actual_duration: float, target_duration: float = None):
+    """طباعة مدة الصوت الناتج ومقارنتها بمدة الفيديو."""
+    try:
+        if not actual_duration:
+            raise ValueError("لم يُعثر على إطارات صوتية")
+        print(f"📊 مدة الصوت: {actual_duration:.2f}s")
+        if target_duration:
+            print(f"📊 مدة الفيديو الأصلي: {target_duration:.2f}s")
+            if actual_duration > target_duration:
+                print(f"⚠️ الصوت أطول من الفيديو بـ {actual_duration - target_duration:.2f}s")
+            else:
+                print(f"✅ الصوت أقصر من الفيديو بـ {target_duration - actual_duration:.2f}s")
+        return actual_duration
+    except Exception as e:
+        print(f"⚠️ تعذر التحقق من مدة الصوت: {e}")
+        return None
+
+# الحد الأقصى لعدد الجمل التي يُولَّد صوتها في نفس الوقت في الوضع المتدفق
+STREAMING_TTS_CONCURRENCY = 4
+
+async def _synthesize_to_bytes(text: str, voice: str, semaphore: asyncio.Semaphore = None,
+                               rate: str = "+0%", pitch: str = "+0Hz", backend=None):
+    """
+    توليد صوت جملة واحدة في الذاكرة عبر محرك TTS.
+    يعيد (بيانات الصوت، أحداث الحدود) حيث كل حدث {"type", "offset", "duration", "text"} بالثواني.
+    """
+    backend = backend or get_tts_backend()
+    queued = time.perf_counter()
+    async with semaphore or asyncio.Semaphore(1):
+        record("wait tts slot", "queue", queued)
+        with span(f"tts {backend.name}", "tts", voice=voice, rate=rate, chars=len(text)):
+            return await backend.synthesize(text, voice, rate=rate, pitch=pitch)
+
+# محرك التوليد لكل مقطع: عدد الاتصالات المتزامنة وعدد محاولات إعادة المقطع الفاشل
+TTS_CONCURRENCY = 4
+TTS_MAX_RETRIES = 2
+TTS_RETRY_BACKOFF = 1.5
+# الحد التقريبي لطول الجزء عند تقسيم نص طويل للتوليد
+SYNTHESIS_CHUNK_CHARS = 400
+# نسبة التجاوز المسموحة لمدة المقطع قبل إعادة توليده بسرعة مصححة
+AUTOFIT_TOLERANCE = 0.08
+
+_SYNTHESIS_SENTENCE_END = re.compile(r'(?<=[.!?؟。！？])\s+')
+
+def split_for_synthesis(text: str, max_chars: int = SYNTHESIS_CHUNK_CHARS):
+    """تقسيم نص طويل على حدود الجمل إلى أجزاء لا تتجاوز max_chars تقريبًا."""
+    parts, current = [], ""
+    for sentence in _SYNTHESIS_SENTENCE_END.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            parts.append(current)
+            current = sentence
         else:
-            voice = voice_name
-        print(f"🎤 استخدام الصوت: {voice} للغة {language_code}")
-        if language_code == "ar":
-            text = clean_arabic_text(text)
-        communicate = Communicate(text, voice)
-        await communicate.save(output_path)
-        print(f"✅ تم حفظ الصوت في: {output_path}")
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        parts.append(current)
+    return parts
+
+def _format_rate(percent: int) -> str:
+    return f"{percent:+d}%"
+
+async def synthesize_segments(segments, language_code: str, voice_name: str = None, output_dir: str = None,
+                              concurrency: int = None, max_retries: int = TTS_MAX_RETRIES,
+                              rate: str = "+0%", pitch: str = "+0Hz", cache=None, use_cache: bool = True,
+                              fit_to_slots: bool = True, backend=None):
+    """
+    توليد صوت عدة مقاطع بالتوازي تحت asyncio.Semaphore، مع إعادة المقاطع الفاشلة فقط.
+    يُبحث عن كل مقطع أولًا في الذاكرة المؤقتة للمقاطع (tts_cache) قبل استدعاء محرك TTS
+    (backend: كائن أو اسم محرك من tts_backends، الافتراضي المحرك المختار).
+    segments: قائمة قواميس تحتوي "text" (وقد تحتوي "start"/"end" أو "slot" = المدة المتاحة بالثواني).
+    مع fit_to_slots تُقدَّر سرعة النطق اللازمة لكل مقطع من طوله وجدول سرعة النطق المتعلَّم،
+    فيُولَّد مرة واحدة بتلك السرعة، ولا يُعاد توليده (مرة واحدة فقط) إلا إذا تجاوز الخطأ حد التسامح.
+    يعيد قائمة بنفس الترتيب: {"index", "text", "audio", "boundaries", "path", "duration", "start", "end",
+    "slot", "rate", "ok", "attempts", "error", "cached", "deduped"}. الصوت يبقى في الذاكرة ("audio") والمدة تُحسب من إطاراته؛
+    لا تُكتب الملفات على القرص إلا إذا حُدد output_dir.
+    """
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    if not isinstance(backend, TTSBackend):
+        backend = get_tts_backend(backend)
+    voice = backend.resolve_voice(voice_name or get_voice_for_language(language_code), language_code)
+    concurrency = concurrency or backend.capabilities.get("concurrency", TTS_CONCURRENCY)
+    semaphore = asyncio.Semaphore(concurrency)
+    base_rate = parse_percent(rate)
+    fit_to_slots = fit_to_slots and backend.capabilities.get("rate", False)
+    if use_cache and cache is None:
+        cache = get_tts_cache()
+    # المقاطع المتطابقة داخل نفس المهمة تنتظر نفس الطلب بدل تكراره
+    inflight = {}
+    results = []
+    for i, seg in enumerate(segments):
+        slot = seg.get("slot")
+        if slot is None and seg.get("start") is not None and seg.get("end") is not None:
+            slot = seg["end"] - seg["start"]
+        results.append({
+            "index": i, "text": normalize_text(seg.get("text", ""), language_code),
+            "audio": b"", "boundaries": [], "path": None,
+            "duration": 0.0, "start": seg.get("start"), "end": seg.get("end"),
+            "slot": slot, "rate": rate,
+            "ok": False, "attempts": 0, "error": None, "cached": False, "deduped": False,
+        })
+
+    async def fetch(result, clip_rate: str):
+        """
+        صوت المقطع بسرعة معينة ومصدره: "cache" من الذاكرة المؤقتة، أو "inflight" من طلب مماثل جارٍ
+        (لا يُحسب محاولة ولا طلبًا؛ فشله يُسجله من بدأ الطلب)، أو "backend" من المحرك.
+        """
+        started = time.time()
+        key = cache.make_key(result["text"], voice, rate=clip_rate, pitch=pitch,
+                             output_format=backend.output_format, backend=backend.name) if cache else None
+        audio = await asyncio.to_thread(cache.get, key) if cache else None
+        if audio:
+            metrics.record_request("tts", ok=True, cache_hit=True, provider="cache", voice=voice)
+            return audio, [], "cache"
+        if key in inflight:
+            audio, boundaries = await inflight[key]
+            if not audio:
+                raise Exception("لم يُرجع الخادم أي صوت")
+            return audio, boundaries, "inflight"
+        result["attempts"] += 1
+        try:
+            task = asyncio.ensure_future(_synthesize_to_bytes(result["text"], voice, semaphore, rate=clip_rate,
+                                                              pitch=pitch, backend=backend))
+            if key:
+                inflight[key] = task
+            try:
+                audio, boundaries = await task
+            except Exception:
+                inflight.pop(key, None)
+                raise
+            if not audio:
+                raise Exception("لم يُرجع الخادم أي صوت")
+            if cache:
+                await asyncio.to_thread(cache.put, key, audio)
+            metrics.record_request("tts", ok=True, provider=backend.name, voice=voice,
+                                   latency=time.time() - started, chars=len(result["text"]))
+            return audio, boundaries, "backend"
+        except Exception as e:
+            metrics.record_request("tts", ok=False, provider=backend.name, voice=voice,
+                                   latency=time.time() - started, error=str(e))
+            raise
+
+    async def synthesize_one(result):
+        if not result["text"]:
+            result["ok"] = True
+            return
         try:
-            import subprocess
-            result = subprocess.run([
-                "ffprobe", "-v", "error", "-show_entries",
-                "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", output_path
-            ], capture_output=True, text=True)
-            actual_duration = float(result.stdout.strip())
-            print(f"📊 مدة الصوت: {actual_duration:.2f}s")
-            if target_duration:
-                print(f"📊 مدة الفيديو الأصلي: {target_duration:.2f}s")
-                if actual_duration > target_duration:
-                    print(f"⚠️ الصوت أطول من الفيديو بـ {actual_duration - target_duration:.2f}s")
-                else:
-                    print(f"✅ الصوت أقصر من الفيديو بـ {target_duration - actual_duration:.2f}s")
-            return True, actual_duration
+            slot = result["slot"] if fit_to_slots else None
+            speedup = rate_percent_for(result["text"], slot, language_code, voice) if slot else 0
+            clip_rate = _format_rate(base_rate + speedup)
+            audio, boundaries, source = await fetch(result, clip_rate)
+            duration = clip_duration(audio, boundaries)
+            if slot and duration > slot * (1 + AUTOFIT_TOLERANCE) and speedup < MAX_RATE_PERCENT:
+                # التقدير لم يكفِ: تصحيح واحد فقط بالنسبة الفعلية بين المدة الناتجة والمدة المتاحة
+                needed = math.ceil(((100 + base_rate + speedup) * duration / slot) - 100 - base_rate)
+                corrected = min(max(needed, speedup + 1), MAX_RATE_PERCENT)
+                metrics.inc("tts.rate_corrections")
+                clip_rate = _format_rate(base_rate + corrected)
+                audio, boundaries, source = await fetch(result, clip_rate)
+                duration = clip_duration(audio, boundaries)
+            result["audio"], result["boundaries"] = audio, boundaries
+            result["cached"], result["deduped"] = source == "cache", source == "inflight"
+            result["duration"], result["rate"] = duration, clip_rate
+            if output_dir:
+                path = os.path.join(output_dir, f"segment_{result['index']:05d}.mp3")
+                with open(path, "wb") as f:
+                    f.write(audio)
+                result["path"] = path
+            result["ok"], result["error"] = True, None
         except Exception as e:
-            print(f"⚠️ تعذر التحقق من مدة الصوت: {e}")
-            return True, None
+            result["error"] = str(e)
+
+    pending = results
+    for attempt in range(max_retries + 1):
+        if attempt:
+            print(f"🔁 إعادة توليد {len(pending)} مقطع فاشل (محاولة {attempt + 1})...")
+            metrics.inc("tts.retries", len(pending))
+            await asyncio.sleep(TTS_RETRY_BACKOFF * attempt)
+        await asyncio.gather(*(synthesize_one(r) for r in pending))
+        pending = [r for r in results if not r["ok"]]
+        if not pending:
+            break
+
+    fitted = [r for r in results if r["ok"] and r["audio"] and r["rate"] != rate]
+    overrun = [r for r in results if r["ok"] and r["slot"] and r["duration"] > r["slot"] * (1 + AUTOFIT_TOLERANCE)]
+    print(f"🔊 تم توليد {len(results) - len(pending)} من {len(results)} مقطع (المحرك: {backend.name}, الصوت: {voice}, التوازي: {concurrency}, "
+          f"من الذاكرة المؤقتة: {sum(1 for r in results if r['cached'])}, "
+          f"مكرر داخل المهمة: {sum(1 for r in results if r['deduped'])})")
+    if fit_to_slots and any(r["slot"] for r in results):
+        print(f"⏩ ملاءمة السرعة: {len(fitted)} مقطع مُسرَّع، {len(overrun)} ما زال أطول من مدته")
+    if cache:
+        stats = cache.stats()
+        print(f"📦 الذاكرة المؤقتة للمقاطع: {stats['entries']} مقطع، {stats['bytes'] / 1048576:.1f} MB، نسبة الإصابة {stats['hit_rate']:.0%}")
+    for r in pending:
+        print(f"❌ فشل توليد المقطع {r['index'] + 1}: {r['error']}")
+    return results
+
+async def generate_audio_from_sentences(sentences, language_code: str, output_path: str = None, target_duration: float = None,
+                                        voice_name: str = None, backend: str = None):
+    """
+    توليد الصوت من مولد جمل (مثل translate_text_stream) أثناء وصولها:
+    يبدأ توليد صوت الجملة الأولى بينما بقية الترجمة ما زالت قيد الإنشاء،
+    وتُكتب المقاطع في الملف بنفس ترتيب الجمل.
+    """
+    ensure_directories()
+    try:
+        if output_path is None:
+            output_path = f"temp/audio_{language_code}.mp3"
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        tts = get_tts_backend(backend)
+        voice = tts.resolve_voice(voice_name or get_voice_for_language(language_code), language_code)
+        print(f"🎤 استخدام الصوت: {voice} للغة {language_code} ({tts.name}، وضع متدفق)")
+
+        iterator = iter(sentences)
+        semaphore = asyncio.Semaphore(STREAMING_TTS_CONCURRENCY)
+        tasks = []
+        try:
+            while True:
+                # قراءة الجملة التالية في خيط منفصل حتى لا تتوقف حلقة الأحداث أثناء انتظار الشبكة؛
+                # to_thread ينسخ متغيرات السياق (معرّف المهمة والتتبع ورمز الإلغاء) إلى مولد الترجمة
+                sentence = await asyncio.to_thread(next, iterator, None)
+                if sentence is None:
+                    break
+                sentence = normalize_text(sentence, language_code)
+                if sentence:
+                    tasks.append(asyncio.create_task(_synthesize_to_bytes(sentence, voice, semaphore, backend=tts)))
+
+            if not tasks:
+                print("❌ لم تصل أي جملة لتوليد الصوت")
+                return False, None
+
+            clips = [clip for clip, *_ in await asyncio.gather(*tasks)]
+        except BaseException:
+            # فشل جملة أو الترجمة يلغي توليد بقية الجمل بدل تركها تعمل في الخلفية
+            for task in tasks:
+                task.cancel()
+            raise
+        total_duration = await _write_sequential(clips, output_path)
+        print(f"✅ تم حفظ الصوت في: {output_path} ({len(tasks)} جملة)")
+        return True, _report_audio_duration(total_duration, target_duration)
     except Exception as e:
-        print(f"❌ خطأ أثناء توليد الصوت: {e}")
+        print(f"❌ خطأ أثناء توليد الصوت المتدفق: {e}")
         return False, None
 
+async def generate_timed_audio(segments, language_code: str, output_path: str = None, target_duration: float = None,
+                               voice_name: str = None, backend: str = None):
+    """
+    توليد صوت كل مقطع مترجم على حدة ووضعه عند بداية مقطعه الأصلي على الخط الزمني،
+    حتى تبقى الدبلجة متزامنة مع الفيديو على طوله بدل الانجراف التدريجي.
+    segments: قواميس تحتوي "text" (الترجمة) و"start"/"end" من النص الأصلي.
+    المدة المتاحة لكل مقطع تمتد حتى بداية المقطع التالي، وتُلاءم سرعة النطق لها.
+    """
+    ensure_directories()
+    try:
+        if output_path is None:
+            output_path = f"temp/audio_{language_code}.mp3"
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        tts = get_tts_backend(backend)
+        voice = tts.resolve_voice(voice_name or get_voice_for_language(language_code), language_code)
+        print(f"🎤 استخدام الصوت: {voice} للغة {language_code} ({tts.name}، {len(segments)} مقطع على الخط الزمني)")
+        results = await synthesize_segments(with_slots(segments, target_duration), language_code,
+                                            voice_name=voice, backend=tts)
+        failed = [r["index"] + 1 for r in results if not r["ok"]]
+        if failed:
+            raise Exception(f"فشل توليد المقاطع: {failed}")
+        duration = await asyncio.to_thread(finish_timed_audio, results, language_code, voice, output_path, target_duration)
+        return True, duration
+    except Exception as e:
+        print(f"❌ خطأ أثناء توليد الصوت على الخط الزمني: {e}")
+        return False, None
+
+def with_slots(segments, target_duration: float = None, next_start: float = None):
+    """
+    نسخ المقاطع مع "slot": المدة المتاحة لكل مقطع تمتد حتى بداية المقطع التالي.
+    next_start: بداية أول مقطع بعد هذه المقاطع (عند معالجة المقاطع دفعات)، وإلا فحتى target_duration.
+    """
+    timed = []
+    for i, seg in enumerate(segments):
+        seg = dict(seg)
+        if seg.get("start") is not None:
+            following = segments[i + 1].get("start") if i + 1 < len(segments) else next_start
+            limit = following if following is not None else (target_duration or seg.get("end"))
+            if limit is not None:
+                seg["slot"] = max(limit - seg["start"], (seg.get("end") or seg["start"]) - seg["start"])
+        timed.append(seg)
+    return timed
+
+def finish_timed_audio(results, language_code: str, voice: str, output_path: str, target_duration: float = None) -> float:
+    """تجميع مقاطع synthesize_segments على الخط الزمني في output_path وتحديث جدول سرعة النطق. يعيد المدة."""
+    stats = assemble_timeline(results, output_path, target_duration)
+    print(f"✅ تم حفظ الصوت في: {output_path}")
+
+    # تحديث جدول سرعة النطق من مدة الكلام الفعلية (بدون فترات الصمت بين المقاطع)،
+    # بعد تحويل مدة المقاطع المسرَّعة إلى ما يقابلها عند rate=+0%
+    spoken = [r for r in results if r["audio"]]
+    natural_seconds = sum(r["duration"] * (100 + parse_percent(r["rate"])) / 100 for r in spoken)
+    record_observation(language_code, voice, " ".join(r["text"] for r in spoken), natural_seconds)
+    return _report_audio_duration(stats["duration"], target_duration)
+
 async def generate_arabic_audio(text_ar: str, output_path: str = "temp/audio_ar.mp3", target_duration: float = None):
     """توليد صوت عربي من النص المترجم - نسخة مبسطة (للتوافق مع الكود القديم)."""
     return await generate_audio_for_language(text_ar, "ar", output_path, target_duration)
@@ -131,8 +427,6 @@ async def generate_arabic_audio(text_ar: str, output_path: str = "temp/audio_ar.
 def extend_video_duration(video_path: str, target_duration: float, output_path: str) -> bool:
     """تمديد مدة الفيديو لتناسب مدة الصوت العربي."""
     try:
-        import subprocess
-        
         # الحصول على مسار ffmpeg
         ffmpeg_path = ensure_ffmpeg_available() or "ffmpeg"
         
@@ -146,7 +440,7 @@ def extend_video_duration(video_path: str, target_duration: float, output_path:
             output_path
         ]
         
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = run_process(cmd, capture_output=True, text=True)
         if result.returncode == 0:
             print(f"✅ تم تمديد مدة الفيديو إلى: {target_duration:.2f}s")
             return True
@@ -0,0 +1,183 @@
+"""
+تجميع مسار الدبلجة على خط زمني: كل مقطع صوتي يوضع عند بداية مقطعه في الفيديو الأصلي
+داخل مخزن PCM واحد (NumPy) محجوز مسبقًا، مع تدرج بسيط عند الوصلات وتطبيع للذروة،
+ثم يُرمَّز المسار كاملًا مرة واحدة. فك الترميز أيضًا يتم في استدعاء ffmpeg واحد لكل المقاطع.
+"""
+
+import math
+import numpy as np
+from .ffmpeg_checker import ensure_ffmpeg_available
+from .cancellation import run_process
+from .tracing import span
+from .audio_info import mp3_frame_info, wav_info, audio_format
+from .time_stretch import time_stretch_batch, fit_ratio
+
+TIMELINE_SAMPLE_RATE = 24000
+# طول التدرج (fade) عند بداية ونهاية كل مقطع لتجنب النقرات عند الوصلات
+CROSSFADE_SECONDS = 0.015
+# أقصى ذروة مسموحة بعد الجمع (من 1.0)
+PEAK_LIMIT = 0.98
+# المقطع الأطول من مدته المتاحة بأكثر من هذه النسبة يُسرَّع داخل العملية قبل وضعه على الخط الزمني
+STRETCH_TOLERANCE = 0.03
+
+def _ffmpeg_path() -> str:
+    return ensure_ffmpeg_available() or "ffmpeg"
+
+def _decode_wav(data: bytes, sample_rate: int) -> np.ndarray:
+    """فك WAV PCM 16-bit داخل العملية، مع دمج القنوات وإعادة التعيين الخطي لمعدل الخط الزمني."""
+    info = wav_info(data)
+    if info is None or info["bits"] != 16:
+        raise ValueError("صيغة WAV غير مدعومة (المطلوب PCM 16-bit)")
+    channels = max(info["channels"], 1)
+    count = info["size"] // 2 // channels * channels
+    pcm = np.frombuffer(data, dtype="<i2", count=count, offset=info["offset"]).astype(np.float32) / 32768.0
+    if channels > 1:
+        pcm = pcm.reshape(-1, channels).mean(axis=1)
+    if info["sample_rate"] != sample_rate and len(pcm):
+        out_len = int(round(len(pcm) * sample_rate / info["sample_rate"]))
+        positions = np.arange(out_len, dtype=np.float64) * (info["sample_rate"] / sample_rate)
+        pcm = np.interp(positions, np.arange(len(pcm)), pcm).astype(np.float32)
+    return pcm
+
+def decode_clips(clips, sample_rate: int = TIMELINE_SAMPLE_RATE):
+    """
+    فك ترميز المقاطع (bytes): مقاطع MP3 كلها في استدعاء ffmpeg واحد ثم يُقسَّم PCM الناتج
+    حسب عدد عينات كل مقطع المقروء من ترويسات إطاراته، ومقاطع WAV تُقرأ مباشرة دون ffmpeg.
+    يعيد قائمة مصفوفات float32 أحادية القناة بنفس الترتيب.
+    """
+    clips = [clip or b"" for clip in clips]
+    decoded = [np.zeros(0, dtype=np.float32) for _ in clips]
+    mp3_indexes = []
+    for i, clip in enumerate(clips):
+        if not clip:
+            continue
+        if audio_format(clip) == "wav":
+            decoded[i] = _decode_wav(clip, sample_rate)
+        else:
+            mp3_indexes.append(i)
+    if mp3_indexes:
+        for i, pcm in zip(mp3_indexes, _decode_mp3([clips[i] for i in mp3_indexes], sample_rate)):
+            decoded[i] = pcm
+    return decoded
+
+def _decode_mp3(clips, sample_rate: int):
+    data = b"".join(clips)
+    result = run_process([
+        _ffmpeg_path(), "-v", "error",
+        "-f", "mp3", "-i", "pipe:0",
+        "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "pipe:1"
+    ], input=data, capture_output=True, check=True)
+    pcm = np.frombuffer(result.stdout, dtype="<i2").astype(np.float32) / 32768.0
+
+    counts = []
+    for clip in clips:
+        samples, rate, _ = mp3_frame_info(clip)
+        counts.append(int(round(samples * sample_rate / rate)) if rate else 0)
+    # المقطع الأخير يأخذ الباقي (فرق تأخير المفكك بضع مئات من العينات على الأكثر)
+    return np.split(pcm, np.cumsum(counts)[:-1])
+
+def build_timeline(pcm_clips, starts, total_duration: float = None, sample_rate: int = TIMELINE_SAMPLE_RATE,
+                   gain_db: float = 0.0, crossfade: float = CROSSFADE_SECONDS, clip_gains_db=None):
+    """
+    وضع المقاطع على الخط الزمني.
+    starts: بداية كل مقطع بالثواني (None = بعد المقطع السابق مباشرة).
+    المقطع الذي يبدأ قبل انتهاء سابقه بأكثر من طول التدرج يُؤخَّر حتى لا يتداخل الكلام،
+    والتداخل المتبقي (بطول التدرج) يصبح تلاشيًا متقاطعًا بين المقطعين.
+    يعيد (المسار float32، إحصائيات).
+    """
+    fade = max(int(crossfade * sample_rate), 0)
+    positions = []
+    cursor = 0
+    shifted = 0
+    drift = 0.0
+    for pcm, start in zip(pcm_clips, starts):
+        pos = cursor if start is None else int(round(start * sample_rate))
+        if pos < cursor - fade:
+            drift = max(drift, (cursor - fade - pos) / sample_rate)
+            pos = cursor - fade
+            shifted += 1
+        pos = max(pos, 0)
+        positions.append(pos)
+        if len(pcm):
+            cursor = max(cursor, pos + len(pcm))
+
+    length = max(cursor, int(math.ceil(total_duration * sample_rate)) if total_duration else 0)
+    track = np.zeros(length, dtype=np.float32)
+    master_gain = 10 ** (gain_db / 20.0)
+    ramps = {}
+    for i, (pcm, pos) in enumerate(zip(pcm_clips, positions)):
+        n = len(pcm)
+        if not n:
+            continue
+        gain = master_gain * (10 ** (clip_gains_db[i] / 20.0) if clip_gains_db else 1.0)
+        clip = pcm * np.float32(gain)
+        k = min(fade, n // 2)
+        if k:
+            ramp = ramps.get(k)
+            if ramp is None:
+                ramp = ramps[k] = np.linspace(0.0, 1.0, k, dtype=np.float32)
+            clip[:k] *= ramp
+            clip[-k:] *= ramp[::-1]
+        track[pos:pos + n] += clip
+
+    peak = float(np.abs(track).max()) if length else 0.0
+    if peak > PEAK_LIMIT:
+        track *= np.float32(PEAK_LIMIT / peak)
+    return track, {
+        "duration": length / sample_rate,
+        "clips": sum(1 for pcm in pcm_clips if len(pcm)),
+        "shifted": shifted,
+        "max_drift": drift,
+        "peak": peak,
+    }
+
+def fit_clips_to_slots(pcm_clips, slots, sample_rate: int = TIMELINE_SAMPLE_RATE, tolerance: float = STRETCH_TOLERANCE):
+    """
+    تقصير المقاطع التي بقيت أطول من مدتها المتاحة (slot بالثواني، None = دون حد)
+    بتغيير السرعة دون تغيير النبرة، دفعة واحدة لكل المقاطع. يعيد (المقاطع، عدد المقاطع المعدلة).
+    """
+    ratios = []
+    for pcm, slot in zip(pcm_clips, slots):
+        duration = len(pcm) / sample_rate
+        ratios.append(fit_ratio(duration, slot) if slot and duration > slot * (1 + tolerance) else 1.0)
+    if all(r == 1.0 for r in ratios):
+        return list(pcm_clips), 0
+    return time_stretch_batch(pcm_clips, ratios, sample_rate), sum(1 for r in ratios if r != 1.0)
+
+def encode_track(track: np.ndarray, output_path: str, sample_rate: int = TIMELINE_SAMPLE_RATE):
+    """ترميز المسار كاملًا مرة واحدة (الصيغة حسب امتداد output_path)."""
+    pcm = (np.clip(track, -1.0, 1.0) * 32767.0).astype("<i2")
+    run_process([
+        _ffmpeg_path(), "-y", "-v", "error",
+        "-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0",
+        output_path
+    ], input=pcm.tobytes(), capture_output=True, check=True)
+
+def assemble_timeline(clips, output_path: str, total_duration: float = None, sample_rate: int = TIMELINE_SAMPLE_RATE,
+                      gain_db: float = 0.0, crossfade: float = CROSSFADE_SECONDS, fit_slots: bool = True) -> dict:
+    """
+    تجميع مسار الدبلجة من مقاطع TTS وترميزه في output_path.
+    clips: قواميس تحتوي "audio" (MP3 bytes) و"start" (ثوانٍ أو None) وقد تحتوي "gain_db" و"slot".
+    مع fit_slots تُقصَّر المقاطع الأطول من "slot" (انظر fit_clips_to_slots).
+    يعيد إحصائيات الخط الزمني (المدة، عدد المقاطع المؤخرة والمعدلة السرعة، أقصى انزياح، الذروة).
+    """
+    clips = list(clips)
+    with span("decode clips", clips=len(clips)):
+        pcm_clips = decode_clips([c.get("audio") for c in clips], sample_rate)
+    stretched = 0
+    if fit_slots:
+        with span("fit clips to slots"):
+            pcm_clips, stretched = fit_clips_to_slots(pcm_clips, [c.get("slot") for c in clips], sample_rate)
+    clip_gains = [c.get("gain_db", 0.0) for c in clips]
+    with span("build timeline"):
+        track, stats = build_timeline(
+            pcm_clips, [c.get("start") for c in clips], total_duration, sample_rate,
+            gain_db=gain_db, crossfade=crossfade, clip_gains_db=clip_gains if any(clip_gains) else None,
+        )
+    stats["stretched"] = stretched
+    with span("encode track"):
+        encode_track(track, output_path, sample_rate)
+    print(f"🎞️ الخط الزمني: {stats['clips']} مقطع، المدة {stats['duration']:.2f}s، "
+          f"مقاطع مسرّعة: {stretched}، "
+          f"مقاطع مؤخرة لتجنب التداخل: {stats['shifted']} (أقصى انزياح {stats['max_drift']:.2f}s)")
+    return stats
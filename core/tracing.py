@@ -0,0 +1,169 @@
+"""
+تتبع زمني لمهام الدبلجة بصيغة Chrome Trace (تُفتح في chrome://tracing أو ui.perfetto.dev):
+كل مرحلة وخطوة فرعية وطلب HTTP وعملية فرعية وانتظار في طابور تُسجَّل كـ span في تتبع المهمة الحالية
+(Trace مرتبط بالسياق مثل معرّف المهمة في core.metrics، فينتقل إلى خيوط المراحل وإلى الحلقة المشتركة).
+
+كل تشغيل (فيديو واحد بكل لغاته) يُكتب في ملف، والدفعة تُجمع كل مهامها في ملف واحد (عملية لكل فيديو)،
+وملفات عدة دفعات تُدمج بـ:
+
+    python -m core.tracing merged.json traces/*.json
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# حد الأحداث لكل تتبع حتى لا تنمو الذاكرة في المهام الطويلة جدًا (الزائد يُعدّ ولا يُحفظ)
+TRACE_MAX_EVENTS = 200000
+# مجلد التتبعات الافتراضي للواجهة الرسومية
+DEFAULT_TRACE_DIR = os.path.join("output", "traces")
+
+_current_trace = ContextVar("dubber_trace", default=None)
+# ساعة واحدة لكل العملية: perf_counter للدقة، مزاحة إلى زمن الحائط حتى تتحاذى ملفات الدفعات المختلفة
+_PERF_ORIGIN = time.perf_counter()
+_WALL_ORIGIN_US = time.time() * 1e6
+_async_ids = itertools.count(1)
+
+def _us(t: float) -> float:
+    return round(_WALL_ORIGIN_US + (t - _PERF_ORIGIN) * 1e6, 1)
+
+def current_trace():
+    """التتبع الحالي في هذا السياق (أو None خارج المهام)."""
+    return _current_trace.get()
+
+@contextmanager
+def trace_scope(trace):
+    """ربط كل spans المسجلة داخل هذا السياق بالتتبع trace."""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+class Trace:
+    """spans تشغيل واحد، آمنة للتسجيل من عدة خيوط ومن حلقة الأحداث."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.events = []
+        self.dropped = 0
+        self._threads = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, cat: str, start: float, end: float, args: dict = None):
+        """
+        إضافة span بين start وend (ثوانٍ من time.perf_counter).
+        ما يُسجَّل من داخل coroutine يُصدَّر كحدث غير متزامن (b/e) لأن الطلبات المتزامنة تتداخل على نفس الخيط.
+        """
+        try:
+            in_task = asyncio.current_task() is not None
+        except RuntimeError:
+            in_task = False
+        thread = threading.current_thread()
+        event = {"name": name, "cat": cat, "ts": _us(start), "dur": round(max(end - start, 0.0) * 1e6, 1),
+                 "tid": thread.ident, "args": args or {}}
+        if in_task:
+            event["id"] = next(_async_ids)
+        with self._lock:
+            self._threads.setdefault(thread.ident, thread.name)
+            if len(self.events) >= TRACE_MAX_EVENTS:
+                self.dropped += 1
+                return
+            self.events.append(event)
+
+    def chrome_events(self, pid: int) -> list:
+        """أحداث Chrome Trace لهذا التتبع كعملية رقمها pid (مع أسماء العملية والخيوط)."""
+        with self._lock:
+            events, threads = list(self.events), dict(self._threads)
+        output = [{"ph": "M", "name": "process_name", "pid": pid, "tid": 0, "args": {"name": self.name}}]
+        output += [{"ph": "M", "name": "thread_name", "pid": pid, "tid": tid, "args": {"name": name}}
+                   for tid, name in threads.items()]
+        for event in events:
+            base = {"name": event["name"], "cat": event["cat"], "pid": pid, "tid": event["tid"]}
+            if "id" in event:
+                output.append(dict(base, ph="b", id=event["id"], ts=event["ts"], args=event["args"]))
+                output.append(dict(base, ph="e", id=event["id"], ts=round(event["ts"] + event["dur"], 1)))
+            else:
+                output.append(dict(base, ph="X", ts=event["ts"], dur=event["dur"], args=event["args"]))
+        return output
+
+    def summary(self, top: int = 10) -> list:
+        """أكبر top مجموعات (الفئة، الاسم) زمنًا: [(cat, name, العدد, مجموع الثواني)]."""
+        totals = defaultdict(lambda: [0, 0.0])
+        with self._lock:
+            for event in self.events:
+                total = totals[(event["cat"], event["name"])]
+                total[0] += 1
+                total[1] += event["dur"] / 1e6
+        ranked = sorted(totals.items(), key=lambda item: item[1][1], reverse=True)[:top]
+        return [(cat, name, count, round(seconds, 3)) for (cat, name), (count, seconds) in ranked]
+
+def record(name: str, cat: str, start: float, end: float = None, **args):
+    """تسجيل span انتهى (أو ينتهي الآن) في التتبع الحالي؛ لا شيء خارج المهام."""
+    trace = current_trace()
+    if trace is not None:
+        trace.add(name, cat, start, time.perf_counter() if end is None else end, args)
+
+@contextmanager
+def span(name: str, cat: str = "step", **args):
+    """
+    قياس الكتلة كـ span في التتبع الحالي. الفئات المستخدمة: stage / step / queue / http / tts / subprocess.
+    القيمة المرجعة قاموس args يمكن إضافة حقول إليه أثناء الكتلة (مثل رمز استجابة HTTP).
+    """
+    trace = current_trace()
+    started = time.perf_counter()
+    try:
+        yield args
+    except BaseException as e:
+        args["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        if trace is not None:
+            trace.add(name, cat, started, time.perf_counter(), args)
+
+def write_chrome_trace(path: str, traces) -> str:
+    """كتابة عدة تتبعات في ملف واحد (عملية لكل تتبع). يعيد المسار."""
+    events = []
+    for pid, trace in enumerate(traces, 1):
+        events += trace.chrome_events(pid)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+    return path
+
+def merge_trace_files(output_path: str, paths) -> int:
+    """دمج ملفات تتبع (من تشغيلات أو دفعات مختلفة) في ملف واحد بإعادة ترقيم العمليات. يعيد عدد الأحداث."""
+    events = []
+    offset = 0
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        file_events = data["traceEvents"] if isinstance(data, dict) else data
+        pids = sorted({event.get("pid", 0) for event in file_events})
+        mapping = {pid: offset + i + 1 for i, pid in enumerate(pids)}
+        offset += len(pids)
+        events += [dict(event, pid=mapping[event.get("pid", 0)]) for event in file_events]
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+    return len(events)
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 2:
+        print("الاستخدام: python -m core.tracing merged.json trace1.json [trace2.json ...]", file=sys.stderr)
+        return 2
+    count = merge_trace_files(argv[0], argv[1:])
+    print(f"✅ تم دمج {len(argv) - 1} ملف تتبع ({count} حدث) في {argv[0]}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
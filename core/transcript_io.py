@@ -0,0 +1,177 @@
+"""
+قراءة نص جاهز للفيديو (SRT أو WebVTT أو JSON بصيغة Whisper) وتحويله إلى نفس بنية مخرجات Whisper:
+{"text": ..., "segments": [{"start", "end", "text"}], "language": ...}
+حتى ينتقل خط المعالجة مباشرة إلى الترجمة وتوليد الصوت دون استخراج الصوت وتشغيل Whisper.
+مع فحص سريع اختياري لتوافق توقيت النص مع الكلام الفعلي في صوت الفيديو.
+"""
+
+import html
+import json
+import os
+import re
+import subprocess
+from .ffmpeg_checker import ensure_ffmpeg_available
+from .cancellation import run_process
+
+TRANSCRIPT_EXTENSIONS = (".srt", ".vtt", ".json")
+
+# فحص التوافق: الدقائق الأولى فقط، بدقة إطارات 50ms، مع البحث عن إزاحة ثابتة حتى ±5 ثوانٍ
+ALIGNMENT_WINDOW_SECONDS = 600
+ALIGNMENT_FRAME_SECONDS = 0.05
+ALIGNMENT_MAX_OFFSET = 5.0
+ALIGNMENT_SAMPLE_RATE = 8000
+# فرق الطاقة (dB) فوق مستوى الضجيج الذي يُعتبر كلامًا
+ALIGNMENT_ENERGY_DB = 10.0
+# تُطبَّق الإزاحة فقط إذا حسّنت نسبة تغطية الكلام بهذا القدر على الأقل
+ALIGNMENT_MIN_GAIN = 0.05
+
+_TIMESTAMP = re.compile(r"(?:(\d+):)?(\d{1,2}):(\d{2})[,.](\d{1,3})")
+_CUE_TIMING = re.compile(r"^\s*(\S+)\s+-->\s+(\S+)")
+_TAGS = re.compile(r"<[^>]*>|\{\\[^}]*\}")
+
+def _parse_timestamp(value: str) -> float:
+    match = _TIMESTAMP.fullmatch(value.strip())
+    if not match:
+        raise ValueError(f"توقيت غير صالح: {value}")
+    hours, minutes, seconds, fraction = match.groups()
+    return int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds) + int(fraction.ljust(3, "0")) / 1000
+
+def _clean_cue_text(lines) -> str:
+    # إزالة وسوم التنسيق (<i>، <v Speaker>، {\an8}) ودمج أسطر الترجمة في سطر واحد
+    text = " ".join(_TAGS.sub("", line).strip() for line in lines)
+    return html.unescape(re.sub(r"\s+", " ", text)).strip()
+
+def parse_subtitles(content: str):
+    """
+    قراءة مقاطع SRT أو WebVTT (الصيغتان تشتركان في سطر "البداية --> النهاية").
+    أرقام المقاطع ومعرفات WebVTT وكتل NOTE/STYLE/REGION تُتجاهل.
+    """
+    segments = []
+    blocks = re.split(r"\n\s*\n", content.replace("\r\n", "\n").replace("\r", "\n").lstrip("\ufeff"))
+    for block in blocks:
+        lines = block.strip("\n").split("\n")
+        for i, line in enumerate(lines):
+            match = _CUE_TIMING.match(line)
+            if match:
+                text = _clean_cue_text(lines[i + 1:])
+                if text:
+                    segments.append({
+                        "start": _parse_timestamp(match.group(1)),
+                        "end": _parse_timestamp(match.group(2)),
+                        "text": text,
+                    })
+                break
+    return segments
+
+def parse_json_transcript(content: str):
+    """قراءة JSON بصيغة Whisper ({"segments": [...]}) أو قائمة مقاطع مباشرة. يعيد (المقاطع، اللغة)."""
+    data = json.loads(content)
+    language = None
+    if isinstance(data, dict):
+        language = data.get("language")
+        data = data.get("segments", [])
+    if not isinstance(data, list):
+        raise ValueError("صيغة JSON غير مدعومة: المطلوب قائمة مقاطع أو {\"segments\": [...]}")
+    segments = []
+    for seg in data:
+        text = str(seg.get("text", "")).strip()
+        if text:
+            segments.append({"start": float(seg["start"]), "end": float(seg["end"]), "text": text})
+    return segments, language
+
+def load_transcript(path: str) -> dict:
+    """
+    قراءة ملف نص جاهز (الصيغة حسب الامتداد) وإرجاعه بصيغة نتيجة Whisper.
+    المقاطع مرتبة حسب البداية، والمقاطع ذات التوقيت المعكوس تُصحَّح.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in TRANSCRIPT_EXTENSIONS:
+        raise ValueError(f"صيغة نص غير مدعومة: {extension} (المدعوم: {', '.join(TRANSCRIPT_EXTENSIONS)})")
+    with open(path, "r", encoding="utf-8-sig") as f:
+        content = f.read()
+    language = None
+    if extension == ".json":
+        segments, language = parse_json_transcript(content)
+    else:
+        segments = parse_subtitles(content)
+    for seg in segments:
+        seg["end"] = max(seg["end"], seg["start"])
+    segments.sort(key=lambda seg: seg["start"])
+    return {"text": " ".join(seg["text"] for seg in segments), "segments": segments, "language": language}
+
+def find_sidecar_transcript(video_path: str):
+    """ملف ترجمة بجانب الفيديو بنفس الاسم (video.srt أو video.vtt أو video.json) إن وُجد."""
+    base = os.path.splitext(video_path)[0]
+    for extension in TRANSCRIPT_EXTENSIONS:
+        if os.path.exists(base + extension):
+            return base + extension
+    return None
+
+def shift_segments(segments, offset: float):
+    """إزاحة توقيت كل المقاطع بمقدار ثابت (بالثواني) دون السماح بتوقيت سالب."""
+    return [
+        dict(seg, start=max(seg["start"] + offset, 0.0), end=max(seg["end"] + offset, 0.0))
+        for seg in segments
+    ]
+
+def _speech_frames(media_path: str, window: float):
+    """إطارات الكلام (True/False) في أول window ثانية من صوت الملف، حسب الطاقة فوق مستوى الضجيج."""
+    # numpy يُستورد هنا لأن الواجهة تستورد هذه الوحدة عند البدء لقراءة امتدادات النصوص فقط
+    import numpy as np
+    result = run_process([
+        ensure_ffmpeg_available() or "ffmpeg", "-v", "error", "-t", str(window), "-i", media_path,
+        "-vn", "-ac", "1", "-ar", str(ALIGNMENT_SAMPLE_RATE), "-f", "s16le", "pipe:1"
+    ], capture_output=True, check=True)
+    pcm = np.frombuffer(result.stdout, dtype="<i2").astype(np.float32) / 32768.0
+    size = int(ALIGNMENT_FRAME_SECONDS * ALIGNMENT_SAMPLE_RATE)
+    count = len(pcm) // size
+    if not count:
+        return np.zeros(0, dtype=bool)
+    energy = np.sqrt(np.mean(pcm[:count * size].reshape(count, size) ** 2, axis=1))
+    db = 20 * np.log10(energy + 1e-6)
+    return db > np.percentile(db, 20) + ALIGNMENT_ENERGY_DB
+
+def check_alignment(segments, media_path: str, max_offset: float = ALIGNMENT_MAX_OFFSET,
+                    window: float = ALIGNMENT_WINDOW_SECONDS):
+    """
+    فحص سريع لتوافق توقيت النص مع الصوت (دون Whisper): يقارن فترات المقاطع بإطارات الكلام
+    في الدقائق الأولى ويبحث عن الإزاحة الثابتة التي تعطي أعلى تغطية.
+    يعيد {"offset", "coverage", "aligned_coverage", "apply"} أو None إذا تعذر الفحص.
+    coverage: نسبة زمن المقاطع التي يوجد فيها كلام فعلًا (عند الإزاحة 0 وعند أفضل إزاحة).
+    """
+    try:
+        speech = _speech_frames(media_path, window)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"⚠️ تعذر فحص توافق النص مع الصوت: {e}")
+        return None
+    if not len(speech) or not speech.any():
+        return None
+
+    import numpy as np
+    frames = len(speech)
+    lag_limit = int(max_offset / ALIGNMENT_FRAME_SECONDS)
+    # قناع المقاطع مع هامش بطول أقصى إزاحة من الجهتين
+    mask = np.zeros(frames + 2 * lag_limit, dtype=bool)
+    for seg in segments:
+        if seg["start"] >= window:
+            break
+        first = int(seg["start"] / ALIGNMENT_FRAME_SECONDS) + lag_limit
+        last = int(np.ceil(seg["end"] / ALIGNMENT_FRAME_SECONDS)) + lag_limit
+        mask[first:min(last, len(mask))] = True
+
+    scores = []
+    for lag in range(-lag_limit, lag_limit + 1):
+        # المقطع عند الزمن t في النص يقابل الزمن t + lag في الصوت
+        shifted = mask[lag_limit - lag:lag_limit - lag + frames]
+        covered = shifted.sum()
+        scores.append((shifted & speech).sum() / covered if covered else 0.0)
+    scores = np.asarray(scores)
+    best = int(np.argmax(scores))
+    offset = (best - lag_limit) * ALIGNMENT_FRAME_SECONDS
+    coverage, aligned = float(scores[lag_limit]), float(scores[best])
+    return {
+        "offset": offset,
+        "coverage": coverage,
+        "aligned_coverage": aligned,
+        "apply": abs(offset) >= 2 * ALIGNMENT_FRAME_SECONDS and aligned - coverage >= ALIGNMENT_MIN_GAIN,
+    }
@@ -1,27 +1,352 @@
-import requests
+import asyncio
+import aiohttp
+import queue
 import time
 import re
+import os
+import json
+import threading
 import unicodedata
+from collections import deque, OrderedDict
 from langdetect import detect, DetectorFactory
+from .async_service import get_async_service, run_async
+from .speech_rate import char_budget, spoken_length
+from .text_normalizer import normalize_text, normalize_batch
+from .metrics import registry as metrics, current_job_id
+from .cancellation import check_cancelled
+from . import tracing
 
-API_KEY = "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"
+API_KEY = os.environ.get("OPENROUTER_API_KEY", "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")
 DetectorFactory.seed = 0
 
-def clean_arabic_text(text):
-    """تنظيف النص العربي من الرموز الغريبة مع الاحتفاظ بالتشكيل الصحيح."""
-    # إزالة الرموز الغريبة التي قد تظهر بسبب مشاكل الترميز
-    unwanted_symbols = ['!', '@', '#', '$', '%', '^', '&', '*', '+', '=', '|', '\\', '/', '<', '>', '?', '`', '~']
-    
-    for symbol in unwanted_symbols:
-        text = text.replace(symbol, '')
-    
-    # إزالة المسافات المتعددة
-    text = re.sub(r'\s+', ' ', text)
-    
-    # تنظيف النص من الرموز غير المرغوبة في بداية ونهاية النص
-    text = text.strip()
-    
-    return text
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+
+# إعدادات الطلبات المتحوطة (hedged requests)
+HEDGE_PERCENTILE = 95        # النسبة المئوية لزمن استجابة المزود الأساسي قبل إرسال طلب احتياطي
+HEDGE_MIN_SAMPLES = 5        # أقل عدد من القياسات قبل الاعتماد على الإحصائيات
+HEDGE_DEFAULT_DELAY = 8.0    # مهلة التحوط الافتراضية (ثوانٍ) قبل توفر إحصائيات كافية
+HEDGE_MIN_DELAY = 1.0        # لا نرسل طلبًا احتياطيًا قبل هذه المهلة مهما كانت الإحصائيات
+
+# ذاكرة مؤقتة للترجمات في هذه الجلسة (إعادة تشغيل مهمة لا تعيد طلب ما تُرجم سابقًا)، لكل قائمة مزودين ونماذجها
+TRANSLATION_CACHE_SIZE = 512
+_translation_cache = OrderedDict()
+_translation_cache_lock = threading.Lock()
+
+class LatencyStats:
+    """إحصائيات زمن الاستجابة لمزود ترجمة ضمن نافذة متحركة."""
+
+    def __init__(self, window: int = 100):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.failures = 0
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    @property
+    def count(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float):
+        """إرجاع النسبة المئوية p لزمن الاستجابة (nearest-rank) أو None عند عدم وجود قياسات."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        rank = max(int(round(p / 100.0 * len(samples))) - 1, 0)
+        return samples[min(rank, len(samples) - 1)]
+
+class TranslationProvider:
+    """مزود ترجمة متوافق مع واجهة chat-completions (OpenRouter أو خادم محلي بديل)."""
+
+    def __init__(self, name: str, url: str, model: str, api_key: str = None, timeout: float = 30,
+                 prompt_price: float = 0.0, completion_price: float = 0.0):
+        self.name = name
+        self.url = url
+        self.model = model
+        self.api_key = api_key
+        self.timeout = timeout
+        # السعر بالدولار لكل مليون توكن (يُستخدم إذا لم يُرجع المزود حقل cost)
+        self.prompt_price = prompt_price
+        self.completion_price = completion_price
+        # زمن الطلبات الكاملة فقط: منه تُحسب مهلة الطلب المتحوط في acomplete
+        self.stats = LatencyStats()
+        # زمن أول جزء في الوضع المتدفق، منفصل لأنه أقصر كثيرًا من زمن الرد الكامل ويخفض المهلة دون داعٍ
+        self.stream_stats = LatencyStats()
+
+    def headers(self) -> dict:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def hedge_delay(self) -> float:
+        """المهلة التي ننتظرها قبل إرسال طلب احتياطي إلى المزود التالي."""
+        if self.stats.count < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        return max(self.stats.percentile(HEDGE_PERCENTILE), HEDGE_MIN_DELAY)
+
+    def _usage_fields(self, usage: dict) -> dict:
+        """استخراج التوكنات والتكلفة من حقل usage في الرد."""
+        usage = usage or {}
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        completion_tokens = usage.get("completion_tokens") or 0
+        cost = usage.get("cost")
+        if cost is None:
+            cost = (prompt_tokens * self.prompt_price + completion_tokens * self.completion_price) / 1_000_000
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "cost": cost}
+
+    async def acomplete(self, messages: list, job_id: str = None, queued_at: float = None) -> str:
+        """
+        إرسال طلب ترجمة واحد عبر جلسة HTTP المشتركة وإرجاع النص،
+        مع تسجيل زمن الاستجابة ومقاييس الطلب.
+        """
+        job_id = job_id or current_job_id()
+        start = time.time()
+        record = {"provider": self.name, "model": self.model,
+                  "queue_wait": start - queued_at if queued_at else None}
+        try:
+            session = await get_async_service().http_session()
+            with tracing.span(f"POST {self.name}", "http", model=self.model) as trace_args:
+                async with session.post(self.url, headers=self.headers(),
+                                        json={"model": self.model, "messages": messages},
+                                        timeout=aiohttp.ClientTimeout(total=self.timeout)) as response:
+                    trace_args["status"] = response.status
+                    print(f"RESPONSE STATUS ({self.name}):", response.status)
+                    if response.status != 200:
+                        print("RESPONSE TEXT:", await response.text())
+                        raise Exception(f"API returned status {response.status}")
+                    body = await response.json(content_type=None)
+            content = body["choices"][0]["message"]["content"].strip()
+            if not content:
+                raise Exception("API returned an empty translation")
+        except Exception as e:
+            self.stats.record_failure()
+            metrics.record_request("translation", job_id=job_id, ok=False, error=str(e),
+                                   latency=time.time() - start, **record)
+            raise
+        latency = time.time() - start
+        self.stats.record(latency)
+        metrics.record_request("translation", job_id=job_id, ok=True, latency=latency,
+                               **record, **self._usage_fields(body.get("usage")))
+        return content
+
+    def complete(self, messages: list, job_id: str = None, queued_at: float = None) -> str:
+        """نسخة متزامنة من acomplete تُنفَّذ على حلقة الأحداث المشتركة."""
+        return run_async(self.acomplete(messages, job_id, queued_at))
+
+    async def astream(self, messages: list):
+        """
+        طلب ترجمة متدفق (stream=true) عبر أحداث SSE.
+        مولد غير متزامن لأجزاء النص فور وصولها.
+        """
+        job_id = current_job_id()
+        start = time.time()
+        record = {"provider": self.name, "model": self.model, "stream": True}
+        traced = time.perf_counter()
+        try:
+            session = await get_async_service().http_session()
+            response = await session.post(self.url, headers=self.headers(),
+                                          json={"model": self.model, "messages": messages, "stream": True},
+                                          timeout=aiohttp.ClientTimeout(total=None, sock_read=self.timeout))
+            print(f"RESPONSE STATUS ({self.name}, stream):", response.status)
+            if response.status != 200:
+                print("RESPONSE TEXT:", await response.text())
+                response.release()
+                raise Exception(f"API returned status {response.status}")
+        except Exception as e:
+            self.stream_stats.record_failure()
+            metrics.record_request("translation", job_id=job_id, ok=False, error=str(e),
+                                   latency=time.time() - start, **record)
+            tracing.record(f"POST {self.name} (stream)", "http", traced, model=self.model, error=str(e))
+            raise
+        first_token_latency = None
+        usage = None
+        async with response:
+            async for raw_line in response.content:
+                line = raw_line.decode("utf-8").strip()
+                # تجاهل الأسطر الفارغة وتعليقات SSE مثل ": OPENROUTER PROCESSING"
+                if not line or line.startswith(":") or not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                event = json.loads(payload)
+                if "error" in event:
+                    self.stream_stats.record_failure()
+                    metrics.record_request("translation", job_id=job_id, ok=False, error=str(event["error"]),
+                                           latency=time.time() - start, **record)
+                    raise Exception(f"stream error: {event['error']}")
+                # الحدث الأخير قد يحمل حقل usage
+                usage = event.get("usage") or usage
+                choices = event.get("choices") or [{}]
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    if first_token_latency is None:
+                        # زمن أول جزء هو ما يهم في الوضع المتدفق
+                        first_token_latency = time.time() - start
+                        self.stream_stats.record(first_token_latency)
+                    yield delta
+        metrics.record_request("translation", job_id=job_id, ok=True, latency=time.time() - start,
+                               first_token_latency=first_token_latency, **record, **self._usage_fields(usage))
+        tracing.record(f"POST {self.name} (stream)", "http", traced, model=self.model,
+                       first_token_latency=first_token_latency)
+
+    def stream(self, messages: list):
+        """
+        مولد متزامن فوق astream: الطلب يعمل على حلقة الأحداث المشتركة
+        والأجزاء تصل عبر طابور، فإيقاف الاستهلاك مبكرًا يلغي الطلب.
+        """
+        chunks = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for delta in self.astream(messages):
+                    chunks.put(delta)
+            except Exception as e:
+                chunks.put(e)
+            finally:
+                chunks.put(done)
+
+        future = get_async_service().submit(pump())
+        try:
+            while True:
+                item = chunks.get()
+                if item is done:
+                    # الطلب الملغى ينهي الطابور أيضًا: لا نعامله كنهاية طبيعية للترجمة
+                    check_cancelled()
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+    def __repr__(self):
+        return f"TranslationProvider({self.name!r}, model={self.model!r})"
+
+def load_providers_from_env():
+    """
+    تحميل قائمة المزودين من متغير البيئة DUBBER_TRANSLATION_PROVIDERS (JSON)،
+    مثال: [{"name": "local", "url": "http://127.0.0.1:8765/api/v1/chat/completions", "model": "stub"}]
+    """
+    raw = os.environ.get("DUBBER_TRANSLATION_PROVIDERS")
+    if not raw:
+        return None
+    try:
+        entries = json.loads(raw)
+        return [TranslationProvider(e["name"], e["url"], e.get("model", "stub"),
+                                    api_key=e.get("api_key"), timeout=e.get("timeout", 30),
+                                    prompt_price=e.get("prompt_price", 0.0),
+                                    completion_price=e.get("completion_price", 0.0))
+                for e in entries]
+    except Exception as e:
+        print(f"⚠️ تعذر قراءة DUBBER_TRANSLATION_PROVIDERS: {e}")
+        return None
+
+def default_providers():
+    """قائمة المزودين الافتراضية مرتبة حسب الأولوية."""
+    return [
+        TranslationProvider("openrouter-deepseek", OPENROUTER_URL, "deepseek/deepseek-chat-v3-0324:free", api_key=API_KEY),
+        TranslationProvider("openrouter-llama", OPENROUTER_URL, "meta-llama/llama-3.3-70b-instruct:free", api_key=API_KEY),
+    ]
+
+_providers = load_providers_from_env() or default_providers()
+
+def get_translation_providers():
+    """إرجاع قائمة مزودي الترجمة الحالية بالترتيب."""
+    return list(_providers)
+
+def set_translation_providers(providers):
+    """استبدال قائمة مزودي الترجمة (الأول هو الأساسي)."""
+    global _providers
+    if not providers:
+        raise ValueError("يجب تحديد مزود ترجمة واحد على الأقل")
+    _providers = list(providers)
+
+def clear_translation_cache():
+    """تفريغ ذاكرة الترجمات المؤقتة (لقياس الأداء بذاكرة باردة)."""
+    with _translation_cache_lock:
+        _translation_cache.clear()
+
+def request_with_hedging(messages: list, providers=None, queued_at: float = None):
+    """
+    إرسال الطلب إلى المزود الأساسي، وإذا لم يجب خلال مهلة التحوط (النسبة المئوية
+    لزمن استجابته) يُرسل طلب احتياطي إلى المزود التالي. أول إجابة صحيحة تفوز.
+    يعيد (النص، اسم المزود). الطلبات تعمل على حلقة الأحداث المشتركة.
+    queued_at: لحظة جاهزية الطلب (time.time())؛ ما بينها وبين الإرسال يُسجَّل كانتظار في الطابور
+    (فواصل تجنب الحظر وجدولة حلقة الأحداث).
+    """
+    return run_async(arequest_with_hedging(messages, providers, queued_at or time.time()))
+
+async def arequest_with_hedging(messages: list, providers=None, queued_at: float = None):
+    """النسخة غير المتزامنة من request_with_hedging؛ الطلبات الخاسرة تُلغى بعد الفوز."""
+    providers = list(providers or _providers)
+    job_id = current_job_id()
+
+    # المزودون ونماذجهم جزء من المفتاح: تغيير المزود أو النموذج لا يعيد ترجمات النموذج السابق
+    cache_key = json.dumps({"providers": [[p.name, p.url, p.model] for p in providers], "messages": messages},
+                           ensure_ascii=False, sort_keys=True)
+    with _translation_cache_lock:
+        cached = _translation_cache.get(cache_key)
+        if cached is not None:
+            _translation_cache.move_to_end(cache_key)
+    if cached is not None:
+        metrics.record_request("translation", job_id=job_id, ok=True, cache_hit=True, provider="cache")
+        return cached
+
+    pending = {}
+    errors = []
+    next_index = 0
+
+    def launch():
+        nonlocal next_index
+        provider = providers[next_index]
+        # انتظار الطلب الأول يبدأ من جاهزيته؛ الطلبات الاحتياطية تُحسب من لحظة إطلاقها
+        ready = (queued_at if next_index == 0 else None) or time.time()
+        next_index += 1
+        pending[asyncio.ensure_future(provider.acomplete(messages, job_id, ready))] = provider
+        return provider
+
+    def remember(result):
+        with _translation_cache_lock:
+            _translation_cache[cache_key] = result
+            while len(_translation_cache) > TRANSLATION_CACHE_SIZE:
+                _translation_cache.popitem(last=False)
+        return result
+
+    current = launch()
+    try:
+        while pending:
+            timeout = current.hedge_delay() if next_index < len(providers) else None
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # المزود الحالي تجاوز مهلة التحوط: أرسل طلبًا احتياطيًا
+                print(f"⏳ {current.name} لم يستجب خلال {timeout:.1f}s، إرسال طلب احتياطي...")
+                metrics.inc("translation.hedges", job_id=job_id)
+                current = launch()
+                continue
+            for task in done:
+                provider = pending.pop(task)
+                try:
+                    return remember((task.result(), provider.name))
+                except Exception as e:
+                    print(f"⚠️ فشل المزود {provider.name}: {e}")
+                    errors.append(f"{provider.name}: {e}")
+            if not pending and next_index < len(providers):
+                metrics.inc("translation.retries", job_id=job_id)
+                current = launch()
+    finally:
+        for task in pending:
+            task.cancel()
+    metrics.inc("translation.failed_chunks", job_id=job_id)
+    raise Exception("فشلت جميع مزودات الترجمة: " + "; ".join(errors))
 
 def split_text_smart(text, max_tokens=1500):
     """تقسيم النص الطويل إلى مقاطع ذكية مع الحفاظ على السياق."""
@@ -83,6 +408,24 @@ def get_language_name(language_code: str) -> str:
     }
     return language_names.get(language_code, language_code)
 
+def split_translation_chunks(text: str, max_length: int = 2000):
+    """تقسيم النص إلى أجزاء مناسبة لطلب ترجمة واحد (تقسيم بسيط على الجمل)."""
+    if len(text) <= max_length:
+        return [text]
+    return split_text_smart(text, max_length)
+
+def build_system_message(source_language: str, target_language: str) -> str:
+    """بناء رسالة النظام لطلب الترجمة بناءً على اللغتين."""
+    source_lang_name = get_language_name(source_language)
+    target_lang_name = get_language_name(target_language)
+    
+    system_message = f"ترجم النص التالي من {source_lang_name} إلى {target_lang_name}، مع الحفاظ على جميع المصطلحات التقنية كما هي. اجعل الترجمة مقتضبة ومباشرة قدر الإمكان لتطابق طول النص الأصلي، وتجنب الإضافات غير الضرورية."
+    
+    # إضافة تعليمات خاصة للعربية
+    if target_language == "ar":
+        system_message += " أضف التشكيل الكامل (الحركات) إلى جميع الكلمات العربية في الترجمة لتسهيل القراءة الآلية."
+    return system_message
+
 def translate_text_simple(text_en: str) -> str:
     """ترجمة نص إنجليزي إلى العربية باستخدام OpenRouter API - نسخة مبسطة."""
     return translate_text_general(text_en, "en", "ar")
@@ -92,77 +435,40 @@ def translate_text_general(text: str, source_language: str, target_language: str
     ترجمة نص من أي لغة إلى أي لغة أخرى باستخدام OpenRouter API.
     يجب تمرير اللغة المصدر بشكل صريح.
     """
-    url = "https://openrouter.ai/api/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
     # تقسيم النص إلى مقاطع أصغر إذا كان طويلاً
-    max_length = 2000
-    if len(text) > max_length:
-        # تقسيم بسيط على الجمل
-        sentences = re.split(r'(?<=[.!?])\s+', text)
-        chunks = []
-        current_chunk = ""
-        
-        for sentence in sentences:
-            if len(current_chunk) + len(sentence) < max_length:
-                current_chunk += sentence + " "
-            else:
-                if current_chunk.strip():
-                    chunks.append(current_chunk.strip())
-                current_chunk = sentence + " "
-        
-        if current_chunk.strip():
-            chunks.append(current_chunk.strip())
-    else:
-        chunks = [text]
+    chunks = split_translation_chunks(text)
     
     final_translation = ""
     
     # تحديد رسالة النظام بناءً على اللغات
     source_lang_name = get_language_name(source_language)
     target_lang_name = get_language_name(target_language)
-    
-    system_message = f"ترجم النص التالي من {source_lang_name} إلى {target_lang_name}، مع الحفاظ على جميع المصطلحات التقنية كما هي. اجعل الترجمة مقتضبة ومباشرة قدر الإمكان لتطابق طول النص الأصلي، وتجنب الإضافات غير الضرورية."
-    
-    # إضافة تعليمات خاصة للعربية
-    if target_language == "ar":
-        system_message += " أضف التشكيل الكامل (الحركات) إلى جميع الكلمات العربية في الترجمة لتسهيل القراءة الآلية."
+    system_message = build_system_message(source_language, target_language)
     
     print(f"📝 ترجمة النص من {source_lang_name} إلى {target_lang_name} مقسم إلى {len(chunks)} جزء...")
     
+    # لحظة جاهزية الجزء التالي للإرسال (تشمل فاصل تجنب الحظر في انتظار الطابور)
+    ready = time.time()
     for i, chunk in enumerate(chunks):
         print(f"📝 ترجمة الجزء {i + 1} من {len(chunks)}...")
         
-        data = {
-            "model": "deepseek/deepseek-chat-v3-0324:free",
-            "messages": [
-                {
-                    "role": "system",
-                    "content": system_message
-                },
-                {
-                    "role": "user",
-                    "content": chunk
-                }
-            ]
-        }
+        messages = [
+            {
+                "role": "system",
+                "content": system_message
+            },
+            {
+                "role": "user",
+                "content": chunk
+            }
+        ]
         
         try:
-            response = requests.post(url, headers=headers, json=data, timeout=30)
-            print("RESPONSE STATUS:", response.status_code)
+            translated_chunk, provider_name = request_with_hedging(messages, queued_at=ready)
+            print(f"✅ تمت ترجمة الجزء {i + 1} عبر {provider_name}")
             
-            if response.status_code != 200:
-                print("RESPONSE TEXT:", response.text)
-                raise Exception(f"API returned status {response.status_code}")
-                
-            translated_chunk = response.json()["choices"][0]["message"]["content"].strip()
-            
-            # تنظيف النص من الرموز الغريبة مع الاحتفاظ بالتشكيل للعربية
-            if target_language == "ar":
-                translated_chunk = clean_arabic_text(translated_chunk)
+            # تنظيف النص من الرموز الغريبة مع الاحتفاظ بالتشكيل وعلامات الترقيم
+            translated_chunk = normalize_text(translated_chunk, target_language)
             
             # إضافة الترجمة مع مسافة واحدة فقط
             if final_translation:
@@ -172,9 +478,12 @@ def translate_text_general(text: str, source_language: str, target_language: str
                 
             # انتظار قصير بين الطلبات لتجنب الحظر
             if i < len(chunks) - 1:
+                ready = time.time()
                 time.sleep(1)
+                metrics.inc("translation.throttle_seconds", time.time() - ready)
                 
         except Exception as e:
+            ready = time.time()
             print(f"❌ خطأ أثناء ترجمة الجزء {i + 1}: {e}")
             # إضافة علامة للجزء الفاشل
             if final_translation:
@@ -184,6 +493,155 @@ def translate_text_general(text: str, source_language: str, target_language: str
     
     return final_translation.strip()
 
+# نهاية الجملة: علامة ترقيم ختامية يتبعها فراغ
+_SENTENCE_END = re.compile(r'(?<=[.!?؟。！？])\s+')
+
+def _pop_sentences(buffer: str):
+    """فصل الجمل المكتملة من بداية المخزن المؤقت، وإرجاع (الجمل، الباقي)."""
+    parts = _SENTENCE_END.split(buffer)
+    return [p.strip() for p in parts[:-1] if p.strip()], parts[-1]
+
+def translate_text_stream(text: str, source_language: str, target_language: str = "ar", providers=None):
+    """
+    ترجمة متدفقة: يعيد مولدًا للجمل المترجمة المكتملة فور وصولها من المزود،
+    حتى تبدأ مرحلة توليد الصوت بالجملة الأولى قبل اكتمال الترجمة.
+    إذا فشل المزود قبل وصول أي نص يُجرّب المزود التالي.
+    """
+    providers = list(providers or _providers)
+    chunks = split_translation_chunks(text)
+    system_message = build_system_message(source_language, target_language)
+
+    print(f"📝 ترجمة متدفقة من {get_language_name(source_language)} إلى {get_language_name(target_language)} ({len(chunks)} جزء)...")
+
+    def finalize(sentence):
+        return normalize_text(sentence, target_language)
+
+    for i, chunk in enumerate(chunks):
+        messages = [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": chunk}
+        ]
+        for provider in providers:
+            buffer = ""
+            received = False
+            try:
+                for delta in provider.stream(messages):
+                    received = True
+                    buffer += delta
+                    sentences, buffer = _pop_sentences(buffer)
+                    for sentence in sentences:
+                        sentence = finalize(sentence)
+                        if sentence:
+                            yield sentence
+                if buffer.strip():
+                    sentence = finalize(buffer.strip())
+                    if sentence:
+                        yield sentence
+                print(f"✅ تمت ترجمة الجزء {i + 1} (تدفق) عبر {provider.name}")
+                break
+            except Exception as e:
+                print(f"❌ خطأ أثناء الترجمة المتدفقة للجزء {i + 1} عبر {provider.name}: {e}")
+                if received:
+                    # وصل جزء من الترجمة بالفعل ولا يمكن إعادته دون تكرار
+                    break
+        else:
+            print(f"❌ فشلت جميع المزودات في ترجمة الجزء {i + 1}")
+
+# ميزانية الطول: نسمح بتجاوز بسيط قبل إعادة طلب ترجمة أقصر
+BUDGET_TOLERANCE = 1.1
+SEGMENTS_PER_REQUEST = 40
+_NUMBERED_LINE = re.compile(r'^\s*\[?(\d+)\]?\s*[:.)\-]\s*(.*)$')
+
+def _request_numbered_lines(system_message: str, lines, queued_at: float = None):
+    """إرسال أسطر مرقمة في طلب واحد وإرجاع قاموس {الرقم: النص} من الرد (queued_at: لحظة جاهزية الدفعة)."""
+    user_content = "\n".join(f"{number}: {text}" for number, text in lines)
+    messages = [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": user_content}
+    ]
+    content, provider_name = request_with_hedging(messages, queued_at=queued_at)
+    results = {}
+    for line in content.splitlines():
+        match = _NUMBERED_LINE.match(line)
+        if match and match.group(2).strip():
+            results[int(match.group(1))] = match.group(2).strip()
+    return results
+
+def translate_segments(segments, source_language: str, target_language: str = "ar", voice: str = None):
+    """
+    ترجمة مقاطع Whisper الموقوتة ({"start", "end", "text"}) مع ميزانية طول لكل مقطع.
+    الميزانية = مدة المقطع × سرعة النطق المتعلَّمة للغة/للصوت (speech_rate).
+    المقاطع التي تتجاوز ميزانيتها فقط يُعاد طلب اختصارها مرة واحدة.
+    يعيد قائمة ترجمات بنفس ترتيب المقاطع.
+    """
+    # الدفعة الأولى جاهزة من لحظة الاستدعاء، وكل دفعة تالية بعد انتهاء سابقتها
+    ready = time.time()
+    budgets = [char_budget(max(seg["end"] - seg["start"], 0.0), target_language, voice) for seg in segments]
+    translations = [""] * len(segments)
+    indices = [i for i, seg in enumerate(segments) if seg["text"].strip()]
+
+
+    system_message = build_system_message(source_language, target_language) + (
+        " ستصلك أسطر مرقمة بالشكل «رقم: [≤ حد] النص». ترجم كل سطر على حدة وأعده بنفس رقمه بالشكل «رقم: الترجمة»"
+        " دون دمج الأسطر أو إضافة أي شيء آخر. يجب ألا تتجاوز ترجمة كل سطر عدد الأحرف المحدد بين القوسين"
+        " (دون احتساب التشكيل) لأنها ستُنطق خلال مدة المقطع الأصلي."
+    )
+
+    print(f"📝 ترجمة {len(indices)} مقطع من {get_language_name(source_language)} إلى {get_language_name(target_language)} بميزانية طول لكل مقطع...")
+
+    for start in range(0, len(indices), SEGMENTS_PER_REQUEST):
+        batch = indices[start:start + SEGMENTS_PER_REQUEST]
+        try:
+            results = _request_numbered_lines(system_message, [(i + 1, f"[≤{budgets[i]}] {segments[i]['text'].strip()}") for i in batch],
+                                              queued_at=ready)
+        except Exception as e:
+            print(f"❌ خطأ أثناء ترجمة المقاطع {batch[0] + 1}-{batch[-1] + 1}: {e}")
+            results = {}
+        # تطبيع ترجمات الدفعة كلها في استدعاء واحد
+        for i, text in zip(batch, normalize_batch([results.get(i + 1, "") for i in batch], target_language)):
+            translations[i] = text
+
+        # المقاطع التي لم ترد في الرد تُترجم منفردة
+        for i in [i for i in batch if not translations[i]]:
+            metrics.inc("translation.segment_rerequests")
+            try:
+                results = _request_numbered_lines(system_message, [(i + 1, f"[≤{budgets[i]}] {segments[i]['text'].strip()}")])
+                translations[i] = normalize_text(results.get(i + 1, ""), target_language)
+            except Exception as e:
+                print(f"❌ خطأ أثناء ترجمة المقطع {i + 1}: {e}")
+        ready = time.time()
+
+    if indices and not any(translations[i] for i in indices):
+        raise Exception("فشلت ترجمة جميع المقاطع")
+
+    # إعادة طلب المقاطع التي تجاوزت ميزانيتها فقط مع طلب اختصارها
+    over_budget = [i for i in indices if spoken_length(translations[i]) > budgets[i] * BUDGET_TOLERANCE]
+    if over_budget:
+        print(f"✂️ {len(over_budget)} مقطع تجاوز ميزانية الطول، طلب اختصارها...")
+        metrics.inc("translation.over_budget_segments", len(over_budget))
+        compress_message = (
+            f"اختصر كل ترجمة في الأسطر المرقمة التالية ({get_language_name(target_language)}) بحيث لا تتجاوز عدد الأحرف"
+            " المحدد بين القوسين (دون احتساب التشكيل)، مع الحفاظ على المعنى والمصطلحات التقنية."
+            " أعد كل سطر بنفس رقمه بالشكل «رقم: النص المختصر» دون أي إضافات."
+        )
+        if target_language == "ar":
+            compress_message += " حافظ على التشكيل الكامل."
+        for start in range(0, len(over_budget), SEGMENTS_PER_REQUEST):
+            batch = over_budget[start:start + SEGMENTS_PER_REQUEST]
+            try:
+                results = _request_numbered_lines(compress_message, [(i + 1, f"[≤{budgets[i]}] {translations[i]}") for i in batch])
+            except Exception as e:
+                print(f"⚠️ تعذر اختصار المقاطع: {e}")
+                continue
+            shortened = normalize_batch([results.get(i + 1, "") for i in batch], target_language)
+            for i, shorter in zip(batch, shortened):
+                if shorter and spoken_length(shorter) < spoken_length(translations[i]):
+                    translations[i] = shorter
+        still_over = sum(1 for i in over_budget if spoken_length(translations[i]) > budgets[i] * BUDGET_TOLERANCE)
+        print(f"📊 مقاطع ما زالت أطول من ميزانيتها: {still_over} من {len(indices)}")
+
+    return translations
+
 def detect_language_from_text(text: str) -> str:
     """
     اكتشاف لغة النص باستخدام langdetect.
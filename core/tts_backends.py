@@ -0,0 +1,166 @@
+"""
+واجهات محركات توليد الصوت (TTS). كل محرك يوفر:
+    synthesize(text, voice, rate, pitch) -> (بيانات الصوت، أحداث الحدود)
+    list_voices() -> قائمة أصوات {"name", "locale", "language", "gender", "display"}
+    capabilities -> ما يدعمه المحرك (السرعة، النبرة، الحدود، العمل دون اتصال، التوازي المناسب)
+المحرك الافتراضي edge-tts (خدمة سحابية)، ومحرك espeak-ng محلي يعمل دون اتصال
+للمعالجة الكبيرة وعُقد المعالجة المعزولة واختبارات الحمل القابلة للتكرار.
+يُختار المحرك عبر DUBBER_TTS_BACKEND أو set_tts_backend.
+"""
+
+import asyncio
+import os
+import shutil
+from .tts_cache import DEFAULT_OUTPUT_FORMAT
+
+# وحدة offset/duration في أحداث الحدود من edge-tts هي 100 نانوثانية
+_TICKS_PER_SECOND = 10_000_000
+
+def parse_percent(value: str) -> int:
+    """تحويل قيمة مثل "+10%" أو "-5Hz" إلى عدد صحيح."""
+    return int(value.strip().rstrip("%").rstrip("Hz") or 0)
+
+class TTSBackend:
+    """الواجهة الأساسية لمحرك TTS."""
+
+    name = "base"
+    # تدخل في مفتاح الذاكرة المؤقتة للمقاطع: تغيير الصيغة يعني مقاطع مختلفة
+    output_format = ""
+    capabilities = {"rate": False, "pitch": False, "boundaries": False, "offline": False, "concurrency": 1}
+
+    async def synthesize(self, text: str, voice: str, rate: str = "+0%", pitch: str = "+0Hz"):
+        raise NotImplementedError
+
+    async def list_voices(self):
+        raise NotImplementedError
+
+    def resolve_voice(self, voice: str, language_code: str) -> str:
+        """الصوت الذي سيُستخدم فعليًا لهذا المحرك (قد يكون الصوت المطلوب خاصًا بمحرك آخر)."""
+        return voice
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name!r})"
+
+class EdgeTTSBackend(TTSBackend):
+    """أصوات Microsoft Edge العصبية عبر edge-tts (تتطلب اتصالًا بالإنترنت)."""
+
+    name = "edge-tts"
+    output_format = DEFAULT_OUTPUT_FORMAT
+    capabilities = {"rate": True, "pitch": True, "boundaries": True, "offline": False, "concurrency": 4}
+
+    async def synthesize(self, text: str, voice: str, rate: str = "+0%", pitch: str = "+0Hz"):
+        audio = bytearray()
+        boundaries = []
+        # edge_tts (ومعه aiohttp) يُستورد عند أول استخدام فقط حتى لا يبطئ بدء الواجهة
+        from edge_tts import Communicate
+        async for chunk in Communicate(text, voice, rate=rate, pitch=pitch).stream():
+            if chunk["type"] == "audio":
+                audio.extend(chunk["data"])
+            elif chunk["type"] in ("WordBoundary", "SentenceBoundary"):
+                boundaries.append({
+                    "type": chunk["type"],
+                    "offset": chunk["offset"] / _TICKS_PER_SECOND,
+                    "duration": chunk["duration"] / _TICKS_PER_SECOND,
+                    "text": chunk.get("text", ""),
+                })
+        return bytes(audio), boundaries
+
+    async def list_voices(self):
+        from edge_tts import list_voices as edge_list_voices
+        voices = []
+        for v in await edge_list_voices():
+            locale = v["Locale"]
+            voices.append({
+                "name": v["ShortName"], "locale": locale, "language": locale.split("-")[0].lower(),
+                "gender": v.get("Gender", ""), "display": v.get("FriendlyName", v["ShortName"]),
+            })
+        return voices
+
+class EspeakBackend(TTSBackend):
+    """espeak-ng محلي: سريع وحتمي ويعمل دون اتصال (جودة صوت أقل من الأصوات العصبية)."""
+
+    name = "espeak-ng"
+    output_format = "wav-22050-16bit-mono"
+    capabilities = {"rate": True, "pitch": True, "boundaries": False, "offline": True,
+                    "concurrency": max(os.cpu_count() or 1, 1)}
+    # سرعة espeak الافتراضية (كلمة/دقيقة) والنبرة الافتراضية (0-99)
+    BASE_WPM = 175
+    BASE_PITCH = 50
+
+    def __init__(self, executable: str = None):
+        self.executable = executable or shutil.which("espeak-ng") or shutil.which("espeak") or "espeak-ng"
+
+    async def _run(self, *args, text: str = None) -> bytes:
+        proc = await asyncio.create_subprocess_exec(
+            self.executable, *args,
+            stdin=asyncio.subprocess.PIPE if text is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            stdout, stderr = await proc.communicate(text.encode("utf-8") if text is not None else None)
+        except asyncio.CancelledError:
+            # إلغاء الـ coroutine لا يوقف العملية الفرعية وحده
+            proc.kill()
+            raise
+        if proc.returncode != 0:
+            raise Exception(f"{self.name} فشل: {stderr.decode('utf-8', 'replace').strip()}")
+        return stdout
+
+    async def synthesize(self, text: str, voice: str, rate: str = "+0%", pitch: str = "+0Hz"):
+        speed = max(int(self.BASE_WPM * (100 + parse_percent(rate)) / 100), 80)
+        # النبرة بالهرتز تقريبية: كل 2Hz تقابل درجة واحدة على مقياس espeak
+        pitch_level = min(max(self.BASE_PITCH + parse_percent(pitch) // 2, 0), 99)
+        # النص عبر stdin حتى لا يتأثر بحدود طول سطر الأوامر أو بمحارف خاصة
+        audio = await self._run("-v", voice, "-s", str(speed), "-p", str(pitch_level), "--stdout", text=text)
+        return audio, []
+
+    async def list_voices(self):
+        output = (await self._run("--voices")).decode("utf-8", "replace")
+        voices = []
+        for line in output.splitlines()[1:]:
+            parts = line.split()
+            if len(parts) < 4:
+                continue
+            locale, gender = parts[1], parts[2].split("/")[-1]
+            voices.append({
+                "name": locale, "locale": locale, "language": locale.split("-")[0].lower(),
+                "gender": {"M": "Male", "F": "Female"}.get(gender, ""), "display": parts[3].replace("_", " "),
+            })
+        return voices
+
+    def resolve_voice(self, voice: str, language_code: str) -> str:
+        # أسماء أصوات edge-tts (مثل ar-SA-HamedNeural) لا يعرفها espeak: نستخدم رمز اللغة
+        if not voice or voice.endswith("Neural"):
+            return language_code
+        return voice
+
+_BACKENDS = {
+    EdgeTTSBackend.name: EdgeTTSBackend,
+    EspeakBackend.name: EspeakBackend,
+}
+_instances = {}
+_selected = os.environ.get("DUBBER_TTS_BACKEND", EdgeTTSBackend.name)
+
+def register_tts_backend(name: str, factory):
+    """إضافة محرك جديد (factory: صنف أو دالة تعيد كائن TTSBackend)."""
+    _BACKENDS[name] = factory
+    _instances.pop(name, None)
+
+def available_tts_backends():
+    return list(_BACKENDS)
+
+def get_tts_backend(name: str = None) -> TTSBackend:
+    """المحرك المطلوب بالاسم، أو المحرك المختار حاليًا."""
+    name = name or _selected
+    if name not in _BACKENDS:
+        raise ValueError(f"محرك TTS غير معروف: {name} (المتاح: {', '.join(_BACKENDS)})")
+    backend = _instances.get(name)
+    if backend is None:
+        backend = _instances[name] = _BACKENDS[name]()
+    return backend
+
+def set_tts_backend(name: str):
+    """اختيار المحرك الافتراضي لبقية الجلسة."""
+    global _selected
+    get_tts_backend(name)
+    _selected = name
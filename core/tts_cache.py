@@ -0,0 +1,137 @@
+"""
+ذاكرة مؤقتة على القرص لمقاطع الصوت المولَّدة، مفهرسة بمحتواها:
+المفتاح = تجزئة (النص بعد التطبيع، الصوت، إعدادات السرعة/النبرة/الحجم، صيغة الإخراج).
+إعادة تشغيل مهمة أو إعادة دبلجة نص معدَّل قليلًا لا تعيد توليد المقاطع المتطابقة،
+والمقدمات والخواتيم المتكررة عبر حلقات سلسلة تصبح مجانية.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from .app_paths import get_cache_dir
+
+DEFAULT_MAX_BYTES = 500 * 1024 * 1024
+DEFAULT_OUTPUT_FORMAT = "audio-24khz-48kbitrate-mono-mp3"
+
+class TTSClipCache:
+    """ذاكرة مؤقتة LRU بحد أقصى للحجم، آمنة للاستخدام من عدة خيوط."""
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or get_cache_dir("tts_clips")
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._index = OrderedDict()  # المفتاح -> الحجم، من الأقدم استخدامًا إلى الأحدث
+        self._total_bytes = 0
+        self._load_index()
+
+    @staticmethod
+    def make_key(text: str, voice: str, rate: str = "+0%", pitch: str = "+0Hz", volume: str = "+0%",
+                 output_format: str = DEFAULT_OUTPUT_FORMAT, backend: str = "edge-tts") -> str:
+        """مفتاح المقطع: تجزئة SHA-256 لكل ما يؤثر على الصوت الناتج."""
+        payload = "\x1f".join([backend, voice, rate, pitch, volume, output_format, text])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _load_index(self):
+        """بناء الفهرس من الملفات الموجودة مرتبة حسب آخر استخدام (mtime)."""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, name, st.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total_bytes += size
+
+    def get(self, key: str):
+        """إرجاع بيانات المقطع أو None، مع تحديث ترتيب الاستخدام."""
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._total_bytes -= self._index.pop(key, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        """حفظ المقطع ثم حذف الأقدم استخدامًا حتى يعود الحجم تحت الحد."""
+        if not data or len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ تعذر حفظ المقطع في الذاكرة المؤقتة: {e}")
+            return
+        with self._lock:
+            self._total_bytes += len(data) - self._index.pop(key, 0)
+            self._index[key] = len(data)
+            while self._total_bytes > self.max_bytes and len(self._index) > 1:
+                old_key, old_size = self._index.popitem(last=False)
+                self._total_bytes -= old_size
+                self.evictions += 1
+                try:
+                    os.remove(self._path(old_key))
+                except OSError:
+                    pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._index):
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+            self._index.clear()
+            self._total_bytes = 0
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_tts_cache() -> TTSClipCache:
+    """الذاكرة المؤقتة المشتركة (الحد قابل للتغيير عبر DUBBER_TTS_CACHE_MB)."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            max_mb = float(os.environ.get("DUBBER_TTS_CACHE_MB", DEFAULT_MAX_BYTES / (1024 * 1024)))
+            _default_cache = TTSClipCache(max_bytes=int(max_mb * 1024 * 1024))
+        return _default_cache
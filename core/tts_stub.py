@@ -0,0 +1,78 @@
+"""
+محرك TTS محلي بديل للاختبار وقياس الأداء دون شبكة (مثل core.openrouter_stub للترجمة):
+يعيد WAV بنغمة هادئة طولها يتناسب مع طول النص وسرعة القراءة، بعد زمن استجابة قابل للضبط،
+ويمكنه إفشال نسبة من الطلبات لاختبار إعادة المحاولة.
+
+    from core.tts_stub import register_stub_backend
+    register_stub_backend(latency=0.2, error_rate=0.05)
+    job = DubbingJob(video, "ar", tts_backend="stub")
+"""
+
+import asyncio
+import io
+import random
+import threading
+import wave
+import numpy as np
+from .tts_backends import TTSBackend, parse_percent, register_tts_backend
+
+STUB_BACKEND_NAME = "stub"
+STUB_SAMPLE_RATE = 24000
+# سرعة القراءة التقريبية للكلام الطبيعي (حرف/ثانية) عند rate="+0%"
+STUB_CHARS_PER_SECOND = 15.0
+
+class StubTTSBackend(TTSBackend):
+    """محرك بديل حتمي المدة: latency (+ jitter عشوائي) ثم WAV، أو فشل باحتمال error_rate."""
+
+    name = STUB_BACKEND_NAME
+    output_format = f"wav-{STUB_SAMPLE_RATE}-16bit-mono"
+    capabilities = {"rate": True, "pitch": True, "boundaries": False, "offline": True, "concurrency": 4}
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, seed: int = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    async def synthesize(self, text: str, voice: str, rate: str = "+0%", pitch: str = "+0Hz"):
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if fail:
+            raise Exception(f"{self.name}: خطأ مُحقن")
+        seconds = max(len(text.strip()) / STUB_CHARS_PER_SECOND, 0.2) * 100 / max(100 + parse_percent(rate), 10)
+        return self._tone(seconds, 180 + parse_percent(pitch)), []
+
+    @staticmethod
+    def _tone(seconds: float, frequency: float) -> bytes:
+        t = np.arange(int(seconds * STUB_SAMPLE_RATE)) / STUB_SAMPLE_RATE
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t) ** 2
+        pcm = (0.2 * np.sin(2 * np.pi * frequency * t) * envelope * 32767).astype("<i2")
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(STUB_SAMPLE_RATE)
+            wav.writeframes(pcm.tobytes())
+        return buffer.getvalue()
+
+    async def list_voices(self):
+        return []
+
+    def resolve_voice(self, voice: str, language_code: str) -> str:
+        return voice or language_code
+
+def register_stub_backend(latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                          seed: int = None) -> StubTTSBackend:
+    """تسجيل المحرك البديل باسم "stub" بالإعدادات المعطاة وإرجاعه (لقراءة عدادات الطلبات والأخطاء)."""
+    backend = StubTTSBackend(latency, jitter, error_rate, seed)
+    register_tts_backend(STUB_BACKEND_NAME, lambda: backend)
+    return backend
@@ -0,0 +1,205 @@
+"""
+فهرس الأصوات المتاحة لمحرك TTS، مفهرس حسب اللغة والمنطقة (locale) والنوع والاسم.
+يُحمَّل مرة واحدة: من ملف مؤقت على القرص إن وُجد (حتى لو انتهت صلاحيته)، وإلا من قائمة
+مضمّنة لأصوات edge-tts للغات المدعومة، ثم يُحدَّث في الخلفية من المحرك عند انتهاء الصلاحية،
+لذلك تظهر قائمة الأصوات فورًا عند تشغيل الواجهة حتى دون اتصال بالإنترنت.
+"""
+
+import concurrent.futures
+import json
+import os
+import threading
+import time
+from .app_paths import get_cache_dir
+from .tts_backends import get_tts_backend, EdgeTTSBackend
+from .async_service import get_async_service
+
+# مدة صلاحية الفهرس المحفوظ على القرص قبل تحديثه من المحرك
+VOICE_CATALOG_TTL = 7 * 24 * 3600
+
+_GENDER_LABELS = {"Male": "ذكر", "Female": "أنثى"}
+
+# رموز اللغات في الواجهة التي تختلف عن رموز المناطق في edge-tts
+_LANGUAGE_ALIASES = {"no": "nb"}
+
+# أصوات edge-tts المضمّنة (الأول لكل لغة هو الافتراضي): (الاسم، النوع، الاسم المعروض)
+_BUNDLED_EDGE_VOICES = [
+    ("ar-SA-HamedNeural", "Male", "حامد (ذكر سعودي)"), ("ar-SA-ZariyahNeural", "Female", "زارية (أنثى سعودية)"),
+    ("en-US-JennyNeural", "Female", "Jenny (أنثى أمريكية)"), ("en-US-GuyNeural", "Male", "Guy (ذكر أمريكي)"),
+    ("fr-FR-DeniseNeural", "Female", "Denise (أنثى فرنسية)"), ("fr-FR-HenriNeural", "Male", "Henri (ذكر فرنسي)"),
+    ("es-ES-ElviraNeural", "Female", "Elvira (أنثى إسبانية)"), ("es-ES-AlvaroNeural", "Male", "Alvaro (ذكر إسباني)"),
+    ("de-DE-KatjaNeural", "Female", "Katja (أنثى ألمانية)"), ("de-DE-ConradNeural", "Male", "Conrad (ذكر ألماني)"),
+    ("it-IT-ElsaNeural", "Female", None), ("it-IT-DiegoNeural", "Male", None),
+    ("pt-BR-FranciscaNeural", "Female", None), ("pt-BR-AntonioNeural", "Male", None),
+    ("ru-RU-SvetlanaNeural", "Female", None), ("ru-RU-DmitryNeural", "Male", None),
+    ("zh-CN-XiaoxiaoNeural", "Female", None), ("zh-CN-YunxiNeural", "Male", None),
+    ("ja-JP-NanamiNeural", "Female", None), ("ja-JP-KeitaNeural", "Male", None),
+    ("ko-KR-SunHiNeural", "Female", None), ("ko-KR-InJoonNeural", "Male", None),
+    ("hi-IN-SwaraNeural", "Female", None), ("hi-IN-MadhurNeural", "Male", None),
+    ("tr-TR-EmelNeural", "Female", None), ("tr-TR-AhmetNeural", "Male", None),
+    ("nl-NL-ColetteNeural", "Female", None), ("nl-NL-MaartenNeural", "Male", None),
+    ("pl-PL-ZofiaNeural", "Female", None), ("pl-PL-MarekNeural", "Male", None),
+    ("sv-SE-SofieNeural", "Female", None), ("sv-SE-MattiasNeural", "Male", None),
+    ("da-DK-ChristelNeural", "Female", None), ("da-DK-JeppeNeural", "Male", None),
+    ("nb-NO-PernilleNeural", "Female", None), ("nb-NO-FinnNeural", "Male", None),
+    ("fi-FI-NooraNeural", "Female", None), ("fi-FI-HarriNeural", "Male", None),
+    ("he-IL-HilaNeural", "Female", None), ("he-IL-AvriNeural", "Male", None),
+    ("fa-IR-DilaraNeural", "Female", None), ("fa-IR-FaridNeural", "Male", None),
+    ("ur-PK-UzmaNeural", "Female", None), ("ur-PK-AsadNeural", "Male", None),
+    ("bn-BD-NabanitaNeural", "Female", None), ("bn-BD-PradeepNeural", "Male", None),
+    ("th-TH-PremwadeeNeural", "Female", None), ("th-TH-NiwatNeural", "Male", None),
+    ("vi-VN-HoaiMyNeural", "Female", None), ("vi-VN-NamMinhNeural", "Male", None),
+    ("id-ID-GadisNeural", "Female", None), ("id-ID-ArdiNeural", "Male", None),
+    ("ms-MY-YasminNeural", "Female", None), ("ms-MY-OsmanNeural", "Male", None),
+]
+_BUNDLED_DISPLAY = {name: display for name, _, display in _BUNDLED_EDGE_VOICES if display}
+_BUNDLED_ORDER = {name: i for i, (name, _, _) in enumerate(_BUNDLED_EDGE_VOICES)}
+
+def _bundled_voices():
+    voices = []
+    for name, gender, _ in _BUNDLED_EDGE_VOICES:
+        locale = "-".join(name.split("-")[:2])
+        voices.append({"name": name, "locale": locale, "language": locale.split("-")[0], "gender": gender, "display": ""})
+    return voices
+
+def _display_name(voice: dict) -> str:
+    if voice["name"] in _BUNDLED_DISPLAY:
+        return _BUNDLED_DISPLAY[voice["name"]]
+    if voice.get("display") and not voice["name"].endswith("Neural"):
+        return voice["display"]
+    short = voice["name"].split("-")[-1].replace("Neural", "") or voice["name"]
+    return f"{short} ({_GENDER_LABELS.get(voice['gender'], voice['gender'])} {voice['locale']})"
+
+class VoiceCatalog:
+    """أصوات محرك واحد مع فهارس للبحث المباشر."""
+
+    def __init__(self, backend_name: str, voices, fetched_at: float = 0.0, source: str = "bundled"):
+        self.backend_name = backend_name
+        self.fetched_at = fetched_at
+        self.source = source
+        self._build(voices)
+
+    def _build(self, voices):
+        by_name, by_language, by_locale, by_gender = {}, {}, {}, {}
+        # الأصوات المضمّنة أولًا حتى يبقى الصوت الافتراضي لكل لغة ثابتًا بعد التحديث
+        ordered = sorted(voices, key=lambda v: (_BUNDLED_ORDER.get(v["name"], len(_BUNDLED_ORDER)), v["locale"], v["name"]))
+        for v in ordered:
+            entry = {
+                "name": v["name"], "locale": v["locale"], "language": v["language"],
+                "gender": _GENDER_LABELS.get(v["gender"], v["gender"]), "display": _display_name(v),
+            }
+            by_name[entry["name"]] = entry
+            by_language.setdefault(entry["language"], []).append(entry)
+            by_locale.setdefault(entry["locale"].lower(), []).append(entry)
+            by_gender.setdefault((entry["language"], entry["gender"]), []).append(entry)
+        # استبدال الفهارس دفعة واحدة (القراء في خيوط أخرى يرون الفهرس القديم أو الجديد كاملًا)
+        self._indexes = (by_name, by_language, by_locale, by_gender)
+
+    def __len__(self):
+        return len(self._indexes[0])
+
+    def _language(self, language_code: str) -> str:
+        return _LANGUAGE_ALIASES.get(language_code, language_code)
+
+    def voices_for(self, language_code: str, gender: str = None):
+        """أصوات اللغة (أو المنطقة مثل ar-EG)، مع تصفية اختيارية حسب النوع (ذكر/أنثى)."""
+        _, by_language, by_locale, by_gender = self._indexes
+        if "-" in language_code:
+            voices = by_locale.get(language_code.lower(), [])
+            return [v for v in voices if v["gender"] == gender] if gender else list(voices)
+        language = self._language(language_code)
+        if gender:
+            return list(by_gender.get((language, gender), []))
+        return list(by_language.get(language, []))
+
+    def get(self, name: str):
+        return self._indexes[0].get(name)
+
+    def languages(self):
+        return sorted(self._indexes[1])
+
+    def is_stale(self, ttl: float = VOICE_CATALOG_TTL) -> bool:
+        return time.time() - self.fetched_at > ttl
+
+def _catalog_path(backend_name: str) -> str:
+    return os.path.join(get_cache_dir(), f"voices_{backend_name}.json")
+
+def _load_from_disk(backend_name: str):
+    try:
+        with open(_catalog_path(backend_name), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return VoiceCatalog(backend_name, data["voices"], data.get("fetched_at", 0.0), source="disk")
+    except (OSError, ValueError, KeyError):
+        return None
+
+def _save_to_disk(backend_name: str, voices, fetched_at: float):
+    try:
+        path = _catalog_path(backend_name)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"fetched_at": fetched_at, "voices": voices}, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        print(f"⚠️ تعذر حفظ فهرس الأصوات: {e}")
+
+_catalogs = {}
+_refreshing = set()
+_lock = threading.Lock()
+
+def refresh_voice_catalog(backend: str = None, wait: bool = False):
+    """
+    تحديث الفهرس من قائمة أصوات المحرك (في الخلفية على حلقة الأحداث المشتركة).
+    مع wait=True تُنتظر النتيجة ويُعاد الفهرس المحدَّث.
+    """
+    tts = get_tts_backend(backend)
+    with _lock:
+        if tts.name in _refreshing and not wait:
+            return None
+        _refreshing.add(tts.name)
+
+    def done(future):
+        with _lock:
+            _refreshing.discard(tts.name)
+        try:
+            voices = future.result()
+        except Exception as e:
+            print(f"⚠️ تعذر تحديث فهرس أصوات {tts.name}: {e}")
+            return
+        if not voices:
+            return
+        fetched_at = time.time()
+        _save_to_disk(tts.name, voices, fetched_at)
+        catalog = _catalogs.get(tts.name)
+        if catalog is None:
+            _catalogs[tts.name] = VoiceCatalog(tts.name, voices, fetched_at, source="backend")
+        else:
+            catalog._build(voices)
+            catalog.fetched_at, catalog.source = fetched_at, "backend"
+        print(f"🗣️ تم تحديث فهرس أصوات {tts.name}: {len(voices)} صوت")
+
+    future = get_async_service().submit(tts.list_voices())
+    if wait:
+        concurrent.futures.wait([future])
+        done(future)
+        return _catalogs.get(tts.name)
+    future.add_done_callback(done)
+    return future
+
+def get_voice_catalog(backend: str = None) -> VoiceCatalog:
+    """
+    فهرس أصوات المحرك: يُحمَّل مرة واحدة للجلسة دون انتظار الشبكة،
+    ويُطلب تحديثه في الخلفية إذا انتهت صلاحيته.
+    """
+    name = get_tts_backend(backend).name
+    catalog = _catalogs.get(name)
+    if catalog is None:
+        with _lock:
+            catalog = _catalogs.get(name)
+            if catalog is None:
+                catalog = _load_from_disk(name)
+                if catalog is None:
+                    bundled = _bundled_voices() if name == EdgeTTSBackend.name else []
+                    catalog = VoiceCatalog(name, bundled)
+                _catalogs[name] = catalog
+        if catalog.is_stale():
+            refresh_voice_catalog(name)
+    return catalog
@@ -0,0 +1,85 @@
+"""
+تسخين التطبيق في الخلفية بعد ظهور الواجهة: الواجهة لا تستورد محرك الدبلجة ولا تفحص ffmpeg عند البدء
+(لتظهر النافذة فورًا)، وهذه الوحدة تنجز ذلك كله في خيط خلفي قبل أن يضغط المستخدم "بدء" حتى لا يدفع
+أول تشغيل ثمن البدء البارد.
+
+Whisper يعمل في عملية منفصلة (core.pipeline) فلا يمكن تحميل نموذجه في هذه العملية مسبقًا؛ بدلًا من ذلك
+يُقرأ ملف النموذج مرة واحدة ليدخل ذاكرة التخزين المؤقت لنظام الملفات فيبدأ Whisper أسرع. النموذج غير
+المحمَّل لا يُنزَّل هنا (قد يبلغ عدة غيغابايت) بل عند أول مهمة كما كان.
+
+    from core.warmup import warm_up
+    timings = warm_up("medium", on_status=print)
+"""
+
+import importlib
+import subprocess
+import time
+
+# حجم القراءة عند تحميل ملف نموذج Whisper إلى ذاكرة التخزين المؤقت
+PREFETCH_CHUNK_BYTES = 8 * 1024 * 1024
+
+def _import_engine():
+    # استيراد المحرك يجلب الترجمة وTTS وnumpy وaiohttp وedge_tts دفعة واحدة
+    importlib.import_module(".pipeline", __package__)
+    return "engine loaded"
+
+def _check_ffmpeg():
+    from .ffmpeg_checker import ensure_ffmpeg_available
+    from .text_to_speech import get_ffprobe_path
+    ffmpeg_path = ensure_ffmpeg_available()
+    if not ffmpeg_path:
+        return "ffmpeg not available"
+    # التشغيل الأول يحمّل الملفين التنفيذيين ومكتباتهما من القرص
+    for tool in (ffmpeg_path, get_ffprobe_path()):
+        subprocess.run([tool, "-version"], capture_output=True)
+    return ffmpeg_path
+
+def _prefetch_whisper_model(model_name: str):
+    from .speech_to_text import whisper_model_path, is_whisper_model_downloaded
+    if not model_name:
+        return "not needed"
+    if not is_whisper_model_downloaded(model_name):
+        return f"{model_name} will download on first use"
+    buffer = bytearray(PREFETCH_CHUNK_BYTES)
+    with open(whisper_model_path(model_name), "rb", buffering=0) as f:
+        while f.readinto(buffer):
+            pass
+    return f"{model_name} cached"
+
+def _open_http_session():
+    from .async_service import get_async_service
+    service = get_async_service()
+    service.run(service.http_session())
+    return "session ready"
+
+def _load_voices(tts_backend: str):
+    from .voice_catalog import get_voice_catalog
+    return f"{len(get_voice_catalog(tts_backend))} voices"
+
+def warm_up(whisper_model: str = None, tts_backend: str = None, on_status=None) -> dict:
+    """
+    تنفيذ خطوات التسخين بالترتيب؛ فشل خطوة يُسجَّل ولا يوقف ما بعدها (المهمة الأولى ستعيد المحاولة).
+    on_status(step, message) يُستدعى قبل كل خطوة وبعدها. تُعاد مدة كل خطوة بالثواني.
+    """
+    steps = [
+        ("engine", _import_engine),
+        ("ffmpeg", _check_ffmpeg),
+        ("whisper", lambda: _prefetch_whisper_model(whisper_model)),
+        ("network", _open_http_session),
+        ("voices", lambda: _load_voices(tts_backend)),
+    ]
+    timings = {}
+    for name, step in steps:
+        if on_status:
+            on_status(name, "...")
+        start = time.perf_counter()
+        try:
+            message = step()
+        except Exception as e:
+            message = f"failed: {e}"
+            print(f"⚠️ فشل التسخين ({name}): {e}")
+        timings[name] = time.perf_counter() - start
+        if on_status:
+            on_status(name, message)
+    print("🔥 اكتمل التسخين: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
+    return timings
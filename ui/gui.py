@@ -7,9 +7,7 @@
 
 import os
 import sys
-import asyncio
 import time
-import subprocess
 import logging
 import traceback
 import shutil
@@ -40,44 +38,95 @@ except Exception as e:
     logger.error(f"❌ خطأ في استيراد animations: {e}")
     fade_in_widget = lambda x: None
 
+# محرك الدبلجة (pipeline وtranslator وtext_to_speech ومعها numpy وaiohttp وedge_tts) لا يُستورد هنا حتى تظهر
+# النافذة فورًا؛ يُستورد عند أول استخدام أو مسبقًا في الخلفية أثناء التسخين (core.warmup)
 try:
-    from core.audio_handler import extract_audio, merge_audio_with_video, ensure_directories
-    logger.info("✅ تم استيراد audio_handler بنجاح")
+    from core.speech_to_text import is_whisper_model_downloaded
+    logger.info("✅ تم استيراد speech_to_text بنجاح")
 except Exception as e:
-    logger.error(f"❌ خطأ في استيراد audio_handler: {e}")
+    logger.error(f"❌ خطأ في استيراد speech_to_text: {e}")
 
 try:
-    from core.speech_to_text import transcribe_audio, is_whisper_model_downloaded, transcribe_with_language_detection
-    logger.info("✅ تم استيراد speech_to_text بنجاح")
+    from core.voice_catalog import get_voice_catalog
+    logger.info("✅ تم استيراد voice_catalog بنجاح")
 except Exception as e:
-    logger.error(f"❌ خطأ في استيراد speech_to_text: {e}")
+    logger.error(f"❌ خطأ في استيراد voice_catalog: {e}")
 
 try:
-    from core.translator import translate_text_simple, translate_text_general, get_language_name, detect_language_from_text
-    logger.info("✅ تم استيراد translator بنجاح")
+    from core.metrics import registry as metrics_registry, job_scope, format_job_summary
+    logger.info("✅ تم استيراد metrics بنجاح")
 except Exception as e:
-    logger.error(f"❌ خطأ في استيراد translator: {e}")
+    logger.error(f"❌ خطأ في استيراد metrics: {e}")
 
 try:
-    from core.text_to_speech import generate_arabic_audio, extend_video_duration, generate_audio_for_language, get_voices_for_language
-    logger.info("✅ تم استيراد text_to_speech بنجاح")
+    from core.cancellation import CancelToken
+    logger.info("✅ تم استيراد cancellation بنجاح")
 except Exception as e:
-    logger.error(f"❌ خطأ في استيراد text_to_speech: {e}")
+    logger.error(f"❌ خطأ في استيراد cancellation: {e}")
 
 try:
-    import simpleaudio as sa
-    logger.info("✅ تم استيراد simpleaudio بنجاح")
+    from core.tracing import DEFAULT_TRACE_DIR
+    logger.info("✅ تم استيراد tracing بنجاح")
 except Exception as e:
-    logger.error(f"❌ خطأ في استيراد simpleaudio: {e}")
+    logger.error(f"❌ خطأ في استيراد tracing: {e}")
 
 try:
-    from core.ffmpeg_checker import ensure_ffmpeg_available
-    logger.info("✅ تم استيراد ffmpeg_checker بنجاح")
+    from core.memory import format_bytes
+    logger.info("✅ تم استيراد memory بنجاح")
 except Exception as e:
-    logger.error(f"❌ خطأ في استيراد ffmpeg_checker: {e}")
+    logger.error(f"❌ خطأ في استيراد memory: {e}")
+
+try:
+    from core.tts_backends import get_tts_backend
+    logger.info("✅ تم استيراد tts_backends بنجاح")
+except Exception as e:
+    logger.error(f"❌ خطأ في استيراد tts_backends: {e}")
+
+try:
+    from core.transcript_io import find_sidecar_transcript, TRANSCRIPT_EXTENSIONS
+    logger.info("✅ تم استيراد transcript_io بنجاح")
+except Exception as e:
+    logger.error(f"❌ خطأ في استيراد transcript_io: {e}")
+
+try:
+    from core.warmup import warm_up
+    logger.info("✅ تم استيراد warmup بنجاح")
+except Exception as e:
+    logger.error(f"❌ خطأ في استيراد warmup: {e}")
+
+try:
+    from ui.queue_panel import JobQueuePanel, STAGE_PROGRESS, claim_video, release_video
+    logger.info("✅ تم استيراد queue_panel بنجاح")
+except Exception as e:
+    logger.error(f"❌ خطأ في استيراد queue_panel: {e}")
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".wmv", ".flv", ".webm")
+# نموذج Whisper الافتراضي للمهام (ويُجهَّز ملفه أثناء التسخين)
+DEFAULT_WHISPER_MODEL = "medium"
+
+class WarmupWorker(QThread):
+    """خيط التسخين بعد ظهور النافذة: استيراد المحرك وفحص ffmpeg وتجهيز Whisper والشبكة والأصوات."""
+    status = pyqtSignal(str)
+
+    def __init__(self, whisper_model=DEFAULT_WHISPER_MODEL):
+        super().__init__()
+        self.whisper_model = whisper_model
+
+    def run(self):
+        start = time.time()
+        try:
+            warm_up(self.whisper_model, on_status=self.on_status)
+        except Exception as e:
+            logger.error(f"❌ خطأ في التسخين: {e}")
+        logger.info(f"🔥 اكتمل التسخين في {time.time() - start:.2f} ثانية")
+        self.status.emit("✅ Ready")
+
+    def on_status(self, step, message):
+        logger.info(f"🔥 التسخين ({step}): {message}")
+        self.status.emit(f"⏳ Warming up: {step}...")
 
 class DebugPipelineWorker(QThread):
-    """خيط منفصل لمعالجة خط الدبلجة مع تسجيل مفصل للأخطاء."""
+    """خيط منفصل يشغّل محرك الدبلجة (core.pipeline) ويحوّل أحداث مراحله إلى إشارات الواجهة."""
     success = pyqtSignal(str)
     error = pyqtSignal(str)
     transcript_ready = pyqtSignal(str)
@@ -89,75 +138,99 @@ class DebugPipelineWorker(QThread):
     progress = pyqtSignal(int, float, str)
     language_detected = pyqtSignal(str)
 
-    def __init__(self, video_path, target_language="ar", whisper_model="medium", voice_name=None, source_language=None):
+    def __init__(self, video_path, target_language="ar", whisper_model=DEFAULT_WHISPER_MODEL, voice_name=None, source_language=None, stream_translation=False, tts_backend=None,
+                 transcript_path=None, check_alignment=True, limiter=None):
         super().__init__()
         self.video_path = video_path
         self.target_language = target_language
         self.whisper_model = whisper_model
         self.voice_name = voice_name  # <--- أضفت هذا السطر
         self.source_language = source_language
-        self._should_stop = False
-        self.whisper_proc = None
+        self.stream_translation = stream_translation  # تمرير الجمل المترجمة إلى توليد الصوت فور وصولها
+        # محرك TTS يُثبَّت للمهمة كلها (ويدخل في مفاتيح الذاكرة المؤقتة للمقاطع)
+        self.tts_backend = get_tts_backend(tts_backend).name
+        # نص جاهز (SRT/VTT/JSON) يغني عن استخراج الصوت وWhisper، مع فحص توافق توقيته اختياريًا
+        self.transcript_path = transcript_path
+        self.check_alignment = check_alignment
+        # حدود الموارد المشتركة مع قائمة الانتظار (Whisper واحد في كل الأحوال)
+        self.limiter = limiter
+        # الإيقاف يلغي الرمز فيقطع طلبات الشبكة ويقتل ffmpeg/Whisper فورًا (core.cancellation)
+        self.cancel_token = CancelToken()
+        self.job = None
+        # معرّف المهمة لربط مقاييس الطلبات بها
+        self.job_id = f"{os.path.splitext(os.path.basename(video_path))[0]}_{target_language}_{int(time.time())}"
         logger.info(f"🚀 تم إنشاء PipelineWorker مع الفيديو: {video_path}")
         logger.info(f"🌍 اللغة المستهدفة: {target_language}")
         logger.info(f"🌍 اللغة الأصلية: {source_language}")
+        logger.info(f"🔊 محرك توليد الصوت: {self.tts_backend}")
+        if transcript_path:
+            logger.info(f"📄 النص الجاهز: {transcript_path}")
 
     def stop(self):
-        """إيقاف آمن للخيط."""
+        """إيقاف الخيط: إلغاء الرمز يوقف المراحل الجارية فورًا ويحرر أماكنها في حدود الموارد."""
         logger.info("🛑 طلب إيقاف المعالجة...")
-        self._should_stop = True
-        if hasattr(self, 'whisper_proc') and self.whisper_proc and self.whisper_proc.poll() is None:
-            try:
-                logger.info("🛑 إيقاف عملية Whisper...")
-                self.whisper_proc.terminate()
-                self.whisper_proc.wait(timeout=5)
-                if self.whisper_proc.poll() is None:
-                    logger.warning("🛑 إجبار إغلاق عملية Whisper...")
-                    self.whisper_proc.kill()
-            except Exception as e:
-                logger.error(f"❌ خطأ في إيقاف عملية Whisper: {e}")
-
-    def cleanup(self):
-        """تنظيف الموارد."""
-        try:
-            if hasattr(self, 'whisper_proc') and self.whisper_proc:
-                if self.whisper_proc.poll() is None:
-                    logger.info("🧹 تنظيف عملية Whisper...")
-                    self.whisper_proc.terminate()
-                    self.whisper_proc.wait(timeout=3)
-        except Exception as e:
-            logger.error(f"❌ خطأ في التنظيف: {e}")
+        self.cancel_token.cancel()
 
     def run(self):
-        """تشغيل خط المعالجة مع تسجيل مفصل."""
+        """تشغيل خط المعالجة ضمن نطاق مقاييس المهمة ثم تسجيل ملخصها."""
+        with job_scope(self.job_id):
+            self.run_pipeline()
+        logger.info(f"📊 مقاييس الترجمة للمهمة {self.job_id}: {format_job_summary(metrics_registry.job_summary(self.job_id, stage='translation'))}")
+
+    def on_engine_event(self, event):
+        """تحويل أحداث مراحل المحرك إلى إشارات الواجهة (يُستدعى من خيوط المراحل)."""
+        stage, kind = event.get("stage"), event["event"]
+        start, end, label = STAGE_PROGRESS.get(stage, (None, None, None))
+        if kind == "job_waiting":
+            logger.info(f"⏳ انتظار ذاكرة كافية (المهمة تحتاج ~{format_bytes(event['estimate'])})...")
+            self.progress.emit(0, 0, "Waiting for memory...")
+        elif kind == "stage_started":
+            logger.info(f"▶️ بدء المرحلة: {stage} (انتظار {event.get('queue_wait', 0):.2f}s)")
+            if label:
+                self.progress.emit(start, 0, label)
+            if stage == "stt":
+                if not is_whisper_model_downloaded(self.whisper_model):
+                    logger.info(f"📥 تحميل نموذج Whisper ({self.whisper_model})...")
+                    self.model_loading.emit(f"Loading Whisper model ({self.whisper_model})... This may take a while on first use.")
+                else:
+                    self.model_loading.emit("")
+        elif kind == "stage_progress" and stage == "stt":
+            duration = self.job.duration if self.job else None
+            est_total = max(duration * 0.7, 30) if duration else 60
+            elapsed = event["elapsed"]
+            percent = start + (end - start) * min(elapsed / est_total, 1)
+            self.progress.emit(int(percent), max(est_total - elapsed, 0) / 60, label)
+        elif kind == "stage_finished":
+            if event.get("cached"):
+                logger.info(f"♻️ المرحلة {stage} مستعادة من نقطة الحفظ")
+            else:
+                logger.info(f"✅ انتهت المرحلة: {stage} في {event['seconds']:.2f} ثانية")
+            if label:
+                self.progress.emit(end, 0, label)
+            if stage == "probe" and self.job.duration:
+                logger.info(f"⏱️ مدة الفيديو: {self.job.duration:.2f} ثانية")
+                self.video_duration_ready.emit(self.job.duration)
+            elif stage in ("stt", "transcript"):
+                logger.info(f"📝 النص المستخرج ({len(self.job.transcript)} حرف): {self.job.transcript[:100]}...")
+                self.language_detected.emit(self.job.detected_language)
+                self.model_loading.emit("")
+                self.transcript_ready.emit(self.job.transcript)
+            elif stage in ("translate", "translate_tts"):
+                logger.info(f"🌐 النص المترجم ({len(self.job.translation)} حرف): {self.job.translation[:100]}...")
+        elif kind == "stage_failed":
+            logger.error(f"❌ فشلت المرحلة {stage}: {event['error']}")
+
+    def run_pipeline(self):
+        """تشغيل خط المعالجة عبر محرك المراحل مع تسجيل مفصل."""
+        # استيراد فوري إذا سبق التسخين (core.warmup)، وإلا يُدفع ثمنه هنا مرة واحدة
+        from core.audio_handler import ensure_directories
+        from core.pipeline import DubbingJob, run_job, DEFAULT_WORK_ROOT
         try:
             logger.info("🚀 بدء خط المعالجة...")
             
             # التأكد من وجود المجلدات المطلوبة
             logger.info("📁 إنشاء المجلدات المطلوبة...")
             ensure_directories()
-            
-            audio_path = "temp/audio.wav"
-            arabic_audio = "temp/audio_ar.mp3"
-            base, ext = os.path.splitext(os.path.basename(self.video_path))
-            # احصل على اسم اللغة المستهدفة الكامل
-            target_language_full = self.target_language
-            if hasattr(self, 'supported_languages'):
-                target_language_full = self.supported_languages.get(self.target_language, self.target_language)
-            else:
-                # نسخة احتياطية: جلب الأسماء من نفس القاموس المستخدم في DubberApp
-                target_language_map = {
-                    "ar": "Arabic", "en": "English", "fr": "French", "es": "Spanish", "de": "German", "it": "Italian", "pt": "Portuguese", "ru": "Russian", "zh": "Chinese", "ja": "Japanese", "ko": "Korean", "hi": "Hindi", "tr": "Turkish", "nl": "Dutch", "pl": "Polish", "sv": "Swedish", "da": "Danish", "no": "Norwegian", "fi": "Finnish", "he": "Hebrew", "fa": "Persian", "ur": "Urdu", "bn": "Bengali", "th": "Thai", "vi": "Vietnamese", "id": "Indonesian", "ms": "Malay"
-                }
-                target_language_full = target_language_map.get(self.target_language, self.target_language)
-            # اسم الفيديو النهائي
-            final_video = os.path.join("output", f"{base}_{target_language_full}{ext}")
-
-            logger.info(f"📂 مسارات الملفات:")
-            logger.info(f"   الفيديو: {self.video_path}")
-            logger.info(f"   الصوت: {audio_path}")
-            logger.info(f"   الصوت العربي: {arabic_audio}")
-            logger.info(f"   الفيديو النهائي: {final_video}")
 
             # التحقق من وجود الفيديو
             if not os.path.exists(self.video_path):
@@ -166,259 +239,45 @@ class DebugPipelineWorker(QThread):
                 self.error.emit(error_msg)
                 return
 
-            # استخراج مدة الفيديو
-            logger.info("⏱️ استخراج مدة الفيديو...")
-            duration = self.get_video_duration(self.video_path)
-            if duration:
-                logger.info(f"⏱️ مدة الفيديو: {duration:.2f} ثانية")
-                self.video_duration_ready.emit(duration)
-            else:
-                logger.warning("⚠️ لم يتم تحديد مدة الفيديو")
-
-            # 1. استخراج الصوت
-            logger.info("🎤 استخراج الصوت من الفيديو...")
-            self.progress.emit(10, 0, "استخراج الصوت")
-            
-            if not extract_audio(self.video_path, audio_path):
-                error_msg = "❌ فشل في استخراج الصوت من الفيديو"
-                logger.error(error_msg)
-                self.error.emit(error_msg)
-                return
-
-            # التحقق من وجود ملف الصوت
-            if not os.path.exists(audio_path):
-                error_msg = f"❌ ملف الصوت غير موجود بعد الاستخراج: {audio_path}"
-                logger.error(error_msg)
-                self.error.emit(error_msg)
-                return
-
-            logger.info(f"✅ تم استخراج الصوت بنجاح: {audio_path}")
-            self.progress.emit(20, 0, "استخراج الصوت")
-
-            if self._should_stop:
-                logger.info("🛑 تم إيقاف المعالجة بعد استخراج الصوت")
-                self.stopped.emit()
-                return
-
-            # 2. تحويل الصوت إلى نص (Whisper) مع اكتشاف اللغة
-            logger.info("🎤 بدء تحويل الصوت إلى نص مع اكتشاف اللغة...")
-            self.progress.emit(30, 0, "تحويل الصوت إلى نص")
-            
-            if not is_whisper_model_downloaded(self.whisper_model):
-                logger.info(f"📥 تحميل نموذج Whisper ({self.whisper_model})...")
-                self.model_loading.emit(f"Loading Whisper model ({self.whisper_model})... This may take a while on first use.")
-            else:
-                logger.info(f"✅ نموذج Whisper ({self.whisper_model}) متاح")
-                self.model_loading.emit("")
-
-            whisper_txt = os.path.join("temp", "audio.txt")
-            if os.path.exists(whisper_txt):
-                os.remove(whisper_txt)
-                logger.info("🗑️ حذف ملف النص القديم")
-
-            try:
-                # استخدام مسار مطلق لملف الصوت
-                audio_path_abs = os.path.abspath(audio_path)
-                logger.info(f"🎤 بدء تشغيل Whisper مع اكتشاف اللغة: {audio_path_abs}")
-                
-                whisper_cmd = [
-                    sys.executable, "-m", "whisper", 
-                    audio_path_abs, 
-                    "--model", self.whisper_model, 
-                    "--output_format", "txt", 
-                    "--output_dir", "temp"
-                ]
-                logger.info(f"🔧 أمر Whisper: {' '.join(whisper_cmd)}")
-                
-                self.whisper_proc = subprocess.Popen(
-                    whisper_cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True
-                )
-                
-                whisper_start = time.time()
-                while self.whisper_proc.poll() is None:
-                    if self._should_stop:
-                        logger.info("🛑 إيقاف عملية Whisper...")
-                        self.whisper_proc.terminate()
-                        self.stopped.emit()
-                        return
-                    
-                    elapsed = time.time() - whisper_start
-                    est_total = max(duration * 0.7, 30) if duration else 60
-                    percent = 30 + 40 * min(elapsed / est_total, 1)
-                    eta = max(est_total - elapsed, 0)
-                    self.progress.emit(int(percent), eta / 60, "تحويل الصوت إلى نص")
-                    time.sleep(1)
-                
-                if self._should_stop:
-                    logger.info("🛑 تم إيقاف المعالجة أثناء Whisper")
-                    self.stopped.emit()
-                    return
-                    
-                # التحقق من نجاح العملية
-                if self.whisper_proc.returncode != 0:
-                    stdout, stderr = self.whisper_proc.communicate()
-                    error_msg = f"❌ فشل في تحويل الصوت إلى نص. رمز الخطأ: {self.whisper_proc.returncode}"
-                    logger.error(error_msg)
-                    logger.error(f"stdout: {stdout}")
-                    logger.error(f"stderr: {stderr}")
-                    self.error.emit(error_msg)
-                    return
-                    
-                logger.info("✅ تم تشغيل Whisper بنجاح")
-                    
-            except Exception as e:
-                error_msg = f"❌ خطأ أثناء تشغيل Whisper: {e}"
-                logger.error(error_msg)
-                logger.error(traceback.format_exc())
-                self.error.emit(error_msg)
-                return
-            finally:
-                # تنظيف العملية
-                if self.whisper_proc:
-                    try:
-                        if self.whisper_proc.poll() is None:
-                            self.whisper_proc.terminate()
-                    except:
-                        pass
-                    self.whisper_proc = None
-                
-            self.progress.emit(70, 0, "تحويل الصوت إلى نص")
-            
-            if not os.path.exists(whisper_txt):
-                error_msg = f"❌ ملف النص غير موجود بعد تنفيذ Whisper: {whisper_txt}"
-                logger.error(error_msg)
-                self.error.emit(error_msg)
-                return
-
-            # قراءة النص المستخرج واستخدام اللغة المختارة
-            with open(whisper_txt, "r", encoding="utf-8") as f:
-                transcript = f.read()
-            detected_language = self.source_language if self.source_language else "unknown"
-            self.language_detected.emit(detected_language)
-            
-            logger.info(f"📝 النص المستخرج ({len(transcript)} حرف): {transcript[:100]}...")
-            self.model_loading.emit("")
-            self.transcript_ready.emit(transcript)
-
-            # 3. الترجمة من اللغة المختارة إلى اللغة المستهدفة
-            logger.info("🌐 بدء الترجمة...")
-            self.progress.emit(75, 0, "الترجمة")
-            
-            try:
-                # استخدام الترجمة العامة مع اللغة المكتشفة واللغة المستهدفة
-                translation = translate_text_general(transcript, detected_language, self.target_language)
-                logger.info(f"🌐 النص المترجم ({len(translation)} حرف): {translation[:100]}...")
-            except Exception as e:
-                error_msg = f"❌ فشل في الترجمة: {e}"
-                logger.error(error_msg)
-                logger.error(traceback.format_exc())
-                self.error.emit(error_msg)
-                return
-                
-            self.progress.emit(80, 0, "الترجمة")
-            
-            if self._should_stop:
-                logger.info("🛑 تم إيقاف المعالجة بعد الترجمة")
-                self.stopped.emit()
-                return
-
-            # 4. توليد الصوت للغة المستهدفة
-            logger.info("🔊 بدء توليد الصوت...")
-            self.progress.emit(85, 0, "توليد الصوت")
-            
-            try:
-                tts_start = time.time()
-                # استخدام توليد الصوت الجديد مع اللغة المستهدفة
-                success, audio_duration = asyncio.run(generate_audio_for_language(
-                    translation, 
-                    self.target_language, 
-                    f"temp/audio_{self.target_language}.mp3", 
-                    target_duration=duration,
-                    voice_name=self.voice_name  # <--- استخدم المتغير الجديد
-                ))
-                tts_elapsed = time.time() - tts_start
-                
-                if not success:
-                    error_msg = "❌ فشل في توليد الصوت"
-                    logger.error(error_msg)
-                    self.error.emit(error_msg)
-                    return
-                    
-                logger.info(f"🔊 تم توليد الصوت بنجاح في {tts_elapsed:.2f} ثانية")
-                if audio_duration:
-                    logger.info(f"⏱️ مدة الصوت: {audio_duration:.2f} ثانية")
-                    
-            except Exception as e:
-                error_msg = f"❌ فشل في توليد الصوت: {e}"
-                logger.error(error_msg)
-                logger.error(traceback.format_exc())
-                self.error.emit(error_msg)
-                return
-                
-            self.progress.emit(90, 0, "توليد الصوت")
-            
-            if self._should_stop:
-                logger.info("🛑 تم إيقاف المعالجة بعد توليد الصوت")
-                self.stopped.emit()
+            self.job = DubbingJob(
+                self.video_path, self.target_language, output_dir="output",
+                source_language=self.source_language, voice_name=self.voice_name,
+                whisper_model=self.whisper_model, transcript_path=self.transcript_path,
+                check_alignment=self.check_alignment, tts_backend=self.tts_backend,
+                stream_translation=self.stream_translation, job_id=self.job_id,
+            )
+            logger.info(f"📂 الفيديو النهائي: {self.job.final_path}")
+            run_job(self.job, self.limiter, on_event=self.on_engine_event, should_stop=self.cancel_token,
+                    trace_dir=DEFAULT_TRACE_DIR)
+            if self.job.trace:
+                # أين ذهب الوقت: أكبر المراحل والخطوات زمنًا (التفاصيل في ملف التتبع)
+                for cat, name, count, seconds in self.job.trace.summary(5):
+                    logger.info(f"⏱️ {cat}/{name}: {seconds:.2f}s ({count}×)")
+                logger.info(f"🧭 ملف التتبع الزمني (ui.perfetto.dev): {self.job.trace_path}")
+            if self.job.memory.get("peak"):
+                logger.info(f"🧠 ذروة الذاكرة: {format_bytes(self.job.memory['peak'])} "
+                            f"(التقدير {format_bytes(self.job.memory['estimate'])})")
+
+            if self.job.status == "stopped" or self.cancel_token.cancelled:
+                logger.info(f"🛑 تم إيقاف المعالجة في مرحلة: {self.job.stage}")
                 return
-
-            # 5. تمديد مدة الفيديو إذا لزم الأمر
-            extended_video_path = None
-            if audio_duration and duration and audio_duration > duration:
-                logger.info("⏱️ تمديد مدة الفيديو...")
-                self.progress.emit(92, 0, "تمديد مدة الفيديو")
-                extended_video_path = os.path.join("temp", f"extended_{os.path.basename(self.video_path)}")
-                if not extend_video_duration(self.video_path, audio_duration, extended_video_path):
-                    error_msg = "❌ فشل في تمديد مدة الفيديو"
-                    logger.error(error_msg)
-                    self.error.emit(error_msg)
-                    return
-                video_to_merge = extended_video_path
-                logger.info("✅ تم تمديد مدة الفيديو بنجاح")
-            else:
-                video_to_merge = self.video_path
-                logger.info("✅ لا حاجة لتمديد مدة الفيديو")
-
-            # 6. دمج الصوت مع الفيديو
-            logger.info("🎬 بدء دمج الصوت مع الفيديو...")
-            self.progress.emit(95, 0, "دمج الصوت مع الفيديو")
-            
-            # استخدام مسار الصوت المناسب للغة المستهدفة
-            audio_file_path = f"temp/audio_{self.target_language}.mp3"
-            
-            if not merge_audio_with_video(video_to_merge, audio_file_path, final_video):
-                error_msg = "❌ فشل في دمج الصوت مع الفيديو"
+            if self.job.status != "done":
+                error_msg = (f"❌ فشلت المعالجة في مرحلة {self.job.stage}: {self.job.error}\n"
+                             "إعادة التشغيل بنفس الفيديو تكمل من هذه المرحلة.")
                 logger.error(error_msg)
                 self.error.emit(error_msg)
                 return
-                
-            logger.info(f"✅ تم دمج الصوت مع الفيديو بنجاح: {final_video}")
-            self.progress.emit(100, 0, "دمج الصوت مع الفيديو")
-            
-            if self._should_stop:
-                logger.info("🛑 تم إيقاف المعالجة قبل الانتهاء")
-                self.stopped.emit()
-                return
-
-            # حذف الفيديو الممتد المؤقت إذا تم إنشاؤه
-            if extended_video_path and os.path.exists(extended_video_path):
-                try:
-                    os.remove(extended_video_path)
-                    logger.info("🗑️ حذف الفيديو الممتد المؤقت")
-                except Exception as e:
-                    logger.warning(f"⚠️ فشل في حذف الفيديو الممتد المؤقت: {e}")
 
+            final_video = self.job.output_path
             self.final_video_path.emit(final_video)
             
             total_time = time.time() - self.start_time if hasattr(self, 'start_time') else 0
             success_msg = (
                 "✅ تمت الدبلجة بنجاح!\n\n"
-                f"عدد كلمات النص المستخرج: {len(transcript.split())}\n"
-                f"مدة الفيديو: {(duration/60):.2f} min\n"
-                f"زمن التنفيذ: {total_time:.2f} min\n\n"
+                f"عدد كلمات النص المستخرج: {len(self.job.transcript.split())}\n"
+                f"مدة الفيديو: {((self.job.duration or 0)/60):.2f} min\n"
+                f"زمن التنفيذ: {total_time / 60:.2f} min\n"
+                f"التتبع الزمني: {self.job.trace_path}\n\n"
                 f"تم حفظ الفيديو في: {final_video}"
             )
             
@@ -433,13 +292,15 @@ class DebugPipelineWorker(QThread):
         finally:
             # تنظيف نهائي
             logger.info("🧹 تنظيف نهائي...")
-            self.cleanup()
-            # حذف جميع محتويات مجلد temp بعد الانتهاء
+            # حذف محتويات مجلد temp بعد الانتهاء، عدا مجلد المهام: نقاط حفظ المهام غير المكتملة
+            # تبقى فيه للاستئناف (والمهام الناجحة يحذفها المحرك بنفسه)
             try:
                 temp_dir = os.path.join(os.getcwd(), "temp")
                 if os.path.exists(temp_dir):
                     for filename in os.listdir(temp_dir):
                         file_path = os.path.join(temp_dir, filename)
+                        if os.path.abspath(file_path) == os.path.abspath(DEFAULT_WORK_ROOT):
+                            continue
                         if os.path.isfile(file_path) or os.path.islink(file_path):
                             os.unlink(file_path)
                         elif os.path.isdir(file_path):
@@ -448,34 +309,9 @@ class DebugPipelineWorker(QThread):
             except Exception as e:
                 logger.warning(f"⚠️ فشل في حذف ملفات temp: {e}")
             self.finished.emit()
-            if self._should_stop:
+            if self.cancel_token.cancelled:
                 self.stopped.emit()
 
-    def get_video_duration(self, video_path):
-        try:
-            ffmpeg_path = ensure_ffmpeg_available() or "ffmpeg"
-            ffprobe_path = ffmpeg_path.replace("ffmpeg.exe", "ffprobe.exe") if ffmpeg_path.endswith("ffmpeg.exe") else "ffprobe"
-            
-            logger.info(f"🔧 استخدام ffprobe: {ffprobe_path}")
-            
-            result = subprocess.run([
-                ffprobe_path, 
-                "-v", "error", "-show_entries",
-                "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", 
-                video_path
-            ], capture_output=True, text=True)
-            
-            if result.returncode == 0:
-                duration = float(result.stdout.strip())
-                logger.info(f"⏱️ مدة الفيديو: {duration:.2f} ثانية")
-                return duration
-            else:
-                logger.error(f"❌ فشل في تحديد مدة الفيديو: {result.stderr}")
-                return None
-        except Exception as e:
-            logger.error(f"❌ خطأ في تحديد مدة الفيديو: {e}")
-            return None
-
 class DubberApp(QWidget):
     """واجهة المستخدم الرئيسية مع تسجيل مفصل للأخطاء."""
     
@@ -498,9 +334,6 @@ class DubberApp(QWidget):
             # إنشاء المجلدات المطلوبة
             self.create_required_directories()
             
-            # فحص وتثبيت ffmpeg عند أول تشغيل
-            self.check_ffmpeg_on_startup()
-            
             self.init_ui()
             self.apply_styles()
             fade_in_widget(self)
@@ -509,6 +342,8 @@ class DubberApp(QWidget):
             self.setAcceptDrops(True)
             
             self.video_path = None
+            self.worker = None
+            self.transcript_path = None  # نص جاهز اختياري (SRT/VTT/JSON) يغني عن Whisper
             self.final_video_path = None
             self.transcript = ""
             self.start_time = None
@@ -519,6 +354,9 @@ class DubberApp(QWidget):
             self.progress_bar.setRange(0, 100)
             self.progress_bar.setValue(0)
             self.progress_bar.setTextVisible(True)
+
+            # فحص ffmpeg واستيراد المحرك وبقية التجهيز في الخلفية بعد ظهور النافذة
+            self.start_warmup()
             
             logger.info("✅ تم إنشاء واجهة المستخدم بنجاح")
             
@@ -548,32 +386,38 @@ class DubberApp(QWidget):
         except Exception as e:
             logger.error(f"❌ خطأ في إنشاء المجلدات: {e}")
 
-    def check_ffmpeg_on_startup(self):
-        """فحص وتثبيت ffmpeg عند بداية تشغيل التطبيق."""
+    def start_warmup(self):
+        """بدء التسخين في الخلفية (ffmpeg وWhisper والمحرك) مع عرض حالته أسفل العنوان."""
         try:
-            logger.info("🔧 فحص ffmpeg عند بداية التشغيل...")
-            ffmpeg_path = ensure_ffmpeg_available()
-            if ffmpeg_path:
-                logger.info(f"✅ ffmpeg متاح في: {ffmpeg_path}")
-            else:
-                logger.warning("⚠️ تحذير: ffmpeg غير متاح، قد تواجه مشاكل في معالجة الفيديو")
+            self.warmup_worker = WarmupWorker()
+            self.warmup_worker.status.connect(self.warmup_label.setText)
+            self.warmup_worker.start()
         except Exception as e:
-            logger.error(f"❌ خطأ في فحص ffmpeg: {e}")
+            logger.error(f"❌ خطأ في بدء التسخين: {e}")
 
     def dragEnterEvent(self, event: QDragEnterEvent):
         if event.mimeData().hasUrls():
             urls = event.mimeData().urls()
-            if urls and urls[0].toLocalFile().lower().endswith((".mp4", ".mov", ".avi", ".mkv", ".wmv", ".flv", ".webm")):
+            if any(url.toLocalFile().lower().endswith(VIDEO_EXTENSIONS + TRANSCRIPT_EXTENSIONS) for url in urls):
                 event.acceptProposedAction()
 
     def dropEvent(self, event: QDropEvent):
-        urls = event.mimeData().urls()
-        if urls:
-            file_path = urls[0].toLocalFile()
+        paths = [url.toLocalFile() for url in event.mimeData().urls()]
+        videos = [path for path in paths if path.lower().endswith(VIDEO_EXTENSIONS)]
+        # عدة فيديوهات (أو أي فيديو بعد بدء استخدام القائمة) تُضاف إلى قائمة الانتظار
+        if len(videos) > 1 or (videos and self.queue_panel.items):
+            self.add_to_queue(videos)
+            return
+        if paths:
+            file_path = videos[0] if videos else paths[0]
+            if file_path.lower().endswith(TRANSCRIPT_EXTENSIONS):
+                self.set_transcript_path(file_path)
+                return
             self.video_path = file_path
             self.label.setText(f"✅ Video selected: {os.path.basename(file_path)} (via drag & drop)")
             self.process_btn.setEnabled(True)
             logger.info(f"📁 تم اختيار الفيديو عبر السحب والإفلات: {file_path}")
+            self.set_transcript_path(find_sidecar_transcript(file_path))
 
     def init_ui(self):
         """تهيئة عناصر الواجهة الرسومية."""
@@ -587,6 +431,11 @@ class DubberApp(QWidget):
             self.label.setAlignment(Qt.AlignmentFlag.AlignCenter)
             self.label.setObjectName("headerLabel")
 
+            # حالة التسخين في الخلفية (core.warmup)
+            self.warmup_label = QLabel("⏳ Warming up...")
+            self.warmup_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            self.warmup_label.setObjectName("warmupLabel")
+
             # Language display section
             self.language_layout = QHBoxLayout()
             self.language_layout.setSpacing(20)
@@ -697,10 +546,16 @@ class DubberApp(QWidget):
             # Modern buttons with unique IDs
             self.choose_btn = QPushButton("📁 Select Video")
             self.choose_btn.setObjectName("chooseBtn")
+            self.transcript_btn = QPushButton("📄 Subtitles (optional)")
+            self.transcript_btn.setObjectName("transcriptBtn")
+            self.transcript_btn.setToolTip("Use an existing SRT/VTT/JSON transcript instead of running Whisper")
             self.process_btn = QPushButton("🚀 Start Dubbing")
             self.process_btn.setObjectName("processBtn")
             self.stop_btn = QPushButton("⏹️ Stop Processing")
             self.stop_btn.setObjectName("stopBtn")
+            self.queue_btn = QPushButton("📋 Add to Queue")
+            self.queue_btn.setObjectName("queueBtn")
+            self.queue_btn.setToolTip("Add several videos and dub them in parallel (you can also drop many videos on the window)")
             self.preview_btn = QPushButton("🎥 Open Video")
             self.preview_btn.setObjectName("previewBtn")
             self.preview_btn.setVisible(False)
@@ -709,7 +564,7 @@ class DubberApp(QWidget):
             self.stop_btn.setEnabled(False)
 
             # إضافة تأثير ظل للأزرار
-            for btn in [self.choose_btn, self.process_btn, self.stop_btn, self.preview_btn]:
+            for btn in [self.choose_btn, self.transcript_btn, self.queue_btn, self.process_btn, self.stop_btn, self.preview_btn]:
                 shadow = QGraphicsDropShadowEffect(self)
                 shadow.setBlurRadius(20)
                 shadow.setXOffset(0)
@@ -718,16 +573,26 @@ class DubberApp(QWidget):
                 btn.setGraphicsEffect(shadow)
 
             self.choose_btn.clicked.connect(self.choose_video)
+            self.transcript_btn.clicked.connect(self.choose_transcript)
             self.process_btn.clicked.connect(self.start_processing)
             self.stop_btn.clicked.connect(self.stop_processing)
+            self.queue_btn.clicked.connect(self.choose_queue_videos)
+
+            # قائمة انتظار الفيديوهات (تظهر عند إضافة أول فيديو إليها)
+            self.queue_panel = JobQueuePanel(self.queue_job_options, self)
+            self.queue_panel.setVisible(False)
 
             # Layout
             layout.addWidget(self.label)
+            layout.addWidget(self.warmup_label)
             layout.addLayout(self.language_layout)
             layout.addWidget(self.text_area)
             layout.addWidget(self.progress_bar)
+            layout.addWidget(self.queue_panel)
             button_layout = QHBoxLayout()
             button_layout.addWidget(self.choose_btn)
+            button_layout.addWidget(self.transcript_btn)
+            button_layout.addWidget(self.queue_btn)
             button_layout.addWidget(self.process_btn)
             button_layout.addWidget(self.stop_btn)
             button_layout.addWidget(self.preview_btn)
@@ -746,7 +611,7 @@ class DubberApp(QWidget):
         """
         try:
             lang_code = self.target_language_combo.currentData()
-            voices = get_voices_for_language(lang_code)
+            voices = get_voice_catalog().voices_for(lang_code)
             self.voice_combo.clear()
             for v in voices:
                 self.voice_combo.addItem(f"{v['display']} [{v['gender']}]", v['name'])
@@ -770,11 +635,67 @@ class DubberApp(QWidget):
                 self.label.setText(f"✅ Video selected: {os.path.basename(file_path)}")
                 self.process_btn.setEnabled(True)
                 # لا تكتشف اللغة تلقائياً بعد الآن
+                # ملف ترجمة بجانب الفيديو بنفس الاسم يُستخدم تلقائيًا بدل Whisper
+                self.set_transcript_path(find_sidecar_transcript(file_path))
             else:
                 logger.info("❌ لم يتم اختيار أي ملف")
         except Exception as e:
             logger.error(f"❌ خطأ في اختيار الفيديو: {e}")
 
+    def choose_queue_videos(self):
+        """اختيار عدة فيديوهات وإضافتها إلى قائمة الانتظار."""
+        try:
+            file_paths, _ = QFileDialog.getOpenFileNames(
+                self,
+                "Add Videos to Queue",
+                "",
+                "Video Files (*.mp4 *.mov *.avi *.mkv *.wmv *.flv *.webm);;All Files (*)"
+            )
+            if file_paths:
+                self.add_to_queue(file_paths)
+        except Exception as e:
+            logger.error(f"❌ خطأ في اختيار فيديوهات القائمة: {e}")
+
+    def add_to_queue(self, video_paths):
+        """إضافة فيديوهات إلى القائمة باللغة المستهدفة المختارة (تُعدَّل لكل عنصر من عمود اللغات)."""
+        try:
+            self.queue_panel.add_videos(video_paths, [self.target_language_combo.currentData()])
+            self.label.setText(f"📋 {len(self.queue_panel.items)} video(s) in queue")
+        except Exception as e:
+            logger.error(f"❌ خطأ في إضافة الفيديوهات إلى القائمة: {e}")
+
+    def queue_job_options(self, languages):
+        """إعدادات مهام عنصر القائمة من اختيارات الواجهة الحالية."""
+        # الصوت المختار يخص اللغة المستهدفة الحالية فقط؛ بقية اللغات تستخدم صوتها الافتراضي
+        same_language = list(languages) == [self.target_language_combo.currentData()]
+        return {
+            "source_language": self.source_language_combo.currentData(),
+            "voice_name": self.voice_combo.currentData() if same_language else None,
+        }
+
+    def choose_transcript(self):
+        """اختيار ملف نص جاهز (SRT/VTT/JSON) لتخطي استخراج الصوت وWhisper."""
+        try:
+            file_path, _ = QFileDialog.getOpenFileName(
+                self,
+                "Select Transcript File",
+                os.path.dirname(self.video_path) if self.video_path else "",
+                "Transcripts (*.srt *.vtt *.json);;All Files (*)"
+            )
+            if file_path:
+                self.set_transcript_path(file_path)
+        except Exception as e:
+            logger.error(f"❌ خطأ في اختيار ملف النص: {e}")
+
+    def set_transcript_path(self, file_path):
+        """تعيين النص الجاهز (أو إلغاؤه بـ None) وتحديث الزر."""
+        self.transcript_path = file_path
+        if file_path:
+            self.transcript_btn.setText(f"📄 {os.path.basename(file_path)}")
+            logger.info(f"📄 تم اختيار النص الجاهز: {file_path}")
+        else:
+            self.transcript_btn.setText("📄 Subtitles (optional)")
+
     def detect_video_language(self):
         """
         استخراج الصوت من الفيديو واكتشاف اللغة مباشرة من الصوت.
@@ -837,6 +758,10 @@ class DubberApp(QWidget):
             if not self.video_path:
                 logger.warning("⚠️ لم يتم اختيار فيديو")
                 return
+            if not claim_video(self.video_path):
+                logger.warning(f"⚠️ الفيديو قيد المعالجة بالفعل في قائمة الانتظار: {self.video_path}")
+                QMessageBox.warning(self, "Busy", "This video is already being processed in the queue.")
+                return
             logger.info(f"🚀 بدء معالجة الفيديو: {self.video_path}")
             # الحصول على اللغة الأصلية المختارة
             source_language = self.source_language_combo.currentData()
@@ -847,7 +772,8 @@ class DubberApp(QWidget):
             # الحصول على الصوت المختار
             voice_name = self.voice_combo.currentData()
             # إنشاء خيط المعالجة مع تمرير اللغات والصوت
-            self.worker = DebugPipelineWorker(self.video_path, target_language, voice_name=voice_name, source_language=source_language)
+            self.worker = DebugPipelineWorker(self.video_path, target_language, voice_name=voice_name, source_language=source_language,
+                                              transcript_path=self.transcript_path, limiter=self.queue_panel.limiter)
             self.worker.start_time = time.time()
             # ربط الإشارات
             self.worker.success.connect(self.show_success)
@@ -871,6 +797,7 @@ class DubberApp(QWidget):
             self.worker.start()
             logger.info("✅ تم بدء خيط المعالجة")
         except Exception as e:
+            release_video(self.video_path)
             logger.error(f"❌ خطأ في بدء المعالجة: {e}")
             logger.error(traceback.format_exc())
 
@@ -891,6 +818,9 @@ class DubberApp(QWidget):
         """عند انتهاء خيط المعالجة."""
         try:
             logger.info("✅ انتهى خيط المعالجة")
+            release_video(self.worker.video_path)
+            # عناصر القائمة المنتظرة لنفس الفيديو يمكنها البدء الآن
+            self.queue_panel.schedule()
             self.process_btn.setEnabled(True)
             self.stop_btn.setEnabled(False)
             self.progress_bar.setVisible(False)
@@ -995,6 +925,7 @@ class DubberApp(QWidget):
     def set_detected_language(self, language_code):
         """تعيين اللغة المكتشفة من الفيديو."""
         try:
+            from core.translator import get_language_name
             self.detected_language = language_code
             language_name = get_language_name(language_code)
             self.source_language_label.setText(f"🌍 لغة الفيديو: {language_name}")
@@ -1017,6 +948,9 @@ class DubberApp(QWidget):
             if hasattr(self, 'worker') and self.worker:
                 self.worker.stop()
                 self.worker.wait(5000)  # انتظار 5 ثوانٍ
+            self.queue_panel.stop_all()
+            if hasattr(self, 'warmup_worker') and self.warmup_worker.isRunning():
+                self.warmup_worker.wait(2000)
             event.accept()
         except Exception as e:
             logger.error(f"❌ خطأ في إغلاق التطبيق: {e}")
@@ -1043,6 +977,10 @@ class DubberApp(QWidget):
                 border-radius: 10px;
                 margin: 10px;
             }
+            QLabel#warmupLabel {
+                font-size: 12px;
+                color: rgba(255, 255, 255, 0.8);
+            }
             QTextEdit#transcriptArea {
                 background: rgba(255, 255, 255, 0.9);
                 border: 2px solid rgba(255, 255, 255, 0.3);
@@ -0,0 +1,374 @@
+"""
+لوحة قائمة انتظار الفيديوهات: إضافة عدة فيديوهات (اختيار أو سحب وإفلات) مع لغات مستهدفة لكل عنصر،
+وتشغيلها بعدد مهام متزامنة قابل للتعديل. كل عنصر يعمل في خيط خاص عبر core.pipeline.run_jobs،
+وكل العناصر تتشارك نفس حدود الموارد (StageLimiter) فيبقى Whisper واحدًا بينما تترجم عناصر أخرى.
+"""
+
+import os
+import logging
+from typing import TYPE_CHECKING
+from PyQt6.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QSpinBox, QTableWidget,
+    QTableWidgetItem, QProgressBar, QHeaderView, QAbstractItemView
+)
+from PyQt6.QtCore import Qt, QThread, pyqtSignal
+from core.cancellation import CancelToken
+from core.tracing import DEFAULT_TRACE_DIR
+
+if TYPE_CHECKING:
+    # للتلميحات فقط: المحرك يُستورد عند أول تشغيل لا عند فتح الواجهة
+    from core.pipeline import StageLimiter
+
+logger = logging.getLogger(__name__)
+
+# نطاق شريط التقدم ووصف كل مرحلة من مراحل المحرك (البداية، النهاية، الوصف)
+STAGE_PROGRESS = {
+    "extract": (10, 20, "استخراج الصوت"),
+    "stt": (30, 70, "تحويل الصوت إلى نص"),
+    "transcript": (30, 70, "قراءة النص الجاهز"),
+    "translate": (75, 80, "الترجمة"),
+    "translate_tts": (75, 90, "الترجمة وتوليد الصوت"),
+    "dub_stream": (75, 90, "الترجمة وتوليد الصوت"),
+    "tts": (85, 90, "توليد الصوت"),
+    "extend": (92, 92, "تمديد مدة الفيديو"),
+    "mux": (95, 100, "دمج الصوت مع الفيديو"),
+}
+
+QUEUE_DEFAULT_CONCURRENCY = 2
+QUEUE_MAX_CONCURRENCY = 8
+
+# حالات عناصر القائمة كما تظهر في عمود الحالة
+STATUS_LABELS = {
+    "pending": "⏳ Waiting",
+    "running": "▶️ Running",
+    "done": "✅ Done",
+    "failed": "❌ Failed",
+    "stopped": "🛑 Stopped",
+    "cancelled": "⛔ Cancelled",
+}
+
+# الفيديوهات الجارية الآن من القائمة ومن زر "بدء" الرئيسي معًا: تشغيلان لنفس الفيديو يتشاركان
+# temp/jobs/<job_key> (ونقطة الاستئناف) فيحذف أحدهما ملفات الآخر. تُستدعى من خيط الواجهة فقط.
+RUNNING_VIDEOS = set()
+
+def claim_video(video_path: str) -> bool:
+    """حجز الفيديو للتشغيل؛ يعيد False إن كان يعمل بالفعل."""
+    key = os.path.abspath(video_path)
+    if key in RUNNING_VIDEOS:
+        return False
+    RUNNING_VIDEOS.add(key)
+    return True
+
+def release_video(video_path: str):
+    RUNNING_VIDEOS.discard(os.path.abspath(video_path))
+
+def stt_percent(elapsed: float, duration: float = None) -> float:
+    """تقدير تقدم Whisper من الزمن المنقضي (قرابة 0.7 من مدة الفيديو، ولا يقل عن 30 ثانية)."""
+    start, end, _ = STAGE_PROGRESS["stt"]
+    estimate = max(duration * 0.7, 30) if duration else 60
+    return start + (end - start) * min(elapsed / estimate, 1)
+
+class QueueItem:
+    """فيديو واحد في القائمة مع لغاته المستهدفة وحالته."""
+
+    _next_id = 0
+
+    def __init__(self, video_path: str, languages):
+        QueueItem._next_id += 1
+        self.item_id = QueueItem._next_id
+        self.video_path = video_path
+        self.languages = list(languages)
+        self.status = "pending"
+        self.message = ""
+        self.outputs = []
+        self.cancel_token = CancelToken()
+        self.worker = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("pending", "running")
+
+class QueueWorker(QThread):
+    """خيط عنصر واحد: مهمة لكل لغة مستهدفة للفيديو في رسم مراحل واحد."""
+    progress = pyqtSignal(int, int, str)
+
+    def __init__(self, item: QueueItem, limiter: "StageLimiter", options: dict):
+        super().__init__()
+        self.item = item
+        self.limiter = limiter
+        self.options = options
+        self.jobs = []
+        self._percents = {}
+
+    def on_event(self, event):
+        """تقدم العنصر = متوسط تقدم لغاته؛ أحداث المراحل المشتركة تنطبق على كل اللغات."""
+        stage, kind = event.get("stage"), event["event"]
+        if kind == "job_waiting":
+            # لا تتسع ذاكرته في الميزانية بعد (core.memory): يبدأ عند انتهاء عنصر آخر
+            self.progress.emit(self.item.item_id, 0, "⏳ Waiting for memory")
+            return
+        if stage not in STAGE_PROGRESS:
+            return
+        start, end, label = STAGE_PROGRESS[stage]
+        if kind == "stage_started":
+            percent = start
+        elif kind == "stage_finished":
+            percent = end
+        elif kind == "stage_progress" and stage == "stt":
+            percent = stt_percent(event["elapsed"], self.jobs[0].duration if self.jobs else None)
+        else:
+            return
+        languages = [job.target_language for job in self.jobs if job.job_id == event.get("job")] or list(self._percents)
+        for language in languages:
+            self._percents[language] = max(self._percents.get(language, 0), percent)
+        self.progress.emit(self.item.item_id, int(sum(self._percents.values()) / max(len(self._percents), 1)), label)
+
+    def run(self):
+        # المحرك يُستورد عند أول تشغيل (أو مسبقًا أثناء التسخين، core.warmup) لا عند فتح الواجهة
+        from core.pipeline import make_jobs, run_jobs
+        item = self.item
+        try:
+            # ملف ترجمة بجانب الفيديو بنفس الاسم يُستخدم تلقائيًا بدل Whisper
+            self.jobs = make_jobs(item.video_path, item.languages, **self.options)
+            self._percents = {job.target_language: 0 for job in self.jobs}
+            run_jobs(self.jobs, self.limiter, self.on_event, item.cancel_token, trace_dir=DEFAULT_TRACE_DIR)
+            statuses = [job.status for job in self.jobs]
+            if all(status == "done" for status in statuses):
+                item.status = "done"
+            elif "failed" in statuses:
+                item.status = "failed"
+            else:
+                item.status = "stopped"
+            item.outputs = [job.output_path for job in self.jobs if job.output_path]
+            item.message = "\n".join(f"{job.target_language}: {job.error}" for job in self.jobs if job.error)
+        except Exception as e:
+            logger.error(f"❌ خطأ في عنصر القائمة {item.video_path}: {e}")
+            item.status, item.message = "failed", str(e)
+
+class JobQueuePanel(QWidget):
+    """جدول عناصر القائمة مع شريط تقدم وزر إلغاء لكل عنصر، وعدد المهام المتزامنة."""
+    COLUMNS = ("Video", "Languages", "Status", "Progress", "")
+
+    def __init__(self, options_provider, parent=None):
+        """options_provider(languages) يعيد إعدادات المهام (اللغة الأصلية، الصوت...) من الواجهة الرئيسية."""
+        super().__init__(parent)
+        self.options_provider = options_provider
+        self.items = []
+        self._limiter = None
+        self.running = False
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        controls = QHBoxLayout()
+        self.title = QLabel("📋 Queue")
+        self.concurrency_spin = QSpinBox()
+        self.concurrency_spin.setRange(1, QUEUE_MAX_CONCURRENCY)
+        self.concurrency_spin.setValue(QUEUE_DEFAULT_CONCURRENCY)
+        self.concurrency_spin.setPrefix("Parallel jobs: ")
+        self.concurrency_spin.setToolTip("How many videos are processed at the same time")
+        self.concurrency_spin.valueChanged.connect(lambda _: self.schedule())
+        self.start_btn = QPushButton("▶️ Run Queue")
+        self.start_btn.setObjectName("queueStartBtn")
+        self.start_btn.clicked.connect(self.start)
+        self.clear_btn = QPushButton("🧹 Clear Finished")
+        self.clear_btn.setObjectName("queueClearBtn")
+        self.clear_btn.clicked.connect(self.clear_finished)
+        controls.addWidget(self.title)
+        controls.addStretch()
+        controls.addWidget(self.concurrency_spin)
+        controls.addWidget(self.start_btn)
+        controls.addWidget(self.clear_btn)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setObjectName("queueTable")
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        for column in range(1, len(self.COLUMNS)):
+            header.setSectionResizeMode(column, QHeaderView.ResizeMode.ResizeToContents)
+        self.table.itemChanged.connect(self.on_item_changed)
+
+        layout.addLayout(controls)
+        layout.addWidget(self.table)
+        self.setLayout(layout)
+
+    # ---- إدارة العناصر ----
+
+    def add_videos(self, paths, languages):
+        """إضافة فيديوهات إلى القائمة؛ الفيديو الموجود ولم ينتهِ تُضاف لغاته إليه بدل تكراره."""
+        added = 0
+        for path in paths:
+            existing = next((item for item in self.items
+                             if item.status == "pending" and os.path.abspath(item.video_path) == os.path.abspath(path)), None)
+            if existing:
+                existing.languages = list(dict.fromkeys(existing.languages + list(languages)))
+                self.refresh_row(existing)
+                continue
+            item = QueueItem(path, languages)
+            self.items.append(item)
+            self.insert_row(item)
+            added += 1
+        logger.info(f"📋 تمت إضافة {added} فيديو إلى القائمة ({len(self.items)} عنصر)")
+        self.setVisible(True)
+        if self.running:
+            self.schedule()
+
+    @property
+    def limiter(self):
+        """حدود الموارد المشتركة (تُنشأ عند أول مهمة حتى لا يُستورد المحرك عند بدء الواجهة)."""
+        if self._limiter is None:
+            from core.pipeline import StageLimiter
+            self._limiter = StageLimiter()
+        return self._limiter
+
+    def row_of(self, item_id: int) -> int:
+        return next(i for i, item in enumerate(self.items) if item.item_id == item_id)
+
+    def item_of(self, item_id: int) -> QueueItem:
+        return self.items[self.row_of(item_id)]
+
+    def insert_row(self, item: QueueItem):
+        row = self.table.rowCount()
+        self.table.blockSignals(True)
+        self.table.insertRow(row)
+        name = QTableWidgetItem(os.path.basename(item.video_path))
+        name.setToolTip(item.video_path)
+        name.setFlags(name.flags() & ~Qt.ItemFlag.ItemIsEditable)
+        self.table.setItem(row, 0, name)
+        languages = QTableWidgetItem(", ".join(item.languages))
+        languages.setToolTip("Target language codes, comma separated (e.g. ar, fr)")
+        self.table.setItem(row, 1, languages)
+        status = QTableWidgetItem(STATUS_LABELS[item.status])
+        status.setFlags(status.flags() & ~Qt.ItemFlag.ItemIsEditable)
+        self.table.setItem(row, 2, status)
+        bar = QProgressBar()
+        bar.setRange(0, 100)
+        bar.setValue(0)
+        self.table.setCellWidget(row, 3, bar)
+        button = QPushButton()
+        button.clicked.connect(lambda _, item_id=item.item_id: self.on_row_button(item_id))
+        self.table.setCellWidget(row, 4, button)
+        self.table.blockSignals(False)
+        self.refresh_row(item)
+
+    def refresh_row(self, item: QueueItem):
+        row = self.row_of(item.item_id)
+        self.table.blockSignals(True)
+        languages = self.table.item(row, 1)
+        languages.setText(", ".join(item.languages))
+        # اللغات قابلة للتعديل ما دام العنصر لم يبدأ
+        if item.status == "pending":
+            languages.setFlags(languages.flags() | Qt.ItemFlag.ItemIsEditable)
+        else:
+            languages.setFlags(languages.flags() & ~Qt.ItemFlag.ItemIsEditable)
+        status = self.table.item(row, 2)
+        status.setText(STATUS_LABELS[item.status])
+        status.setToolTip(item.message or "\n".join(item.outputs))
+        self.table.blockSignals(False)
+        button = self.table.cellWidget(row, 4)
+        button.setText("⏹️ Cancel" if item.active else ("↻ Retry" if item.status in ("failed", "stopped", "cancelled") else "🗑️ Remove"))
+        button.setEnabled(not item.cancel_token.cancelled or not item.active)
+
+    def on_item_changed(self, cell: QTableWidgetItem):
+        if cell.column() != 1:
+            return
+        item = self.items[cell.row()]
+        languages = [code.strip() for code in cell.text().replace(";", ",").split(",") if code.strip()]
+        if languages:
+            item.languages = list(dict.fromkeys(languages))
+        self.refresh_row(item)
+
+    def on_row_button(self, item_id: int):
+        """زر الصف: إلغاء العنصر المنتظر أو الجاري، وإعادة محاولة الفاشل، وحذف المكتمل."""
+        try:
+            item = self.item_of(item_id)
+            if item.active:
+                self.cancel(item)
+            elif item.status == "done":
+                self.remove(item)
+            else:
+                # إعادة المحاولة تستأنف من نقطة الحفظ (المراحل المكتملة لا تُعاد)
+                item.status, item.message = "pending", ""
+                item.cancel_token = CancelToken()
+                self.refresh_row(item)
+                self.schedule()
+        except Exception as e:
+            logger.error(f"❌ خطأ في زر عنصر القائمة: {e}")
+
+    def cancel(self, item: QueueItem):
+        if item.status == "pending":
+            item.status = "cancelled"
+        else:
+            logger.info(f"🛑 إيقاف عنصر القائمة: {item.video_path}")
+            item.cancel_token.cancel()
+        self.refresh_row(item)
+
+    def remove(self, item: QueueItem):
+        row = self.row_of(item.item_id)
+        self.items.pop(row)
+        self.table.removeRow(row)
+
+    def clear_finished(self):
+        for item in [item for item in self.items if not item.active]:
+            self.remove(item)
+
+    # ---- الجدولة ----
+
+    def start(self):
+        self.running = True
+        self.start_btn.setEnabled(False)
+        self.schedule()
+
+    def schedule(self):
+        """تشغيل العناصر المنتظرة حتى عدد المهام المتزامنة (فيديو واحد لا يعمل مرتين معًا)."""
+        if not self.running:
+            return
+        running = [item for item in self.items if item.status == "running"]
+        for item in self.items:
+            if len(running) >= self.concurrency_spin.value():
+                break
+            if item.status != "pending" or not claim_video(item.video_path):
+                continue
+            item.status = "running"
+            item.worker = QueueWorker(item, self.limiter, self.options_provider(item.languages))
+            item.worker.progress.connect(self.on_progress)
+            # finished من QThread نفسه: لا يُحرَّر الخيط قبل انتهائه فعلًا
+            item.worker.finished.connect(lambda item_id=item.item_id: self.on_done(item_id))
+            item.worker.start()
+            self.on_progress(item.item_id, 0, "")
+            running.append(item)
+            self.refresh_row(item)
+            logger.info(f"▶️ بدء عنصر القائمة: {item.video_path} ({', '.join(item.languages)})")
+        if not running and not any(item.status == "pending" for item in self.items):
+            self.running = False
+            self.start_btn.setEnabled(True)
+            logger.info("✅ انتهت قائمة الانتظار")
+
+    def on_progress(self, item_id: int, percent: int, label: str):
+        bar = self.table.cellWidget(self.row_of(item_id), 3)
+        bar.setValue(percent)
+        bar.setFormat(f"{label} %p%".strip())
+
+    def on_done(self, item_id: int):
+        item = self.item_of(item_id)
+        item.worker = None
+        release_video(item.video_path)
+        if item.status == "done":
+            self.table.cellWidget(self.row_of(item_id), 3).setValue(100)
+        logger.info(f"{STATUS_LABELS[item.status]} عنصر القائمة: {item.video_path} {item.message}")
+        self.refresh_row(item)
+        self.schedule()
+
+    def stop_all(self, wait_ms: int = 5000):
+        """إيقاف كل العناصر الجارية (عند إغلاق النافذة)."""
+        self.running = False
+        for item in self.items:
+            if item.status == "pending":
+                item.status = "cancelled"
+            if item.worker:
+                item.cancel_token.cancel()
+        for item in self.items:
+            if item.worker:
+                item.worker.wait(wait_ms)